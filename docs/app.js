@@ -2,13 +2,22 @@
 let currentData = null;
 let themesData = null;
 let currentChartType = 'margin'; // デフォルトは信用取引チャート
+let binaryDataAvailable = true; // バイナリ形式 (.bin) が見つからなければ以降はJSONのみ読み込む
+let manifest = null; // 公開ファイルごとの内容ハッシュ (manifest.json)
+let currentPeriod = 'all'; // 選択中の表示期間
+let stockShards = null; // 年別ファイルで読み込んでいる銘柄の状態 (全期間を読み込んだ場合はnull)
+let themeIndexRequests = {}; // テーマIDごとのテーマ指数 (themes/<theme_id>.json) の読み込み
 
 // ページ読み込み時の初期化
 document.addEventListener('DOMContentLoaded', async () => {
     const backToThemesBtn = document.getElementById('backToThemes');
 
+    // マニフェストは待たずに読み込み (読み込むまではハッシュなしのURLで取得する)
+    loadManifest();
+
     // テーマデータを読み込み
     await loadThemes();
+    await loadScreener();
 
     // テーマ一覧に戻るボタン
     if (backToThemesBtn) {
@@ -18,12 +27,43 @@ document.addEventListener('DOMContentLoaded', async () => {
     }
 });
 
+/**
+ * 公開ファイルのマニフェストを読み込む
+ * マニフェスト自体は毎回再検証し、データファイルはハッシュ付きURLで長期キャッシュさせる
+ * 最初の表示を遅らせないよう読み込みは待たず、読み込み後に取得するファイルからハッシュを付ける
+ */
+async function loadManifest() {
+    try {
+        const response = await fetch('manifest.json', { cache: 'no-cache' });
+        if (response.ok) {
+            manifest = await response.json();
+        }
+    } catch (err) {
+        console.warn('Manifest unavailable, loading data without versioned URLs:', err);
+    }
+}
+
+/**
+ * ファイルのURLに内容ハッシュを付ける (マニフェストにない場合はそのまま)
+ */
+function versionedUrl(path) {
+    const entry = manifest && manifest.files[path];
+    return entry ? `${path}?v=${entry.hash}` : path;
+}
+
+/**
+ * マニフェストに載っているファイルか判定 (マニフェストがない場合は不明としてtrue)
+ */
+function isPublished(path) {
+    return !manifest || path in manifest.files;
+}
+
 /**
  * テーマデータを読み込んでカードを表示
  */
 async function loadThemes() {
     try {
-        const response = await fetch('themes.json');
+        const response = await fetch(versionedUrl('themes.json'));
         if (!response.ok) {
             throw new Error('テーマデータの読み込みに失敗しました');
         }
@@ -52,6 +92,7 @@ function renderThemes(themes) {
             <div class="name">${theme.name}</div>
             <div class="description">${theme.description}</div>
             <div class="count">${theme.stocks.length}銘柄</div>
+            <div class="performance"></div>
         `;
 
         card.addEventListener('click', () => {
@@ -59,6 +100,284 @@ function renderThemes(themes) {
         });
 
         themesGrid.appendChild(card);
+        renderThemePerformance(card.querySelector('.performance'), theme.id);
+    });
+}
+
+/**
+ * テーマ指数を読み込む (同じテーマは1回だけ取得する)
+ * テーマ指数は任意のため、ファイルがない場合はnullを返す
+ */
+function fetchThemeIndex(themeId) {
+    const path = `themes/${themeId}.json`;
+    if (!themeIndexRequests[themeId]) {
+        themeIndexRequests[themeId] = !isPublished(path) ? Promise.resolve(null) :
+            fetch(versionedUrl(path))
+                .then(response => response.ok ? response.json() : null)
+                .catch(error => {
+                    console.warn(`Theme index unavailable (${themeId}):`, error);
+                    return null;
+                });
+    }
+    return themeIndexRequests[themeId];
+}
+
+/**
+ * テーマカードに等金額加重指数の1ヶ月の騰落率を表示
+ */
+async function renderThemePerformance(element, themeId) {
+    const themeIndex = await fetchThemeIndex(themeId);
+    const change = themeIndex && themeIndex.summary['1m'];
+    if (change === null || change === undefined) {
+        return;
+    }
+
+    element.textContent = `1ヶ月 ${formatRankingValue(change, '%')}`;
+    element.classList.add(change > 0 ? 'up' : change < 0 ? 'down' : 'flat');
+}
+
+/**
+ * テーマ指数 (等金額加重・売買代金加重) と信用・空売り残高の合計を描画
+ */
+async function renderThemeChart(theme) {
+    const container = document.getElementById('themeChart');
+    container.style.display = 'none';
+
+    const themeIndex = await fetchThemeIndex(theme.id);
+    if (!themeIndex || themeIndex.dates.length === 0) {
+        return;
+    }
+
+    const isMobile = window.innerWidth <= 768;
+    const dates = themeIndex.dates;
+    const columns = themeIndex.columns;
+
+    const traces = [
+        {
+            x: dates,
+            y: columns.EqualWeighted,
+            type: 'scatter',
+            mode: 'lines',
+            name: '等金額加重',
+            line: { color: '#6B7280', width: 2.5 },
+            yaxis: 'y',
+            hovertemplate: '<b>等金額加重</b><br>%{y:,.2f}<br>%{x}<extra></extra>'
+        },
+        {
+            x: dates,
+            y: columns.VolumeWeighted,
+            type: 'scatter',
+            mode: 'lines',
+            name: '売買代金加重',
+            line: { color: '#a8b5ff', width: 2 },
+            yaxis: 'y',
+            hovertemplate: '<b>売買代金加重</b><br>%{y:,.2f}<br>%{x}<extra></extra>'
+        },
+        {
+            x: dates,
+            y: columns.MarginBuy,
+            type: 'scatter',
+            mode: 'lines',
+            name: '信用買',
+            line: { color: '#93C5FD', width: 1.5, dash: 'dot' },
+            yaxis: 'y2',
+            hovertemplate: '<b>信用買</b><br>%{y:,.0f}株<br>%{x}<extra></extra>'
+        },
+        {
+            x: dates,
+            y: columns.MarginSell,
+            type: 'scatter',
+            mode: 'lines',
+            name: '信用売',
+            line: { color: '#67E8F9', width: 1.5, dash: 'dot' },
+            yaxis: 'y2',
+            hovertemplate: '<b>信用売</b><br>%{y:,.0f}株<br>%{x}<extra></extra>'
+        },
+        {
+            x: dates,
+            y: columns.ShortSelling,
+            type: 'scatter',
+            mode: 'lines',
+            name: '機関空売',
+            line: { color: '#F87171', width: 1.5, dash: 'dot' },
+            yaxis: 'y2',
+            hovertemplate: '<b>機関空売</b><br>%{y:,.0f}株<br>%{x}<extra></extra>'
+        }
+    ];
+
+    const layout = {
+        title: {
+            text: `${theme.name} テーマ指数 (初日=100)`,
+            font: { size: isMobile ? 14 : 16, color: '#2d3748' }
+        },
+        xaxis: { type: 'date', tickfont: { size: isMobile ? 10 : 12 } },
+        yaxis: { title: isMobile ? '' : '指数', side: 'left', showgrid: false, tickfont: { size: isMobile ? 10 : 12 } },
+        yaxis2: {
+            title: isMobile ? '' : '信用・空売り残高',
+            overlaying: 'y',
+            side: 'right',
+            showgrid: false,
+            tickfont: { size: isMobile ? 10 : 12 }
+        },
+        hovermode: 'x unified',
+        plot_bgcolor: '#ffffff',
+        paper_bgcolor: '#f5f7fa',
+        font: { family: 'Inter, sans-serif' },
+        margin: { l: isMobile ? 40 : 60, r: isMobile ? 40 : 60, t: isMobile ? 50 : 60, b: 40 },
+        legend: { orientation: 'h', yanchor: 'bottom', y: 1.02, xanchor: 'right', x: 1, font: { size: isMobile ? 10 : 12 } },
+        autosize: true,
+        height: isMobile ? 300 : 360
+    };
+
+    container.style.display = 'block';
+    Plotly.newPlot('themeChart', traces, layout, {
+        responsive: true,
+        displayModeBar: false,
+        displaylogo: false
+    });
+}
+
+/**
+ * ランキング (screener.json) を読み込んで表示
+ * ランキングは任意のため、ファイルがない場合はセクションを表示しない
+ */
+async function loadScreener() {
+    if (!isPublished('screener.json')) {
+        return;
+    }
+
+    try {
+        const response = await fetch(versionedUrl('screener.json'));
+        if (!response.ok) {
+            return;
+        }
+
+        renderScreener(await response.json());
+    } catch (error) {
+        console.warn('Screener unavailable:', error);
+    }
+}
+
+/**
+ * ランキングの値を単位付きで整形
+ */
+function formatRankingValue(value, unit) {
+    const sign = unit !== '倍' && value > 0 ? '+' : '';
+    return `${sign}${value.toFixed(2)}${unit}`;
+}
+
+/**
+ * ランキングのカードを描画
+ */
+function renderScreener(screener) {
+    const screenerSection = document.getElementById('screenerSection');
+    const screenerGrid = document.getElementById('screenerGrid');
+    screenerGrid.innerHTML = '';
+
+    Object.values(screener.rankings).forEach(ranking => {
+        const card = document.createElement('div');
+        card.className = 'screener-card';
+        card.innerHTML = `<div class="name">${ranking.label}</div>`;
+
+        ranking.items.forEach(item => {
+            const row = document.createElement('div');
+            const direction = ranking.unit === '倍' ? '' : (item.value > 0 ? 'up' : item.value < 0 ? 'down' : '');
+            row.className = 'screener-item';
+            row.title = `${item.date} 終値 ${item.close.toLocaleString()}`;
+            row.innerHTML = `
+                <span class="code">${item.code}</span>
+                <span class="stock-name">${item.name}</span>
+                <span class="value ${direction}">${formatRankingValue(item.value, ranking.unit)}</span>
+            `;
+
+            row.addEventListener('click', () => {
+                loadStockData(item.code);
+            });
+
+            card.appendChild(row);
+        });
+
+        screenerGrid.appendChild(card);
+    });
+
+    document.getElementById('screenerDate').textContent = screener.latest_date ? `(${screener.latest_date})` : '';
+    screenerSection.style.display = 'block';
+}
+
+/**
+ * テーマの構成銘柄の相関行列をヒートマップで描画 (期間はボタンで切り替える)
+ * 相関行列は任意のため、ファイルがない場合 (大きいテーマなど) は表示しない
+ */
+async function renderThemeCorrelation(theme) {
+    const container = document.getElementById('themeCorrelation');
+    const path = `correlations/${theme.id}.json`;
+    container.style.display = 'none';
+    if (!isPublished(path)) {
+        return;
+    }
+
+    let data = null;
+    try {
+        const response = await fetch(versionedUrl(path));
+        data = response.ok ? await response.json() : null;
+    } catch (error) {
+        console.warn(`Correlations unavailable (${theme.id}):`, error);
+    }
+    if (!data || data.codes.length < 2) {
+        return;
+    }
+
+    const isMobile = window.innerWidth <= 768;
+    const names = Object.fromEntries(theme.stocks.map(stock => [stock.code, stock.name]));
+    const labels = data.codes.map(code => `${code} ${names[code] || ''}`.trim());
+    const windows = Object.keys(data.correlations);
+    const initial = windows.includes('60') ? '60' : windows[0];
+
+    const trace = {
+        z: data.correlations[initial],
+        x: labels,
+        y: labels,
+        type: 'heatmap',
+        zmin: -1,
+        zmax: 1,
+        colorscale: [[0, '#67E8F9'], [0.5, '#ffffff'], [1, '#F87171']],
+        hovertemplate: '%{y}<br>%{x}<br>相関: %{z:.2f}<extra></extra>'
+    };
+
+    const layout = {
+        title: {
+            text: `${theme.name} 構成銘柄の相関 (${data.latest_date})`,
+            font: { size: isMobile ? 14 : 16, color: '#2d3748' }
+        },
+        xaxis: { showticklabels: !isMobile, tickfont: { size: 10 } },
+        yaxis: { showticklabels: !isMobile, tickfont: { size: 10 }, autorange: 'reversed' },
+        updatemenus: [{
+            type: 'buttons',
+            direction: 'right',
+            x: 0,
+            y: 1.12,
+            xanchor: 'left',
+            showactive: true,
+            active: windows.indexOf(initial),
+            buttons: windows.map(window => ({
+                label: `${window}日`,
+                method: 'restyle',
+                args: [{ z: [data.correlations[window]] }]
+            }))
+        }],
+        plot_bgcolor: '#ffffff',
+        paper_bgcolor: '#f5f7fa',
+        font: { family: 'Inter, sans-serif' },
+        margin: { l: isMobile ? 20 : 160, r: 20, t: 90, b: isMobile ? 20 : 140 },
+        autosize: true,
+        height: isMobile ? 360 : 560
+    };
+
+    container.style.display = 'block';
+    Plotly.newPlot('themeCorrelation', [trace], layout, {
+        responsive: true,
+        displayModeBar: false,
+        displaylogo: false
     });
 }
 
@@ -74,6 +393,10 @@ function showStocksView(theme) {
     // テーマ名を表示
     selectedThemeName.innerHTML = `${theme.icon} ${theme.name}`;
 
+    // テーマ指数チャートを表示 (読み込みを待たずに銘柄一覧を表示する)
+    renderThemeChart(theme);
+    renderThemeCorrelation(theme);
+
     // 銘柄カードを生成
     stocksGrid.innerHTML = '';
     theme.stocks.forEach(stock => {
@@ -147,26 +470,31 @@ async function loadStockData(stockCode) {
         // 銘柄コードを4桁に正規化
         const code = stockCode.replace('.T', '').padStart(4, '0');
 
-        // JSONファイルを読み込み
-        const response = await fetch(`data/${code}.json`);
-
-        if (!response.ok) {
+        // 直近データファイルがあれば最初は直近分だけを読み込み (古い期間は年別ファイルから追加で読み込む)、
+        // なければバイナリ形式で全期間を読み込む
+        stockShards = null;
+        let data = await fetchRecentData(code);
+        if (data) {
+            stockShards = { code, years: data.shards || [], recent: data, loaded: {} };
+        } else {
+            data = await fetchStockBinary(code);
+        }
+        if (!data) {
             throw new Error(`データが見つかりません (銘柄コード: ${code})`);
         }
-
-        const data = await response.json();
         currentData = data;
 
         // 銘柄情報を表示
         displayStockInfo(data);
 
-        // チャートを描画
-        renderChart(data);
-
         // 期間選択ボタンとチャートタイプ選択ボタンを表示して初期化
         initializePeriodSelector();
         initializeChartTypeSelector();
 
+        // 選択中の期間でチャートを描画
+        const activePeriodBtn = document.querySelector('.period-btn.active');
+        await filterChartByPeriod(activePeriodBtn ? activePeriodBtn.dataset.period : 'all');
+
         loading.style.display = 'none';
 
     } catch (err) {
@@ -177,6 +505,162 @@ async function loadStockData(stockCode) {
     }
 }
 
+/**
+ * 直近データファイル (data/<code>/recent.json) を読み込む
+ * 存在しない場合はnullを返す
+ */
+async function fetchRecentData(code) {
+    const path = `data/${code}/recent.json`;
+    if (!isPublished(path)) {
+        return null;
+    }
+
+    try {
+        const response = await fetch(versionedUrl(path));
+        if (!response.ok) {
+            return null;
+        }
+        return await response.json();
+    } catch (err) {
+        console.warn('Recent data unavailable, loading full history:', err);
+        return null;
+    }
+}
+
+/**
+ * 年別ファイル (data/<code>/<year>.json) を読み込む (同じ年は一度だけ取得)
+ */
+function fetchYearShard(year) {
+    const shards = stockShards;
+    if (!shards.loaded[year]) {
+        const path = `data/${shards.code}/${year}.json`;
+        shards.loaded[year] = fetch(versionedUrl(path)).then(response => {
+            if (!response.ok) {
+                delete shards.loaded[year];
+                throw new Error(`データが見つかりません (${path})`);
+            }
+            return response.json();
+        });
+    }
+    return shards.loaded[year];
+}
+
+/**
+ * 開始日以降を表示するのに必要なデータを返す
+ * 直近データファイルで足りない場合は不足する年別ファイルを読み込んで連結する
+ */
+async function loadHistory(startDate) {
+    if (!stockShards) {
+        return currentData;
+    }
+
+    const recent = stockShards.recent;
+    if (startDate && recent.dates.length > 0 && new Date(recent.dates[0]) <= startDate) {
+        return recent;
+    }
+
+    const firstYear = startDate ? startDate.getFullYear() : -Infinity;
+    const years = stockShards.years.filter(year => year >= firstYear);
+    const parts = await Promise.all(years.map(fetchYearShard));
+
+    // 年別ファイルより新しい直近データを末尾に追加
+    const lastDate = parts.length > 0 ? parts[parts.length - 1].dates.slice(-1)[0] : '';
+    const newerIndex = recent.dates.findIndex(d => d > lastDate);
+    if (newerIndex >= 0) {
+        parts.push(sliceColumnar(recent, newerIndex));
+    }
+
+    return concatColumnar(recent, parts);
+}
+
+/**
+ * 列形式の株価データを日付順に連結する (銘柄情報は meta から引き継ぐ)
+ */
+function concatColumnar(meta, parts) {
+    const columns = {};
+    Object.keys(meta.columns).forEach(field => {
+        columns[field] = [].concat(...parts.map(part => Array.from(part.columns[field] || [])));
+    });
+    return {
+        ...meta,
+        dates: [].concat(...parts.map(part => part.dates)),
+        columns
+    };
+}
+
+/**
+ * バイナリ形式 (data/<code>.bin) の株価データを読み込む
+ * 存在しない場合はnullを返す
+ */
+async function fetchStockBinary(code) {
+    const path = `data/${code}.bin`;
+    if (!binaryDataAvailable || !isPublished(path)) {
+        return null;
+    }
+
+    try {
+        const response = await fetch(versionedUrl(path));
+        if (!response.ok) {
+            binaryDataAvailable = false;
+            return null;
+        }
+        return decodeStockBinary(await response.arrayBuffer());
+    } catch (err) {
+        console.warn('Binary data unavailable, falling back to JSON:', err);
+        binaryDataAvailable = false;
+        return null;
+    }
+}
+
+/**
+ * バイナリ形式を列形式の株価データに変換
+ * 列は ArrayBuffer 上の TypedArray ビューとして参照する (コピーしない)
+ *
+ * 形式: "SCB1" | ヘッダー長 (uint32) | ヘッダーJSON | 列ブロック (リトルエンディアン)
+ */
+function decodeStockBinary(buffer) {
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== 'SCB1') {
+        throw new Error('バイナリデータの形式が不正です');
+    }
+
+    const view = new DataView(buffer);
+    const headerLength = view.getUint32(4, true);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)));
+    const dataStart = 8 + headerLength;
+
+    const columns = {};
+    header.columns.forEach(column => {
+        const ArrayType = column.type === 'int32' ? Int32Array : Float32Array;
+        columns[column.name] = new ArrayType(buffer, dataStart + column.offset, header.rows);
+    });
+
+    // 日付は 1970-01-01 からの日数
+    const days = columns.Date;
+    delete columns.Date;
+    const dates = Array.from(days, day => new Date(day * 86400000).toISOString().slice(0, 10));
+
+    return {
+        ...header.meta,
+        schema_version: 2,
+        dates,
+        columns
+    };
+}
+
+/**
+ * 列形式の株価データを index 番目以降に絞り込む
+ * TypedArray の列はコピーせず subarray で参照する
+ */
+function sliceColumnar(data, startIndex) {
+    const columns = {};
+    Object.keys(data.columns).forEach(field => {
+        const values = data.columns[field];
+        columns[field] = values.subarray ? values.subarray(startIndex) : values.slice(startIndex);
+    });
+    return { ...data, dates: data.dates.slice(startIndex), columns };
+}
+
 /**
  * 銘柄情報を表示
  */
@@ -204,18 +688,15 @@ function renderChart(data) {
     }
 
     // デフォルトは信用取引チャート
-    const chartData = data.data;
+    // 日付と各データ系列 (列形式なのでそのままPlotlyに渡せる)
+    const dates = data.dates;
+    const prices = data.columns.Close;
+    const shortSelling = data.columns.ShortSelling;
+    const marginBuy = data.columns.MarginBuy;
+    const marginSell = data.columns.MarginSell;
 
-    // 日付と各データ系列を抽出
-    const dates = chartData.map(d => d.Date);
-    const prices = chartData.map(d => d.Close);
-    const volumes = chartData.map(d => d.Volume);
-    const shortSelling = chartData.map(d => d.ShortSelling || 0);
-    const marginBuy = chartData.map(d => d.MarginBuy || 0);
-    const marginSell = chartData.map(d => d.MarginSell || 0);
-
-    // 価格帯別出来高を準備
-    const volumeProfile = prepareVolumeProfile(data.volume_profile, prices);
+    // 選択中の期間の価格帯別出来高を準備
+    const volumeProfile = prepareVolumeProfile(selectVolumeProfile(data, currentPeriod), prices);
 
     // トレース定義
     const traces = [
@@ -361,6 +842,27 @@ function renderChart(data) {
     Plotly.newPlot('chart', traces, layout, config);
 }
 
+/**
+ * 表示期間の価格帯別出来高を選ぶ
+ * 期間ごとの価格帯別出来高がない旧形式のデータは全期間の値を使う
+ * 列形式 (price_low / price_high / volume の配列) は価格帯ごとのオブジェクトに戻す
+ */
+function selectVolumeProfile(data, period) {
+    const profiles = data.volume_profiles;
+    if (!profiles) {
+        return data.volume_profile;
+    }
+    const profile = profiles[period] || profiles.all;
+    if (!profile || Array.isArray(profile)) {
+        return profile;
+    }
+    return profile.volume.map((volume, i) => ({
+        price_low: profile.price_low[i],
+        price_high: profile.price_high[i],
+        volume
+    }));
+}
+
 /**
  * 価格帯別出来高を背景図形として準備
  */
@@ -407,6 +909,10 @@ function initializePeriodSelector() {
         periodSelector.style.display = 'flex';
     }
 
+    // イベントリスナーは最初の1回だけ設定
+    if (periodSelector && periodSelector.dataset.initialized) return;
+    if (periodSelector) periodSelector.dataset.initialized = 'true';
+
     // イベントリスナーを設定
     periodBtns.forEach(btn => {
         btn.addEventListener('click', function () {
@@ -421,59 +927,80 @@ function initializePeriodSelector() {
     });
 }
 
+/**
+ * 表示期間の開始日を計算 (全期間の場合はnull)
+ */
+function getPeriodStartDate(period, latestDate) {
+    if (period === 'all') {
+        return null;
+    }
+
+    const startDate = new Date(latestDate);
+    switch (period) {
+        case '1m':
+            startDate.setMonth(startDate.getMonth() - 1);
+            break;
+        case '3m':
+            startDate.setMonth(startDate.getMonth() - 3);
+            break;
+        case '6m':
+            startDate.setMonth(startDate.getMonth() - 6);
+            break;
+        case '1y':
+            startDate.setFullYear(startDate.getFullYear() - 1);
+            break;
+    }
+    return startDate;
+}
+
 /**
  * 期間でチャートをフィルタリング
+ * 直近データファイルで足りない期間は年別ファイルを追加で読み込む
  */
-function filterChartByPeriod(period) {
+async function filterChartByPeriod(period) {
     if (!currentData) return;
 
-    const chartData = currentData.data;
-    let filteredData;
+    currentPeriod = period;
+    const latestDate = currentData.dates[currentData.dates.length - 1];
+    const startDate = getPeriodStartDate(period, latestDate);
 
-    if (period === 'all') {
-        filteredData = chartData;
-    } else {
-        // 最新の日付を取得
-        const latestDate = new Date(chartData[chartData.length - 1].Date);
-        let startDate = new Date(latestDate);
-
-        // 期間に応じて開始日を計算
-        switch (period) {
-            case '1m':
-                startDate.setMonth(startDate.getMonth() - 1);
-                break;
-            case '3m':
-                startDate.setMonth(startDate.getMonth() - 3);
-                break;
-            case '6m':
-                startDate.setMonth(startDate.getMonth() - 6);
-                break;
-            case '1y':
-                startDate.setFullYear(startDate.getFullYear() - 1);
-                break;
-        }
+    let data;
+    try {
+        data = await loadHistory(startDate);
+    } catch (err) {
+        console.error('Error loading history:', err);
+        return;
+    }
 
-        // データをフィルタリング
-        filteredData = chartData.filter(d => new Date(d.Date) >= startDate);
+    // 読み込み中に別の期間が選択された場合は描画しない
+    if (period !== currentPeriod) return;
+
+    let filteredData = data;
+    if (startDate) {
+        // 開始日以降の位置を探してデータを絞り込む
+        let startIndex = data.dates.findIndex(d => new Date(d) >= startDate);
+        if (startIndex < 0) {
+            startIndex = data.dates.length;
+        }
+        filteredData = sliceColumnar(data, startIndex);
     }
 
     // フィルタリングされたデータでチャートを再描画
-    const tempData = { ...currentData, data: filteredData };
-    renderChart(tempData);
+    renderChart(filteredData);
 }
 
 /**
- * 移動平均を計算
+ * 移動平均を計算 (移動平均を含まない旧形式のデータ用)
  */
 function calculateMovingAverage(prices, period) {
     const ma = [];
+    let sum = 0;
     for (let i = 0; i < prices.length; i++) {
-        if (i < period - 1) {
-            ma.push(null);
-        } else {
-            const sum = prices.slice(i - period + 1, i + 1).reduce((a, b) => a + b, 0);
-            ma.push(sum / period);
+        sum += prices[i];
+        if (i >= period) {
+            sum -= prices[i - period];
         }
+        ma.push(i < period - 1 ? null : sum / period);
     }
     return ma;
 }
@@ -500,9 +1027,9 @@ function initializeChartTypeSelector() {
             // 選択されたチャートタイプを保存
             currentChartType = this.dataset.chartType;
 
-            // チャートを再描画
+            // 選択中の期間でチャートを再描画
             if (currentData) {
-                renderChart(currentData);
+                filterChartByPeriod(currentPeriod);
             }
         });
     });
@@ -512,17 +1039,15 @@ function initializeChartTypeSelector() {
  * 移動平均線と出来高のチャートを描画
  */
 function renderMAChart(data) {
-    const chartData = data.data;
-
-    // 日付と各データ系列を抽出
-    const dates = chartData.map(d => d.Date);
-    const prices = chartData.map(d => d.Close);
-    const volumes = chartData.map(d => d.Volume);
-
-    // 移動平均線を計算
-    const ma5 = calculateMovingAverage(prices, 5);
-    const ma25 = calculateMovingAverage(prices, 25);
-    const ma75 = calculateMovingAverage(prices, 75);
+    // 日付と各データ系列
+    const dates = data.dates;
+    const prices = data.columns.Close;
+    const volumes = data.columns.Volume;
+
+    // 移動平均線 (全期間で計算済みの値。期間の初日から正しい値になる)
+    const ma5 = data.columns.MA5;
+    const ma25 = data.columns.MA25;
+    const ma75 = data.columns.MA75;
 
     // モバイル判定
     const isMobile = window.innerWidth <= 768;
@@ -0,0 +1,101 @@
+"""
+バイナリ形式の株価データ
+ブラウザが fetch().arrayBuffer() で読み込み、コピーせずに TypedArray として
+参照できるリトルエンディアンの列ブロック形式
+
+ファイル構成:
+    0-3   マジックナンバー "SCB1"
+    4-7   ヘッダー長 (uint32, 8の倍数)
+    8-    ヘッダー (UTF-8のJSON、空白で8バイト境界まで埋める)
+          rows: 行数
+          columns: [{name, type, offset}, ...] (offset はデータ部先頭からのバイト位置)
+          meta: 銘柄コード・銘柄名・価格帯別出来高など列以外の項目
+    以降  データ部: 列ごとに rows 個の int32 / float32 を連続して格納
+          Date は 1970-01-01 からの日数 (int32)
+"""
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b'SCB1'
+
+# int32 で格納する項目 (それ以外の数値項目は float32)
+INT_FIELDS = ('Volume', 'MarginBuy', 'MarginSell', 'ShortSelling')
+
+_INT32_MAX = np.iinfo(np.int32).max
+
+
+def _pad(length: int, alignment: int = 8) -> int:
+    return (alignment - length % alignment) % alignment
+
+
+def encode_binary(result: dict) -> bytes:
+    """
+    統合データをバイナリ形式に変換
+    
+    Args:
+        result: add_derived_data で移動平均・価格帯別出来高を追加した統合データ (data は行のリスト)
+    
+    Returns:
+        バイナリデータ
+    """
+    records = result['data']
+    rows = len(records)
+    fields = [k for k in records[0] if k != 'Date'] if records else []
+    
+    days = np.array([r['Date'] for r in records], dtype='datetime64[D]').astype('<i4')
+    blocks = [('Date', 'int32', days)]
+    for field in fields:
+        values = np.array([r[field] for r in records], dtype=np.float64)
+        if field in INT_FIELDS:
+            values = np.clip(np.nan_to_num(values), -_INT32_MAX, _INT32_MAX)
+            blocks.append((field, 'int32', np.rint(values).astype('<i4')))
+        else:
+            blocks.append((field, 'float32', values.astype('<f4')))
+    
+    columns = []
+    offset = 0
+    for name, dtype, values in blocks:
+        columns.append({'name': name, 'type': dtype, 'offset': offset})
+        offset += values.nbytes
+    
+    meta = {k: v for k, v in result.items() if k != 'data'}
+    header = json.dumps({'version': 1, 'rows': rows, 'columns': columns, 'meta': meta},
+                        ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    header += b' ' * _pad(len(header))
+    
+    parts = [MAGIC, struct.pack('<I', len(header)), header]
+    parts.extend(values.tobytes() for _, _, values in blocks)
+    return b''.join(parts)
+
+
+def decode_binary(data: bytes) -> dict:
+    """
+    バイナリ形式を列ごとの配列に変換
+    
+    Args:
+        data: バイナリデータ
+    
+    Returns:
+        meta の各項目に dates (YYYY-MM-DD のリスト) と columns (項目名→NumPy配列) を加えた辞書
+    """
+    if data[:4] != MAGIC:
+        raise ValueError("Not a stock binary file")
+    
+    header_length = struct.unpack_from('<I', data, 4)[0]
+    header = json.loads(data[8:8 + header_length].decode('utf-8'))
+    data_start = 8 + header_length
+    rows = header['rows']
+    
+    columns = {}
+    for column in header['columns']:
+        dtype = '<i4' if column['type'] == 'int32' else '<f4'
+        columns[column['name']] = np.frombuffer(data, dtype=dtype, count=rows,
+                                                offset=data_start + column['offset'])
+    
+    days = columns.pop('Date')
+    result = dict(header['meta'])
+    result['dates'] = days.astype('datetime64[D]').astype(str).tolist()
+    result['columns'] = columns
+    return result
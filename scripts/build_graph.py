@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+データ生成パイプラインのビルドグラフ
+株価取得 → 日次データストア → 銘柄データ (docs/data・カタログ) → テーマ・ランキング・指標などの
+各段階をノードとし、入力 (設定ファイル・スクリプト・上流ノードの出力) のハッシュが
+前回の実行から変わったノードだけを作り直す
+
+依存関係のないノードは並列に実行する。各ノードのコマンドは scripts/ で別プロセスとして実行し、
+成功したノードの入力・出力のハッシュを .cache/build_state.json に記録する。
+    
+    python build_graph.py              # 古くなったノードをすべて作り直す
+    python build_graph.py themes       # themes.json とその上流のみ
+    python build_graph.py --offline    # 株価取得 (ネットワーク) のノードは実行しない
+    python build_graph.py --dry-run    # 作り直すノードを表示するだけ (ネットワークにはアクセスしない)
+"""
+import argparse
+import hashlib
+import json
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+import output_writer
+from job_runner import load_universe, expected_latest_date
+
+SCRIPT_DIR = Path(__file__).parent
+ROOT_DIR = SCRIPT_DIR.parent
+
+# ノードの実行状態の保存先
+STATE_FILE = ROOT_DIR / '.cache' / 'build_state.json'
+
+# 同時に実行するノード数
+DEFAULT_JOBS = 4
+
+
+class Node:
+    """
+    ビルドグラフのノード
+    """
+    
+    def __init__(self, name: str, command: list, inputs: tuple = (), deps: tuple = (), outputs: tuple = (),
+                 params=None, network: bool = False):
+        """
+        Args:
+            name: ノード名
+            command: scripts/ で実行するコマンド (python の引数)
+            inputs: 入力ファイル (ROOT_DIR からの相対パス。ディレクトリは配下のファイルすべて)
+            deps: 上流ノード名 (上流の出力のハッシュも入力に含める)
+            outputs: 出力ファイル・ディレクトリ (ROOT_DIR からの相対パス)
+            params: 入力に含める値を返す関数 (ファイル以外の入力)
+            network: Trueの場合はネットワークにアクセスするノード (--offline では実行しない)
+        """
+        self.name = name
+        self.command = command
+        self.inputs = inputs
+        self.deps = deps
+        self.outputs = outputs
+        self.params = params
+        self.network = network
+
+
+def _universe_codes():
+    # テーマ設定の銘柄の割り当てを変えても、対象銘柄が変わらなければ株価は取得し直さない
+    return [s['code'] for s in load_universe()]
+
+
+# パイプラインの定義 (上流から順に並べる)
+NODES = [
+    Node('panel', ['job_runner.py', '3', '--incremental', '--no-render'],
+         inputs=('scripts/fetch_stock_data.py', 'scripts/fetch_margin_data.py',
+                 'scripts/fetch_short_selling.py', 'scripts/generate_json.py', 'scripts/job_runner.py',
+                 '.cache/jpx_margin', '.cache/jpx_short'),
+         outputs=('.cache/panel',),
+         params=lambda: {'codes': _universe_codes(), 'latest_date': expected_latest_date()},
+         network=True),
+    Node('stock_json', ['panel_store.py', '--render'],
+         inputs=('scripts/panel_store.py', 'scripts/generate_json.py', 'scripts/volume_profile.py',
+                 'scripts/binary_format.py', 'scripts/catalog.py'),
+         deps=('panel',),
+         outputs=('docs/data', 'docs/catalog.json')),
+    Node('indicators', ['indicators.py'],
+         inputs=('scripts/indicators.py',),
+         deps=('panel',),
+         outputs=('docs/indicators',)),
+    Node('screener', ['screener.py'],
+         inputs=('scripts/screener.py', 'scripts/indicators.py'),
+         deps=('panel', 'stock_json'),
+         outputs=('docs/screener.json',)),
+    Node('themes', ['generate_themes.py'],
+         inputs=('scripts/generate_themes.py', 'scripts/custom_theme_config.json', 'scripts/nikkei225_stocks.json'),
+         deps=('stock_json',),
+         outputs=('docs/themes.json',)),
+    Node('theme_index', ['theme_index.py'],
+         inputs=('scripts/theme_index.py', 'scripts/indicators.py'),
+         deps=('panel', 'themes'),
+         outputs=('docs/themes',)),
+    Node('correlation', ['correlation.py'],
+         inputs=('scripts/correlation.py', 'scripts/indicators.py'),
+         deps=('panel', 'themes'),
+         outputs=('docs/correlations',)),
+]
+
+
+def hash_paths(paths) -> str:
+    """
+    ファイル・ディレクトリの内容のハッシュ (ディレクトリは配下のファイルのパスと内容)
+    
+    Args:
+        paths: ROOT_DIR からの相対パスのリスト
+    
+    Returns:
+        SHA-256 (16進数)。存在しないパスはパスのみをハッシュに含める
+    """
+    digest = hashlib.sha256()
+    for rel in paths:
+        path = ROOT_DIR / rel
+        files = sorted(p for p in path.rglob('*') if p.is_file()) if path.is_dir() else [path]
+        for file in files:
+            digest.update(str(file.relative_to(ROOT_DIR)).encode('utf-8'))
+            if file.is_file():
+                digest.update(hashlib.sha256(file.read_bytes()).digest())
+    return digest.hexdigest()
+
+
+class BuildGraph:
+    """
+    ノードの依存関係と実行状態
+    """
+    
+    def __init__(self, nodes: list = NODES, state_file: Path = STATE_FILE):
+        """
+        Args:
+            nodes: ノードのリスト
+            state_file: 実行状態の保存先
+        """
+        self.nodes = {node.name: node for node in nodes}
+        self.state_file = Path(state_file)
+        self.state = {}
+        self._lock = threading.Lock()
+        if self.state_file.exists():
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    self.state = json.load(f)
+            except Exception as e:
+                print(f"Error reading build state: {e}")
+    
+    def upstream(self, targets: list) -> list:
+        """
+        指定したノードとその上流のノード名 (定義順)
+        
+        Args:
+            targets: ノード名のリスト
+        
+        Returns:
+            ノード名のリスト
+        """
+        selected = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in selected:
+                selected.add(name)
+                stack.extend(self.nodes[name].deps)
+        return [name for name in self.nodes if name in selected]
+    
+    def input_hash(self, node: Node) -> str:
+        """
+        ノードの入力のハッシュ (入力ファイル・ファイル以外の入力・上流ノードの出力)
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps(node.command).encode('utf-8'))
+        digest.update(hash_paths(node.inputs).encode('utf-8'))
+        if node.params:
+            digest.update(json.dumps(node.params(), sort_keys=True).encode('utf-8'))
+        for dep in node.deps:
+            digest.update(hash_paths(self.nodes[dep].outputs).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def is_stale(self, node: Node) -> bool:
+        """
+        前回の実行から入力が変わったか、出力が変更・削除されたか判定
+        """
+        recorded = self.state.get(node.name)
+        if not recorded:
+            return True
+        return (recorded['input_hash'] != self.input_hash(node)
+                or recorded['output_hash'] != hash_paths(node.outputs))
+    
+    def record(self, node: Node, input_hash: str, elapsed: float):
+        """
+        成功したノードの入力・出力のハッシュを保存
+        """
+        with self._lock:
+            self.state[node.name] = {
+                'input_hash': input_hash,
+                'output_hash': hash_paths(node.outputs),
+                'elapsed': round(elapsed, 2),
+                'built_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+            }
+            output_writer.write_atomic(self.state_file,
+                                       json.dumps(self.state, indent=2, sort_keys=True).encode('utf-8'))
+    
+    def run_node(self, node: Node) -> bool:
+        """
+        ノードのコマンドを実行
+        
+        Returns:
+            成功した場合はTrue
+        """
+        # 入力のハッシュは実行前に求める (実行中に入力が変わった場合は次回作り直す)
+        input_hash = self.input_hash(node)
+        start_time = time.time()
+        print(f"▶ {node.name}: python {' '.join(node.command)}", flush=True)
+        # 並列に実行したノードの出力が混ざらないように、終わってからノード名を付けてまとめて表示する
+        completed = subprocess.run([sys.executable] + node.command, cwd=SCRIPT_DIR,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        elapsed = time.time() - start_time
+        with self._lock:
+            print(''.join(f"[{node.name}] {line}" for line in completed.stdout.splitlines(keepends=True)),
+                  end='', flush=True)
+        
+        if completed.returncode != 0:
+            print(f"✗ {node.name}: 失敗 (終了コード {completed.returncode}, {elapsed:.1f}秒)", flush=True)
+            return False
+        
+        self.record(node, input_hash, elapsed)
+        print(f"✓ {node.name}: 完了 ({elapsed:.1f}秒)", flush=True)
+        return True
+    
+    def build(self, targets: list = None, jobs: int = DEFAULT_JOBS, force: bool = False,
+              offline: bool = False, dry_run: bool = False) -> dict:
+        """
+        古くなったノードを依存関係の順に作り直す (依存関係のないノードは並列に実行)
+        
+        上流ノードを作り直した場合、下流ノードは実行する時点の入力で改めて判定する。
+        
+        Args:
+            targets: 作り直すノード名 (Noneの場合はすべて。上流のノードも含める)
+            jobs: 同時に実行するノード数
+            force: Trueの場合は古くなっていないノードも作り直す
+            offline: Trueの場合はネットワークにアクセスするノードを実行しない
+            dry_run: Trueの場合は実行せずに古くなったノードを表示する
+                (ネットワークにアクセスするノードは入力を求めずに「要確認」とする)
+        
+        Returns:
+            ノード名 → 結果 (built / fresh / skipped / failed。dry_run では stale / fresh / network) の辞書
+        """
+        names = self.upstream(targets or list(self.nodes))
+        results = {}
+        
+        if dry_run:
+            for name in names:
+                node = self.nodes[name]
+                # 入力 (最新の取引日など) を求めるにはネットワークが必要なため判定しない
+                if node.network and not force:
+                    print(f"  要確認 (ネットワーク): {name}")
+                    results[name] = 'network'
+                    continue
+                stale = force or self.is_stale(node)
+                print(f"  {'作り直す' if stale else '最新'}: {name}")
+                results[name] = 'stale' if stale else 'fresh'
+            return results
+        
+        remaining = list(names)
+        running = {}
+        blocked = set()
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            while remaining or running:
+                # 上流がすべて終わったノードを開始する
+                for name in list(remaining):
+                    node = self.nodes[name]
+                    deps = [dep for dep in node.deps if dep in names]
+                    if any(dep not in results for dep in deps):
+                        continue
+                    remaining.remove(name)
+                    
+                    # オフラインでスキップした上流は前回の出力をそのまま使う
+                    if any(dep in blocked for dep in deps):
+                        results[name] = 'skipped'
+                        blocked.add(name)
+                        print(f"- {name}: 上流が失敗したためスキップ")
+                    elif offline and node.network:
+                        results[name] = 'skipped'
+                        print(f"- {name}: オフラインのためスキップ")
+                    elif not force and not self.is_stale(node):
+                        results[name] = 'fresh'
+                        print(f"= {name}: 最新")
+                    else:
+                        running[executor.submit(self.run_node, node)] = name
+                
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    if future.result():
+                        results[name] = 'built'
+                    else:
+                        results[name] = 'failed'
+                        blocked.add(name)
+        
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='データ生成パイプライン (古くなった段階だけを作り直す)')
+    parser.add_argument('targets', nargs='*', help=f"作り直すノード ({', '.join(n.name for n in NODES)})")
+    parser.add_argument('--jobs', type=int, default=DEFAULT_JOBS,
+                        help=f'同時に実行するノード数 (デフォルト: {DEFAULT_JOBS})')
+    parser.add_argument('--force', action='store_true', help='古くなっていないノードも作り直す')
+    parser.add_argument('--offline', action='store_true', help='株価取得 (ネットワーク) のノードは実行しない')
+    parser.add_argument('--dry-run', action='store_true', help='作り直すノードを表示するだけ')
+    args = parser.parse_args()
+    
+    graph = BuildGraph()
+    unknown = [t for t in args.targets if t not in graph.nodes]
+    if unknown:
+        parser.error(f"unknown node: {', '.join(unknown)}")
+    
+    start_time = time.time()
+    results = graph.build(args.targets or None, jobs=args.jobs, force=args.force,
+                          offline=args.offline, dry_run=args.dry_run)
+    if not args.dry_run:
+        counts = {status: sum(1 for r in results.values() if r == status)
+                  for status in ('built', 'fresh', 'skipped', 'failed')}
+        print(f"\n作り直し: {counts['built']} / 最新: {counts['fresh']} / "
+              f"スキップ: {counts['skipped']} / 失敗: {counts['failed']} ({time.time() - start_time:.1f}秒)")
+        if counts['failed']:
+            sys.exit(1)
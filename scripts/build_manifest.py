@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+公開用マニフェスト生成スクリプト
+docs 以下の公開データファイルごとに内容のハッシュとサイズを manifest.json に書き出す
+
+フロントエンドは manifest.json のハッシュを付けたURL (data/6920/recent.json?v=<hash>) で
+データを取得するため、ブラウザやCDNは内容が変わるまでキャッシュを使い続けられる。
+"""
+import hashlib
+from pathlib import Path
+
+import output_writer
+
+# 公開ディレクトリ
+DOCS_DIR = Path(__file__).parent.parent / 'docs'
+MANIFEST_FILE = DOCS_DIR / 'manifest.json'
+
+# マニフェストに載せるファイル (DOCS_DIR からの相対パターン)
+PUBLISHED_PATTERNS = ('themes.json', 'screener.json', 'catalog.json',
+                      'data/*.bin', 'data/*/*.json', 'themes/*.json', 'correlations/*.json')
+
+# マニフェストに載せるハッシュの桁数 (SHA-256 の先頭)
+HASH_LENGTH = 16
+
+
+def content_hash(data: bytes) -> str:
+    """
+    ファイル内容のハッシュ
+    
+    Args:
+        data: ファイル内容
+    
+    Returns:
+        SHA-256 の先頭 HASH_LENGTH 桁
+    """
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def list_published_files(docs_dir: Path = DOCS_DIR) -> list:
+    """
+    公開対象のファイルを列挙
+    
+    Args:
+        docs_dir: 公開ディレクトリ
+    
+    Returns:
+        ファイルパスのリスト (パス順)
+    """
+    files = set()
+    for pattern in PUBLISHED_PATTERNS:
+        files.update(p for p in docs_dir.glob(pattern) if p.is_file())
+    return sorted(files)
+
+
+def build_manifest(docs_dir: Path = DOCS_DIR) -> dict:
+    """
+    公開データのマニフェストを作成
+    
+    Args:
+        docs_dir: 公開ディレクトリ
+    
+    Returns:
+        manifest.json の内容
+    """
+    published = list_published_files(docs_dir)
+    files = {}
+    
+    for path in published:
+        data = path.read_bytes()
+        files[path.relative_to(docs_dir).as_posix()] = {'hash': content_hash(data), 'size': len(data)}
+    
+    return {'version': 1, 'files': files}
+
+
+def save_manifest(manifest: dict, path: Path = MANIFEST_FILE) -> Path:
+    """
+    マニフェストを保存
+    
+    Args:
+        manifest: build_manifest の戻り値
+        path: 保存先
+    
+    Returns:
+        保存したファイルのパス
+    """
+    output_writer.write_json(path, manifest, separators=(',', ':'), sort_keys=True)
+    return path
+
+
+if __name__ == "__main__":
+    manifest = build_manifest()
+    output_file = save_manifest(manifest)
+    
+    files = manifest['files']
+    total_size = sum(e['size'] for e in files.values())
+    print(f"✓ Manifest saved to {output_file}")
+    print(f"  Files: {len(files)}")
+    print(f"  Total size: {total_size / 1024:.1f} KB")
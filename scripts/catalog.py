@@ -0,0 +1,121 @@
+"""
+銘柄カタログ
+出力した銘柄データの概要 (銘柄コード・銘柄名・セクター・期間・行数・内容ハッシュ) を
+docs/catalog.json にまとめ、銘柄の一覧が必要な処理は銘柄データファイルを読まずにこれを参照する
+
+銘柄データを保存するたびに該当銘柄のエントリを更新する。
+"""
+import json
+import threading
+from pathlib import Path
+
+import output_writer
+
+# カタログの保存先
+CATALOG_FILE = Path(__file__).parent.parent / 'docs' / 'catalog.json'
+
+# エントリに載せる内容ハッシュの桁数 (正規形のSHA-256の先頭)
+HASH_LENGTH = 16
+
+
+class Catalog:
+    """
+    銘柄コードをキーとする出力済み銘柄データの概要
+    """
+    
+    def __init__(self, path: Path = CATALOG_FILE):
+        """
+        Args:
+            path: カタログファイルのパス
+        """
+        self.path = Path(path)
+        self.entries = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stocks = json.load(f).get('stocks', [])
+            self.entries = {entry['code']: entry for entry in stocks}
+        except Exception as e:
+            print(f"Error reading catalog: {e}")
+            self.entries = {}
+    
+    def put(self, output: dict):
+        """
+        出力JSON (列形式) の内容でエントリを更新
+        
+        Args:
+            output: to_columnar で変換した出力JSONの内容
+        """
+        dates = output.get('dates', [])
+        entry = {
+            'code': output['stock_code'],
+            'name': output.get('stock_name'),
+            'sector': output.get('sector'),
+            'industry': output.get('industry'),
+            'base_date': dates[0] if dates else None,
+            'latest_date': dates[-1] if dates else None,
+            'rows': len(dates),
+            'hash': output_writer.canonical_hash(output)[:HASH_LENGTH]
+        }
+        
+        with self._lock:
+            if self.entries.get(entry['code']) != entry:
+                self.entries[entry['code']] = entry
+                self._dirty = True
+    
+    def remove(self, code: str):
+        """
+        エントリを削除
+        
+        Args:
+            code: 銘柄コード
+        """
+        with self._lock:
+            if self.entries.pop(code, None) is not None:
+                self._dirty = True
+    
+    def stocks(self) -> list:
+        """
+        銘柄コード順のエントリ一覧
+        
+        Returns:
+            エントリのリスト
+        """
+        with self._lock:
+            return [self.entries[code] for code in sorted(self.entries)]
+    
+    def save(self):
+        """
+        変更があればカタログを書き出す
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            stocks = [self.entries[code] for code in sorted(self.entries)]
+            self._dirty = False
+        
+        output_writer.write_json(self.path, {'stocks': stocks}, separators=(',', ':'))
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> Catalog:
+    """
+    共有カタログを取得 (未読み込みなら読み込む)
+    
+    Returns:
+        Catalog
+    """
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = Catalog()
+        return _catalog
@@ -0,0 +1,128 @@
+"""
+並列実行モジュール
+ワーカープールで銘柄ごとの処理を並列に実行し、接続先ホストごとの
+トークンバケットでリクエストレートを制御する
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import rate_limiter
+import retry_policy
+
+# デフォルトの並列数
+DEFAULT_WORKERS = 4
+
+
+def add_runner_arguments(parser, default_delay: float = 2):
+    """
+    並列数・レート制限のコマンドライン引数を追加
+    
+    Args:
+        parser: argparse.ArgumentParser
+        default_delay: デフォルトのリクエスト間隔(秒)
+    """
+    parser.add_argument('delay', nargs='?', type=float, default=default_delay,
+                        help=f'ホストごとのリクエスト間隔(秒)。--rate 未指定時は 1/delay リクエスト/秒 (デフォルト: {default_delay})')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'並列ワーカー数 (デフォルト: {DEFAULT_WORKERS})')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='ホストごとの最大リクエスト数/秒 (0で制限なし)')
+    parser.add_argument('--burst', type=float, default=1,
+                        help='連続して送れるリクエスト数 (デフォルト: 1)')
+
+
+def configure_rate_limits(args) -> float:
+    """
+    コマンドライン引数からホストごとのレート制限を設定
+    
+    Args:
+        args: add_runner_arguments で追加した引数の解析結果
+    
+    Returns:
+        設定したリクエスト数/秒
+    """
+    if args.rate is not None:
+        rate = args.rate
+    elif args.delay > 0:
+        rate = 1 / args.delay
+    else:
+        rate = 0
+    
+    for host in (rate_limiter.YAHOO_HOST, rate_limiter.JPX_HOST):
+        rate_limiter.configure(host, rate, args.burst)
+    
+    return rate
+
+
+def run_concurrent(items: list, process, workers: int = DEFAULT_WORKERS, label=str) -> dict:
+    """
+    銘柄ごとの処理をワーカープールで並列実行
+    
+    Args:
+        items: 処理対象のリスト
+        process: 1件を処理する関数。成功時は出力ファイルのパス、失敗時はNoneを返す
+        workers: 並列ワーカー数
+        label: 進捗表示用に対象を文字列化する関数
+    
+    Returns:
+        success_count, error_count, errors, failed (失敗した対象のリスト), elapsed を持つ辞書
+    """
+    total = len(items)
+    stats = {'success_count': 0, 'error_count': 0, 'errors': [], 'failed': []}
+    lock = threading.Lock()
+    start_time = time.time()
+    done = 0
+    
+    def task(item):
+        nonlocal done
+        try:
+            output_file = process(item)
+            error = None if output_file else 'データ生成失敗'
+        except Exception as e:
+            output_file = None
+            error = str(e)
+        
+        with lock:
+            done += 1
+            if error is None:
+                stats['success_count'] += 1
+                status = f"✓ 成功: {output_file.name}"
+            else:
+                stats['error_count'] += 1
+                stats['errors'].append(f"{label(item)}: {error}")
+                stats['failed'].append(item)
+                status = f"✗ 失敗: {error}"
+            
+            elapsed = time.time() - start_time
+            remaining = (total - done) * elapsed / done
+            print(f"[{done}/{total}] {label(item)} {status}")
+            print(f"  進捗: {done}/{total} ({done/total*100:.1f}%) | 経過時間: {elapsed/60:.1f}分 | 残り時間: {remaining/60:.1f}分\n")
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(task, items))
+    
+    stats['elapsed'] = time.time() - start_time
+    return stats
+
+
+def print_throughput(stats: dict):
+    """
+    達成したスループットを表示
+    
+    Args:
+        stats: run_concurrent の戻り値
+    """
+    elapsed = max(stats['elapsed'], 1e-9)
+    processed = stats['success_count'] + stats['error_count']
+    print(f"スループット: {processed / elapsed * 60:.1f}銘柄/分")
+    
+    for host in (rate_limiter.YAHOO_HOST, rate_limiter.JPX_HOST):
+        bucket = rate_limiter.get_limiter(host)
+        if bucket and bucket.acquired:
+            print(f"  {host}: {bucket.acquired}リクエスト ({bucket.acquired / elapsed:.2f}/秒, 上限 {bucket.rate:.2f}/秒)")
+        
+        breaker = retry_policy.get_breaker(host)
+        if breaker.failures or breaker.rejected:
+            print(f"  {host}: 失敗 {breaker.failures}回 / 再試行 {breaker.retried}回 / "
+                  f"一時停止 {breaker.opened}回 (再開を待って諦めたリクエスト {breaker.rejected}件)")
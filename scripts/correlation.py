@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+銘柄間の相関行列・相対パフォーマンスの計算スクリプト
+全銘柄の日次リターンを共通の取引日に揃え、直近 20・60・250 取引日の相関行列を全銘柄まとめて計算し、
+テーマごとの部分行列と構成銘柄の相対パフォーマンス (基準日=100) を docs/correlations/<theme_id>.json に出力する
+
+相関行列は銘柄の列をブロックに分けて行列積で求めるため、銘柄数が増えても
+一度に必要なメモリは ブロックの銘柄数 × 全銘柄数 に収まる。
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from indicators import load_panel, ffill, shift
+from theme_index import load_theme_members
+import output_writer
+
+# 出力先
+CORRELATION_DIR = Path(__file__).parent.parent / 'docs' / 'correlations'
+
+# 相関を計算する期間 (取引日数)
+CORRELATION_WINDOWS = (20, 60, 250)
+
+# 相関を計算する最低限の共通取引日数の割合 (期間に対して)
+MIN_OVERLAP = 0.8
+
+# 一度に計算する銘柄数 (列のブロック)
+BLOCK_SIZE = 256
+
+# 相対パフォーマンスを出力する期間 (取引日数)
+RELATIVE_DAYS = 250
+
+# 相関行列を出力するテーマの最大銘柄数 (日経225全体など大きいテーマは出力しない)
+MAX_MATRIX_CODES = 100
+
+# 出力する値の小数点以下の桁数
+DECIMALS = 3
+
+
+def daily_returns(panel) -> np.ndarray:
+    """
+    共通の取引日に揃えた日次リターン (取引のない日・上場初日は NaN)
+    
+    Args:
+        panel: Panel
+    
+    Returns:
+        日数 × 銘柄数 の配列
+    """
+    close = panel['Close']
+    return close / shift(ffill(close)) - 1
+
+
+def correlation_matrix(returns: np.ndarray, min_periods: int = 2, block_size: int = BLOCK_SIZE) -> np.ndarray:
+    """
+    銘柄間の相関行列 (銘柄の組ごとに両方に値がある日だけで計算)
+    
+    Args:
+        returns: 日数 × 銘柄数 のリターン (値のない日は NaN)
+        min_periods: 相関を計算する最低限の共通日数 (足りない組は NaN)
+        block_size: 一度に計算する銘柄数
+    
+    Returns:
+        銘柄数 × 銘柄数 の相関行列
+    """
+    valid = (~np.isnan(returns)).astype(float)
+    x = np.where(valid > 0, returns, 0.0)
+    x2 = x * x
+    
+    n_codes = returns.shape[1]
+    corr = np.full((n_codes, n_codes), np.nan)
+    for start in range(0, n_codes, block_size):
+        block = slice(start, min(start + block_size, n_codes))
+        
+        # 組 (i, j) ごとに両方に値がある日の件数・合計・二乗和・積和
+        count = valid[:, block].T @ valid
+        sum_x = x[:, block].T @ valid
+        sum_y = valid[:, block].T @ x
+        sum_xx = x2[:, block].T @ valid
+        sum_yy = valid[:, block].T @ x2
+        sum_xy = x[:, block].T @ x
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = count * sum_xy - sum_x * sum_y
+            var_x = count * sum_xx - sum_x * sum_x
+            var_y = count * sum_yy - sum_y * sum_y
+            values = cov / np.sqrt(var_x * var_y)
+        
+        values[(count < min_periods) | (var_x <= 0) | (var_y <= 0)] = np.nan
+        corr[block] = np.clip(values, -1.0, 1.0)
+    
+    return corr
+
+
+def rolling_correlations(returns: np.ndarray, windows: tuple = CORRELATION_WINDOWS) -> dict:
+    """
+    直近の期間ごとの相関行列
+    
+    Args:
+        returns: 日数 × 銘柄数 のリターン
+        windows: 期間 (取引日数) のタプル
+    
+    Returns:
+        期間 → 銘柄数 × 銘柄数 の相関行列 の辞書
+    """
+    return {
+        window: correlation_matrix(returns[-window:], min_periods=max(2, int(window * MIN_OVERLAP)))
+        for window in windows
+    }
+
+
+def relative_performance(panel, codes: list, days: int = RELATIVE_DAYS) -> dict:
+    """
+    指定した銘柄の終値を期間の最初の日を100として揃えた系列
+    
+    Args:
+        panel: Panel
+        codes: 銘柄コードのリスト
+        days: 期間 (取引日数)
+    
+    Returns:
+        dates, base_date, columns (銘柄コード → 系列) を持つ辞書
+    """
+    cols = [panel.column(code) for code in codes]
+    close = ffill(panel['Close'][:, cols])[-days:]
+    dates = panel.dates[-days:]
+    
+    # 期間の途中で取引が始まった銘柄は最初の取引日を基準にする
+    base = close[np.argmax(~np.isnan(close), axis=0), np.arange(len(cols))]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rebased = np.round(close / base * 100, 2)
+    
+    return {
+        'base_date': str(dates[0]) if len(dates) else None,
+        'dates': dates.astype(str).tolist(),
+        'columns': {
+            code: np.where(np.isnan(rebased[:, i]), None, rebased[:, i]).tolist()
+            for i, code in enumerate(codes)
+        }
+    }
+
+
+def slice_matrix(matrix: np.ndarray, cols: list) -> list:
+    """
+    相関行列から指定した列・行の部分行列を切り出す
+    
+    Args:
+        matrix: 相関行列
+        cols: 列の位置のリスト
+    
+    Returns:
+        JSONに変換できる2次元リスト (値のない組は None)
+    """
+    sub = np.round(matrix[np.ix_(cols, cols)], DECIMALS)
+    return np.where(np.isnan(sub), None, sub).tolist()
+
+
+def build_theme_output(panel, matrices: dict, theme: dict) -> dict:
+    """
+    1テーマ分の相関行列・相対パフォーマンスを作成
+    
+    Args:
+        panel: Panel
+        matrices: rolling_correlations の戻り値
+        theme: テーマ ({id, name, codes})
+    
+    Returns:
+        出力JSONの内容
+    """
+    codes = [code for code in theme['codes'] if code in panel.codes]
+    cols = [panel.column(code) for code in codes]
+    return {
+        'theme_id': theme['id'],
+        'name': theme['name'],
+        'latest_date': str(panel.dates[-1]) if len(panel.dates) else None,
+        'codes': codes,
+        'correlations': {str(window): slice_matrix(matrix, cols) for window, matrix in matrices.items()},
+        'relative_performance': relative_performance(panel, codes)
+    }
+
+
+def save_theme_correlations(panel, matrices: dict, themes: list, output_dir: Path = CORRELATION_DIR) -> int:
+    """
+    テーマごとの相関行列・相対パフォーマンスを保存 (内容が変わらないファイルは書き込まない)
+    
+    Args:
+        panel: Panel
+        matrices: rolling_correlations の戻り値
+        themes: load_theme_members の戻り値
+        output_dir: 出力先
+    
+    Returns:
+        保存したテーマ数
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    names = set()
+    for theme in themes:
+        if len(theme['codes']) > MAX_MATRIX_CODES:
+            continue
+        name = f"{theme['id']}.json"
+        output_writer.write_json(output_dir / name, build_theme_output(panel, matrices, theme),
+                                 separators=(',', ':'))
+        names.add(name)
+    
+    # 出力しなくなったテーマのファイルを削除
+    for path in output_dir.glob('*.json'):
+        if path.name not in names:
+            path.unlink()
+    
+    return len(names)
+
+
+if __name__ == "__main__":
+    # 引数で銘柄コードを指定した場合はその銘柄の相関行列と相対パフォーマンスを表示する
+    # (ファイルは出力しない)
+    codes = sys.argv[1:]
+    
+    start_time = time.time()
+    panel = load_panel(fields=('Close',))
+    matrices = rolling_correlations(daily_returns(panel))
+    elapsed = time.time() - start_time
+    print(f"Computed {len(matrices)} correlation matrices over {len(panel.codes)} stocks ({elapsed * 1000:.0f}ms)")
+    
+    if codes:
+        cols = [panel.column(code) for code in codes]
+        for window, matrix in matrices.items():
+            print(f"\n{window}日相関:")
+            for code, row in zip(codes, slice_matrix(matrix, cols)):
+                print(f"  {code}: {row}")
+        relative = relative_performance(panel, codes)
+        print(f"\n相対パフォーマンス ({relative['base_date']}=100):")
+        for code, series in relative['columns'].items():
+            print(f"  {code}: {series[-1]}")
+    else:
+        count = save_theme_correlations(panel, matrices, load_theme_members())
+        print(f"✓ Saved correlations for {count} themes to {CORRELATION_DIR}")
+        output_writer.print_write_summary()
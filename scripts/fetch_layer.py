@@ -0,0 +1,479 @@
+"""
+取得レイヤー
+全データ取得処理で共有するHTTPセッションと、ディスク上のレスポンスキャッシュ
+
+- HTTPは接続を再利用するセッションで取得し、ETag / Last-Modified による条件付き取得を行う
+- レスポンス本体は内容のハッシュ (SHA-256) をファイル名として保存する
+- yfinanceの取得結果も同じキャッシュに保存し、--replay ではキャッシュのみから返す
+- 失敗したリクエストは retry_policy で接続先ホストごとに再試行する
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+import rate_limiter
+import retry_policy
+
+# キャッシュの保存先
+CACHE_DIR = Path(__file__).parent.parent / '.cache' / 'http'
+
+# 接続プールのサイズ
+POOL_SIZE = 16
+
+# HTTPリクエストのタイムアウト(秒)
+DEFAULT_TIMEOUT = 30
+
+# 整理で削除するエントリの経過日数 (最後に取得・再検証してからの日数)
+PRUNE_MAX_AGE_DAYS = 14
+
+# 整理後のレスポンス本体の合計サイズの上限(MB)
+PRUNE_MAX_MB = 512
+
+
+class CacheMissError(Exception):
+    """
+    リプレイモードでキャッシュにないデータを要求した
+    """
+
+
+class ResponseCache:
+    """
+    リクエストのキーごとにレスポンスを保存するディスクキャッシュ
+    
+    本体は blobs/<SHA-256> に、キーごとのメタデータ (ハッシュ・ETag・取得時刻など) は
+    keys/<キーのSHA-256>.json に保存する。
+    """
+    
+    def __init__(self, directory: Path = CACHE_DIR, replay: bool = False, max_age: float = 0):
+        """
+        Args:
+            directory: キャッシュの保存先
+            replay: Trueの場合はネットワークを使わずキャッシュのみから返す
+            max_age: この秒数以内に取得したエントリは再検証せずに返す
+        """
+        self.directory = Path(directory)
+        self.replay = replay
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+    
+    def _key_file(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return self.directory / 'keys' / f'{digest}.json'
+    
+    def _blob_file(self, content_hash: str) -> Path:
+        return self.directory / 'blobs' / content_hash[:2] / content_hash
+    
+    def lookup(self, key: str) -> tuple:
+        """
+        キャッシュされたレスポンスを取得
+        
+        Args:
+            key: リクエストのキー
+        
+        Returns:
+            (メタデータ, 本体) のタプル (キャッシュにない場合はNone)
+        """
+        key_file = self._key_file(key)
+        if not key_file.exists():
+            return None
+        try:
+            with open(key_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            body = self._blob_file(meta['hash']).read_bytes()
+        except Exception:
+            return None
+        return meta, body
+    
+    def is_fresh(self, meta: dict) -> bool:
+        """
+        再検証なしで返してよいエントリか判定
+        
+        Args:
+            meta: エントリのメタデータ
+        
+        Returns:
+            リプレイモード、または max_age 以内に取得したエントリならTrue
+        """
+        return self.replay or time.time() - meta.get('fetched_at', 0) < self.max_age
+    
+    def store(self, key: str, body: bytes, **meta) -> dict:
+        """
+        レスポンスを保存
+        
+        Args:
+            key: リクエストのキー
+            body: レスポンス本体
+            **meta: ETag・Last-Modified などのメタデータ
+        
+        Returns:
+            保存したメタデータ
+        """
+        content_hash = hashlib.sha256(body).hexdigest()
+        blob_file = self._blob_file(content_hash)
+        if not blob_file.exists():
+            _write_atomic(blob_file, body)
+        
+        meta = dict(meta, key=key, hash=content_hash, size=len(body), fetched_at=time.time())
+        _write_atomic(self._key_file(key), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+        return meta
+    
+    def touch(self, key: str, meta: dict):
+        """
+        再検証済み (304) のエントリの取得時刻を更新
+        
+        Args:
+            key: リクエストのキー
+            meta: エントリのメタデータ
+        """
+        meta = dict(meta, fetched_at=time.time())
+        _write_atomic(self._key_file(key), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+    
+    def count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+    
+    def prune(self, max_age_days: float = PRUNE_MAX_AGE_DAYS, max_bytes: int = None) -> dict:
+        """
+        古いエントリと参照されていない本体を削除
+        
+        最後に取得・再検証してから max_age_days 日を超えたキーを削除し、max_bytes を指定した場合は
+        本体の合計サイズが収まるまで取得時刻の古いキーから削除する。どのキーからも参照されない本体
+        (書き込み途中で残った一時ファイルを含む) は削除する。
+        
+        Args:
+            max_age_days: キーを残す日数
+            max_bytes: 本体の合計サイズの上限 (Noneの場合は制限しない)
+        
+        Returns:
+            {keys: 削除したキー数, blobs: 削除した本体数, bytes: 削除したバイト数, remaining: 残った本体の合計サイズ}
+        """
+        cutoff = time.time() - max_age_days * 86400
+        removed_keys = 0
+        
+        entries = []
+        for key_file in sorted((self.directory / 'keys').glob('*')):
+            try:
+                with open(key_file, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                content_hash = meta['hash']
+            except Exception:
+                meta = None
+            if meta is None or meta.get('fetched_at', 0) < cutoff or not self._blob_file(content_hash).exists():
+                key_file.unlink(missing_ok=True)
+                removed_keys += 1
+            else:
+                entries.append((meta.get('fetched_at', 0), key_file, content_hash))
+        
+        # 本体は複数のキーから参照されることがあるため、参照がなくなった時点でサイズから除く
+        refs = {}
+        for _, _, content_hash in entries:
+            refs[content_hash] = refs.get(content_hash, 0) + 1
+        total = sum(self._blob_file(h).stat().st_size for h in refs)
+        if max_bytes is not None:
+            for _, key_file, content_hash in sorted(entries, key=lambda e: e[0]):
+                if total <= max_bytes:
+                    break
+                key_file.unlink(missing_ok=True)
+                removed_keys += 1
+                refs[content_hash] -= 1
+                if refs[content_hash] == 0:
+                    del refs[content_hash]
+                    total -= self._blob_file(content_hash).stat().st_size
+        
+        removed_blobs = 0
+        removed_bytes = 0
+        for blob_file in (self.directory / 'blobs').glob('*/*'):
+            if blob_file.name not in refs:
+                removed_bytes += blob_file.stat().st_size
+                blob_file.unlink(missing_ok=True)
+                removed_blobs += 1
+        
+        return {'keys': removed_keys, 'blobs': removed_blobs, 'bytes': removed_bytes, 'remaining': total}
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+_cache = ResponseCache()
+_session = None
+_session_lock = threading.Lock()
+_timeout = DEFAULT_TIMEOUT
+
+
+def configure(replay: bool = False, max_age: float = 0, directory: Path = CACHE_DIR,
+              timeout: float = DEFAULT_TIMEOUT) -> ResponseCache:
+    """
+    共有キャッシュを設定
+    
+    Args:
+        replay: Trueの場合はネットワークを使わずキャッシュのみから返す
+        max_age: この秒数以内に取得したエントリは再取得しない
+        directory: キャッシュの保存先
+        timeout: 1リクエストあたりのタイムアウト(秒)
+    
+    Returns:
+        設定したResponseCache
+    """
+    global _cache, _timeout
+    _cache = ResponseCache(directory, replay=replay, max_age=max_age)
+    _timeout = timeout
+    return _cache
+
+
+def get_cache() -> ResponseCache:
+    """
+    共有キャッシュを取得
+    
+    Returns:
+        ResponseCache
+    """
+    return _cache
+
+
+def get_timeout() -> float:
+    """
+    1リクエストあたりのタイムアウト (yfinanceの取得にも使う)
+    
+    Returns:
+        タイムアウト(秒)
+    """
+    return _timeout
+
+
+def get_session() -> requests.Session:
+    """
+    接続を再利用する共有HTTPセッションを取得
+    
+    Returns:
+        requests.Session
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def fetch(url: str, timeout: float = None) -> bytes:
+    """
+    URLの内容を取得 (キャッシュがあれば条件付きリクエストで再検証)
+    
+    Args:
+        url: 取得するURL
+        timeout: タイムアウト(秒)。Noneの場合は get_timeout() の値
+    
+    Returns:
+        レスポンス本体
+    """
+    cache = get_cache()
+    key = f'GET {url}'
+    entry = cache.lookup(key)
+    
+    if entry and cache.is_fresh(entry[0]):
+        cache.count('hits')
+        return entry[1]
+    if cache.replay:
+        cache.count('misses')
+        raise CacheMissError(f"Not in response cache: {url}")
+    
+    headers = {}
+    if entry:
+        meta = entry[0]
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    
+    host = urlparse(url).hostname
+    
+    def request():
+        rate_limiter.acquire(host)
+        response = get_session().get(url, headers=headers, timeout=timeout or _timeout)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+    
+    response = retry_policy.call(host, request)
+    
+    if response.status_code == 304 and entry:
+        cache.count('revalidated')
+        cache.touch(key, entry[0])
+        return entry[1]
+    
+    cache.count('misses')
+    cache.store(key, response.content,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+                content_type=response.headers.get('Content-Type'))
+    return response.content
+
+
+def cached_call(key: str, loader, encode, decode):
+    """
+    HTTP以外の取得処理 (yfinanceなど) の結果をキャッシュ
+    
+    Args:
+        key: 取得内容を表すキー
+        loader: 実際に取得する関数
+        encode: 結果をバイト列に変換する関数 (Noneを返した結果は保存しない)
+        decode: バイト列から結果を復元する関数
+    
+    Returns:
+        取得結果
+    """
+    cache = get_cache()
+    entry = cache.lookup(key)
+    
+    if entry and cache.is_fresh(entry[0]):
+        cache.count('hits')
+        return decode(entry[1])
+    if cache.replay:
+        cache.count('misses')
+        raise CacheMissError(f"Not in response cache: {key}")
+    
+    result = loader()
+    cache.count('misses')
+    body = encode(result)
+    if body is not None:
+        cache.store(key, body)
+    return result
+
+
+def lookup_frame(key: str) -> pd.DataFrame:
+    """
+    再検証なしで返せるキャッシュ済みのDataFrameを取得
+    
+    Args:
+        key: 取得内容を表すキー
+    
+    Returns:
+        DataFrame (キャッシュにない・期限切れの場合はNone)
+    """
+    cache = get_cache()
+    entry = cache.lookup(key)
+    if entry and cache.is_fresh(entry[0]):
+        cache.count('hits')
+        return _decode_frame(entry[1])
+    return None
+
+
+def store_frame(key: str, df: pd.DataFrame):
+    """
+    DataFrameをキャッシュに保存 (空のDataFrameは保存しない)
+    
+    Args:
+        key: 取得内容を表すキー
+        df: 保存するDataFrame
+    """
+    body = _encode_frame(df)
+    if body is not None:
+        get_cache().store(key, body)
+
+
+def cached_frame(key: str, loader) -> pd.DataFrame:
+    """
+    DataFrameを返す取得処理の結果をキャッシュ (空の結果は保存しない)
+    
+    Args:
+        key: 取得内容を表すキー
+        loader: 実際に取得する関数
+    
+    Returns:
+        DataFrame
+    """
+    return cached_call(key, loader, _encode_frame, _decode_frame)
+
+
+def cached_json(key: str, loader) -> dict:
+    """
+    JSONに変換できる結果を返す取得処理の結果をキャッシュ
+    
+    Args:
+        key: 取得内容を表すキー
+        loader: 実際に取得する関数
+    
+    Returns:
+        取得結果
+    """
+    return cached_call(
+        key, loader,
+        lambda result: json.dumps(result, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8'),
+        lambda body: json.loads(body.decode('utf-8')))
+
+
+def _encode_frame(df: pd.DataFrame) -> bytes:
+    if df is None or df.empty:
+        return None
+    return df.to_csv(index=False).encode('utf-8')
+
+
+def _decode_frame(body: bytes) -> pd.DataFrame:
+    return pd.read_csv(io.BytesIO(body), dtype={'Date': str}, float_precision='round_trip')
+
+
+def add_fetch_arguments(parser):
+    """
+    レスポンスキャッシュのコマンドライン引数を追加
+    
+    Args:
+        parser: argparse.ArgumentParser
+    """
+    parser.add_argument('--replay', action='store_true',
+                        help='ネットワークを使わずレスポンスキャッシュのみから取得する')
+    parser.add_argument('--cache-max-age', type=float, default=0,
+                        help='この秒数以内に取得したレスポンスは再取得しない (デフォルト: 0)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help=f'1リクエストあたりのタイムアウト(秒) (デフォルト: {DEFAULT_TIMEOUT})')
+    parser.add_argument('--retries', type=int, default=retry_policy.DEFAULT_RETRIES,
+                        help=f'失敗したリクエストの再試行回数 (デフォルト: {retry_policy.DEFAULT_RETRIES})')
+    parser.add_argument('--breaker-cooldown', type=float, default=retry_policy.COOLDOWN,
+                        help=f'連続して失敗したホストへのリクエストを止める秒数 (デフォルト: {retry_policy.COOLDOWN:.0f})')
+
+
+def configure_from_args(args) -> ResponseCache:
+    """
+    コマンドライン引数から共有キャッシュ・タイムアウト・再試行を設定
+    
+    Args:
+        args: add_fetch_arguments で追加した引数の解析結果
+    
+    Returns:
+        設定したResponseCache
+    """
+    retry_policy.configure(retries=args.retries, cooldown=args.breaker_cooldown)
+    return configure(replay=args.replay, max_age=args.cache_max_age, timeout=args.timeout)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='レスポンスキャッシュの整理 (古いエントリ・参照されていない本体を削除)')
+    parser.add_argument('--max-age-days', type=float, default=PRUNE_MAX_AGE_DAYS,
+                        help=f'最後に取得してからこの日数を超えたエントリを削除する (デフォルト: {PRUNE_MAX_AGE_DAYS})')
+    parser.add_argument('--max-mb', type=float, default=PRUNE_MAX_MB,
+                        help=f'本体の合計サイズの上限 (MB)。超えた分は古いエントリから削除する (デフォルト: {PRUNE_MAX_MB})')
+    args = parser.parse_args()
+    
+    cache = get_cache()
+    result = cache.prune(args.max_age_days, max_bytes=int(args.max_mb * 1024 * 1024))
+    print(f"✓ Pruned {result['keys']} keys and {result['blobs']} blobs ({result['bytes'] / 1024:.0f}KB) "
+          f"from {cache.directory}, {result['remaining'] / 1024:.0f}KB remaining")
@@ -1,25 +1,326 @@
 """
 信用取引データ取得スクリプト
 JPX公式サイトから信用取引残高データを取得
+
+JPXが毎週公表する全銘柄の信用取引週末残高ファイルを1回だけ読み込み、
+日付×銘柄コードの列形式のテーブルに変換して銘柄ごとに参照する。
 """
 import requests
 import pandas as pd
+import numpy as np
 from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
+from pathlib import Path
 import json
 import sys
 import re
+import threading
+import fetch_layer
+import run_metrics
+from jpx_files import (read_rows, list_report_files, find_report_links, find_column, find_header, find_date,
+                       parse_number, normalize_jpx_code)
+
+# 週次の信用取引残高ファイルの保存先
+MARGIN_DATA_DIR = Path(__file__).parent.parent / '.cache' / 'jpx_margin'
+
+# 銘柄別信用取引週末残高の公表ページ (週次ファイルへのリンクが並ぶ)
+MARGIN_LIST_URL = "https://www.jpx.co.jp/markets/statistics-equities/margin/05.html"
+
+# 公表ページから取得する週数 (取得済みのファイルはダウンロードしない)
+MARGIN_DOWNLOAD_WEEKS = 8
+
+# 解析の確認に使う週次ファイルのサンプル (JPXの公表形式・Shift_JIS)
+SAMPLE_FILE = Path(__file__).parent / 'fixtures' / 'margin_weekly_sample.csv'
+
+# 列名の判定に使うキーワード (JPXの日本語表記と英語表記)
+CODE_KEYS = ('コード', 'code')
+BUY_KEYS = ('買残高', 'marginbuy')
+SELL_KEYS = ('売残高', 'marginsell')
+DATE_KEYS = ('申込日', '日付', 'date')
+
+
+class MarginBalanceTable:
+    """
+    1週分の全銘柄の信用取引残高
+    
+    銘柄コードから行番号への辞書と、買残高・売残高の列配列を持つ。
+    """
+    
+    def __init__(self, date: str, codes: list, buy, sell):
+        """
+        Args:
+            date: 残高の基準日 (YYYY-MM-DD)
+            codes: 銘柄コードのリスト
+            buy: 信用買い残の配列
+            sell: 信用売り残の配列
+        """
+        self.date = date
+        self.codes = list(codes)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.buy = np.asarray(buy, dtype=np.float64)
+        self.sell = np.asarray(sell, dtype=np.float64)
+    
+    def __len__(self):
+        return len(self.codes)
+    
+    def lookup(self, code: str):
+        """
+        銘柄の残高を取得
+        
+        Args:
+            code: 銘柄コード (4桁)
+        
+        Returns:
+            (信用買い残, 信用売り残) のタプル (該当なしの場合はNone)
+        """
+        i = self.index.get(code)
+        if i is None:
+            return None
+        return self.buy[i], self.sell[i]
+
+
+class MarginBalanceIndex:
+    """
+    複数週の信用取引残高を日付×銘柄コードの2次元配列にまとめた索引
+    """
+    
+    def __init__(self, tables: list):
+        """
+        Args:
+            tables: MarginBalanceTableのリスト (同じ日付は後のものを優先)
+        """
+        by_date = {t.date: t for t in tables}
+        self.dates = sorted(by_date)
+        self.codes = sorted(set(code for t in by_date.values() for code in t.codes))
+        self.code_index = {code: j for j, code in enumerate(self.codes)}
+        
+        shape = (len(self.dates), len(self.codes))
+        self.buy = np.full(shape, np.nan)
+        self.sell = np.full(shape, np.nan)
+        
+        for i, date in enumerate(self.dates):
+            table = by_date[date]
+            if not len(table):
+                continue
+            cols = np.array([self.code_index[code] for code in table.codes])
+            self.buy[i, cols] = table.buy
+            self.sell[i, cols] = table.sell
+    
+    def __contains__(self, code):
+        return code in self.code_index
+    
+    def get(self, code: str) -> pd.DataFrame:
+        """
+        銘柄の週次残高を取得
+        
+        Args:
+            code: 銘柄コード (4桁)
+        
+        Returns:
+            Date, MarginBuy, MarginSell のDataFrame (該当なしの場合は空)
+        """
+        j = self.code_index.get(code)
+        if j is None:
+            return pd.DataFrame()
+        
+        mask = ~np.isnan(self.buy[:, j]) | ~np.isnan(self.sell[:, j])
+        return pd.DataFrame({
+            'Date': np.array(self.dates)[mask],
+            'MarginBuy': self.buy[mask, j],
+            'MarginSell': self.sell[mask, j],
+        })
+
+
+def parse_weekly_margin_file(source, date: str = None) -> MarginBalanceTable:
+    """
+    JPXの全銘柄信用取引週末残高ファイル (CSV/Excel) を解析
+    
+    Args:
+        source: ファイルのパス、またはCSVファイル内容のバイト列
+        date: 残高の基準日。省略時はファイル内の日付列・見出し・ファイル名から判定
+    
+    Returns:
+        MarginBalanceTable
+    """
+    rows, name = read_rows(source)
+    
+    # 見出し行を探す (それより前の行は表題・基準日などの前置き)
+    header_pos = find_header(rows, CODE_KEYS, BUY_KEYS)
+    if header_pos is None:
+        raise ValueError(f"Margin balance header not found: {name}")
+    
+    header = rows[header_pos]
+    code_col = find_column(header, CODE_KEYS)
+    buy_col = find_column(header, BUY_KEYS)
+    sell_col = find_column(header, SELL_KEYS)
+    date_col = find_column(header, DATE_KEYS)
+    
+    codes, buy, sell = [], [], []
+    for row in rows[header_pos + 1:]:
+        if len(row) <= max(code_col, buy_col, sell_col if sell_col is not None else 0):
+            continue
+        code = normalize_jpx_code(row[code_col])
+        if not code:
+            continue
+        if date is None and date_col is not None:
+            date = find_date(row[date_col])
+        codes.append(code)
+        buy.append(parse_number(row[buy_col]))
+        sell.append(parse_number(row[sell_col]) if sell_col is not None else np.nan)
+    
+    if date is None:
+        preamble = ' '.join(' '.join(row) for row in rows[:header_pos])
+        date = find_date(preamble) or find_date(name)
+    if date is None:
+        raise ValueError(f"Margin balance date not found: {name}")
+    
+    return MarginBalanceTable(date, codes, buy, sell)
 
 
-def fetch_margin_data(stock_code: str) -> pd.DataFrame:
+def download_weekly_margin_file(url: str, directory: Path = MARGIN_DATA_DIR) -> Path:
+    """
+    JPXの週次信用取引残高ファイルをダウンロードして保存
+    
+    Args:
+        url: ファイルのURL
+        directory: 保存先ディレクトリ
+    
+    Returns:
+        保存したファイルのパス (取得済みの場合はダウンロードしない)
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    output_file = directory / url.rstrip('/').split('/')[-1]
+    
+    if output_file.exists():
+        print(f"Already downloaded: {output_file.name}")
+        return output_file
+    
+    print(f"Downloading margin balance file: {url}")
+    output_file.write_bytes(fetch_layer.fetch(url))
+    
+    return output_file
+
+
+def download_latest_margin_files(page_url: str = MARGIN_LIST_URL, weeks: int = MARGIN_DOWNLOAD_WEEKS,
+                                 directory: Path = MARGIN_DATA_DIR) -> list:
+    """
+    公表ページに並ぶ週次信用取引残高ファイルのうち新しいものをダウンロード
+    
+    Args:
+        page_url: 公表ページのURL
+        weeks: 取得する週数
+        directory: 保存先ディレクトリ
+    
+    Returns:
+        保存したファイルのパスのリスト
+    """
+    links = find_report_links(page_url, limit=weeks)
+    if not links:
+        raise ValueError(f"No margin balance files linked from {page_url}")
+    return [download_weekly_margin_file(url, directory) for url in links]
+
+
+def load_margin_index(directory: Path = MARGIN_DATA_DIR) -> MarginBalanceIndex:
+    """
+    保存済みの週次ファイルをすべて解析して索引を作成
+    
+    Args:
+        directory: 週次ファイルのディレクトリ
+    
+    Returns:
+        MarginBalanceIndex (ファイルがない場合はNone)
+    """
+    files = list_report_files(directory)
+    if not files:
+        return None
+    
+    tables = []
+    for file_path in files:
+        try:
+            tables.append(parse_weekly_margin_file(file_path))
+        except Exception as e:
+            print(f"Error parsing {file_path.name}: {e}")
+    
+    if not tables:
+        return None
+    
+    index = MarginBalanceIndex(tables)
+    print(f"Loaded margin balances: {len(index.dates)} weeks x {len(index.codes)} stocks")
+    return index
+
+
+def _expect(label: str, actual, expected):
+    # python -O でも確認を省略しないよう assert ではなく例外を送出する
+    if actual != expected:
+        raise ValueError(f"{label}: expected {expected!r}, got {actual!r}")
+
+
+def check_sample_file(path: Path = SAMPLE_FILE):
+    """
+    サンプルの週次ファイルを解析し、索引から銘柄ごとの残高を正しく参照できるか確認
+    
+    Args:
+        path: サンプルの週次ファイル
+    
+    Raises:
+        ValueError: 解析・参照の結果が想定と異なる
+    """
+    table = parse_weekly_margin_file(path)
+    _expect('date', table.date, '2025-01-17')
+    _expect('codes', table.codes, ['6920', '7203', '285A', '1301'])
+    
+    # 2週目は同じファイルを別の基準日として取り込む
+    index = MarginBalanceIndex([table, parse_weekly_margin_file(path, date='2025-01-24')])
+    expected = {
+        '6920': (1234500, 123400),
+        '7203': (8765400, 2345600),
+        '285A': (789000, 56700),
+    }
+    for code, (buy, sell) in expected.items():
+        df = index.get(code)
+        _expect(f'{code} dates', df['Date'].tolist(), ['2025-01-17', '2025-01-24'])
+        _expect(f'{code} MarginBuy', df['MarginBuy'].tolist(), [buy, buy])
+        _expect(f'{code} MarginSell', df['MarginSell'].tolist(), [sell, sell])
+    
+    # 売残高が「-」の銘柄は欠損値、ファイルにない銘柄は空
+    df = index.get('1301')
+    _expect('1301 MarginBuy', df['MarginBuy'].tolist(), [12300, 12300])
+    _expect('1301 MarginSell missing', bool(df['MarginSell'].isna().all()), True)
+    _expect('9999 missing', (index.get('9999').empty, '9999' in index), (True, False))
+
+
+_margin_index = None
+_margin_index_loaded = False
+_margin_index_lock = threading.Lock()
+
+
+def get_margin_index() -> MarginBalanceIndex:
+    """
+    共有の信用取引残高索引を取得 (初回のみファイルを解析)
+    
+    Returns:
+        MarginBalanceIndex (週次ファイルがない場合はNone)
+    """
+    global _margin_index, _margin_index_loaded
+    with _margin_index_lock:
+        if not _margin_index_loaded:
+            _margin_index = load_margin_index()
+            _margin_index_loaded = True
+        return _margin_index
+
+
+@run_metrics.timed('margin_data')
+def fetch_margin_data(stock_code: str, index: MarginBalanceIndex = None) -> pd.DataFrame:
     """
     JPXから信用取引データを取得
     
     Args:
         stock_code: 銘柄コード (4桁)
+        index: 信用取引残高の索引。省略時は保存済みの週次ファイルから作成した共有索引を使う
     
     Returns:
-        信用取引データのDataFrame
+        信用取引データのDataFrame (週次ファイルを取り込んでいない場合は空)
     """
     try:
         # 銘柄コードを正規化
@@ -29,37 +330,24 @@ def fetch_margin_data(stock_code: str) -> pd.DataFrame:
         
         print(f"Fetching margin trading data for {stock_code}...")
         
-        # JPXの信用取引残高データURL
-        # 注: 実際のURLは変更される可能性があります
-        url = "https://www.jpx.co.jp/markets/statistics-equities/margin/index.html"
+        # 週次ファイルを取り込み済みなら索引から参照
+        if index is None:
+            index = get_margin_index()
+        if index is None:
+            # 架空の値は出力しない (python fetch_margin_data.py --download で週次ファイルを取得する)
+            print("No margin balance files ingested")
+            return pd.DataFrame()
         
-        # ここでは簡易的な実装として、サンプルデータを生成
-        # 実際の実装では、JPXのAPIまたはスクレイピングを使用
-        print("Note: Using sample data. Implement actual JPX scraping for production.")
-        
-        # サンプルデータ生成 (過去1年分の週次データ)
-        dates = pd.date_range(end=datetime.now(), periods=52, freq='W-FRI')
-        
-        # ランダムなデータ生成 (実際にはJPXから取得)
-        import numpy as np
-        # 銘柄コードからシード値を生成(文字列対応)
-        seed_value = sum(ord(c) for c in stock_code) if stock_code else 0
-        np.random.seed(seed_value)
-        
-        df = pd.DataFrame({
-            'Date': dates.strftime('%Y-%m-%d'),
-            'MarginBuy': np.random.randint(100000, 500000, 52),  # 信用買い残
-            'MarginSell': np.random.randint(50000, 300000, 52),  # 信用売り残
-        })
-        
-        print(f"Successfully generated {len(df)} records")
+        df = index.get(stock_code)
+        print(f"Found {len(df)} weekly records in margin balance index")
         return df
-        
+    
     except Exception as e:
         print(f"Error fetching margin data: {e}")
         return pd.DataFrame()
 
 
+@run_metrics.timed('interpolate_to_daily')
 def interpolate_to_daily(df: pd.DataFrame, start_date: str, end_date: str) -> pd.DataFrame:
     """
     週次データを日次データに補間
@@ -86,13 +374,41 @@ def interpolate_to_daily(df: pd.DataFrame, start_date: str, end_date: str) -> pd
         df_daily['Date'] = df_daily['Date'].dt.strftime('%Y-%m-%d')
         
         return df_daily
-        
+    
     except Exception as e:
         print(f"Error interpolating data: {e}")
         return df
 
 
 if __name__ == "__main__":
+    # --check: サンプルの週次ファイルで解析と銘柄ごとの参照を確認
+    if len(sys.argv) > 1 and sys.argv[1] == '--check':
+        sample = Path(sys.argv[2]) if len(sys.argv) > 2 else SAMPLE_FILE
+        check_sample_file(sample)
+        print(f"✓ Margin balance sample parsed and indexed: {sample.name}")
+        sys.exit(0)
+    
+    # --download [公表ページのURL]: 公表ページから新しい週次ファイルを取得して索引の内容を表示
+    if len(sys.argv) > 1 and sys.argv[1] == '--download':
+        page_url = sys.argv[2] if len(sys.argv) > 2 else MARGIN_LIST_URL
+        download_latest_margin_files(page_url)
+        index = load_margin_index()
+        sys.exit(0 if index else 1)
+    
+    # --ingest: 週次ファイル (パスまたはURL) を取り込んで索引の内容を表示
+    if len(sys.argv) > 2 and sys.argv[1] == '--ingest':
+        MARGIN_DATA_DIR.mkdir(parents=True, exist_ok=True)
+        for source in sys.argv[2:]:
+            if source.startswith('http'):
+                download_weekly_margin_file(source)
+            else:
+                table = parse_weekly_margin_file(source)
+                output_file = MARGIN_DATA_DIR / Path(source).name
+                output_file.write_bytes(Path(source).read_bytes())
+                print(f"Ingested {output_file.name}: {table.date}, {len(table)} stocks")
+        index = load_margin_index()
+        sys.exit(0 if index else 1)
+    
     # コマンドライン引数から銘柄コードを取得
     if len(sys.argv) > 1:
         code = sys.argv[1]
@@ -1,25 +1,375 @@
 """
 機関空売りデータ取得スクリプト
 JPX公式サイトから機関空売り残高報告データを取得
+
+日次の空売り残高報告ファイルを1日1回だけ解析し、報告者ごとの最新残高を
+銘柄ごとに合計して日付×銘柄コードの索引に追記する。
+取り込み済みの最終日以前の報告ファイル (遅れて届いた・差し替えられたもの) があれば、
+すべてのファイルから日付順に作り直す。
 """
 import requests
 import pandas as pd
+import numpy as np
 from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
+from pathlib import Path
+import bisect
+import hashlib
 import json
+import os
 import sys
 import re
+import threading
+import fetch_layer
+import output_writer
+import run_metrics
+from jpx_files import (read_rows, list_report_files, find_report_links, find_column, find_header, find_date,
+                       parse_number, normalize_jpx_code)
+
+# 日次の空売り残高報告ファイルと索引の保存先
+SHORT_DATA_DIR = Path(__file__).parent.parent / '.cache' / 'jpx_short'
+SHORT_INDEX_FILE = 'short_index.npz'
+POSITIONS_FILE = 'positions.json'
+
+# 空売り残高に関する情報の公表ページ (日次報告ファイルへのリンクが並ぶ)
+SHORT_LIST_URL = "https://www.jpx.co.jp/markets/public/short-selling/index.html"
+
+# 公表ページから取得する日数 (取得済みのファイルはダウンロードしない)
+SHORT_DOWNLOAD_DAYS = 20
+
+# 報告義務の基準となる残高割合 (これを下回った報告は残高の解消とみなす)
+REPORT_THRESHOLD = 0.005
+
+# 列名の判定に使うキーワード (JPXの日本語表記と英語表記)
+CODE_KEYS = ('銘柄コード', 'code')
+HOLDER_KEYS = ('商号', '氏名', 'holder')
+SHARES_KEYS = ('残高数量', 'shares')
+RATIO_KEYS = ('残高割合', 'ratio')
+DATE_KEYS = ('計算年月日', '計算日', 'date')
+
+
+def parse_short_selling_report(source, date: str = None) -> tuple:
+    """
+    JPXの日次空売り残高報告ファイル (CSV/Excel) を解析
+    
+    Args:
+        source: ファイルのパス、またはCSVファイル内容のバイト列
+        date: 報告の計算日。省略時はファイル内の日付列・見出し・ファイル名から判定
+    
+    Returns:
+        (計算日, [(銘柄コード, 報告者, 残高数量, 残高割合), ...]) のタプル
+    """
+    rows, name = read_rows(source)
+    
+    header_pos = find_header(rows, CODE_KEYS, SHARES_KEYS)
+    if header_pos is None:
+        raise ValueError(f"Short selling header not found: {name}")
+    
+    header = rows[header_pos]
+    code_col = find_column(header, CODE_KEYS)
+    shares_col = find_column(header, SHARES_KEYS)
+    holder_col = find_column(header, HOLDER_KEYS)
+    ratio_col = find_column(header, RATIO_KEYS)
+    date_col = find_column(header, DATE_KEYS)
+    
+    positions = []
+    for row in rows[header_pos + 1:]:
+        if len(row) <= max(code_col, shares_col):
+            continue
+        code = normalize_jpx_code(row[code_col])
+        shares = parse_number(row[shares_col])
+        if not code or np.isnan(shares):
+            continue
+        if date is None and date_col is not None:
+            date = find_date(row[date_col])
+        
+        holder = str(row[holder_col]).strip() if holder_col is not None and holder_col < len(row) else ''
+        ratio = np.nan
+        if ratio_col is not None and ratio_col < len(row):
+            cell = str(row[ratio_col])
+            ratio = parse_number(cell.replace('%', ''))
+            if '%' in cell:
+                ratio /= 100
+        positions.append((code, holder, shares, ratio))
+    
+    if date is None:
+        preamble = ' '.join(' '.join(str(c) for c in row) for row in rows[:header_pos])
+        date = find_date(preamble) or find_date(name)
+    if date is None:
+        raise ValueError(f"Short selling report date not found: {name}")
+    
+    return date, positions
 
 
-def fetch_short_selling_data(stock_code: str) -> pd.DataFrame:
+class ShortSellingIndex:
+    """
+    銘柄ごとの機関空売り残高 (報告者の最新残高の合計) を日付×銘柄コードで保持する索引
+    """
+    
+    def __init__(self, dates=None, codes=None, values=None, files=None, positions=None):
+        """
+        Args:
+            dates: 日付のリスト
+            codes: 銘柄コードのリスト
+            values: 日付×銘柄コードの残高の2次元配列
+            files: 取り込み済みのファイルの内容のハッシュのリスト
+            positions: 銘柄コード→報告者→最新残高数量 の辞書
+        """
+        self.dates = list(dates) if dates is not None else []
+        self.codes = list(codes) if codes is not None else []
+        self.code_index = {code: j for j, code in enumerate(self.codes)}
+        if values is not None:
+            self.values = np.asarray(values, dtype=np.float64).reshape(len(self.dates), len(self.codes))
+        else:
+            self.values = np.empty((len(self.dates), len(self.codes)))
+        self.files = set(files) if files is not None else set()
+        self.positions = positions if positions is not None else {}
+    
+    def __contains__(self, code):
+        return code in self.code_index
+    
+    @classmethod
+    def load(cls, directory: Path = SHORT_DATA_DIR):
+        """
+        保存済みの索引を読み込む (なければ空の索引)
+        
+        Args:
+            directory: 保存先ディレクトリ
+        
+        Returns:
+            ShortSellingIndex
+        """
+        directory = Path(directory)
+        index_file = directory / SHORT_INDEX_FILE
+        if not index_file.exists():
+            return cls()
+        
+        with np.load(index_file, allow_pickle=False) as npz:
+            dates = npz['dates'].tolist()
+            codes = npz['codes'].tolist()
+            values = npz['values']
+            files = npz['files'].tolist()
+        
+        positions = {}
+        positions_file = directory / POSITIONS_FILE
+        if positions_file.exists():
+            with open(positions_file, 'r', encoding='utf-8') as f:
+                positions = json.load(f)
+        
+        return cls(dates, codes, values, files, positions)
+    
+    def save(self, directory: Path = SHORT_DATA_DIR):
+        """
+        索引を保存
+        
+        Args:
+            directory: 保存先ディレクトリ
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        
+        # 取り込み済みのファイルは索引に記録するため、報告者ごとの残高を先に保存する
+        # (索引の保存前に中断しても、次の実行で同じファイルを取り込み直せば同じ残高になる)
+        output_writer.write_atomic(directory / POSITIONS_FILE,
+                                   json.dumps(self.positions, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+        
+        order = np.argsort(self.dates, kind='stable')
+        tmp_file = directory / f'{SHORT_INDEX_FILE}.tmp.npz'
+        np.savez(tmp_file,
+                 dates=np.array(self.dates, dtype='U10')[order],
+                 codes=np.array(self.codes, dtype='U8'),
+                 values=self.values[order],
+                 files=np.array(sorted(self.files), dtype='U'))
+        os.replace(tmp_file, directory / SHORT_INDEX_FILE)
+    
+    def ingest(self, date: str, reports: list, file_hash: str = None):
+        """
+        1日分の報告を反映して、その日の銘柄ごとの残高を索引に追記
+        
+        報告者ごとの残高は前日までの残高に積み上げるため、取り込み済みの最終日以降の日付を
+        日付順に取り込む (それより前の日付は ingest_short_selling_reports で作り直す)。
+        
+        Args:
+            date: 計算日
+            reports: parse_short_selling_report の報告リスト
+            file_hash: 取り込み済みとして記録するファイルの内容のハッシュ
+        """
+        for code, holder, shares, ratio in reports:
+            holders = self.positions.setdefault(code, {})
+            if shares <= 0 or (not np.isnan(ratio) and ratio < REPORT_THRESHOLD):
+                holders.pop(holder, None)
+            else:
+                holders[holder] = shares
+        
+        # 新しい銘柄の列を追加 (追加前の日付は欠損値)
+        new_codes = [c for c in self.positions if c not in self.code_index]
+        if new_codes:
+            for code in new_codes:
+                self.code_index[code] = len(self.codes)
+                self.codes.append(code)
+            self.values = np.pad(self.values, ((0, 0), (0, len(new_codes))), constant_values=np.nan)
+        
+        row = np.zeros(len(self.codes))
+        for code, holders in self.positions.items():
+            row[self.code_index[code]] = sum(holders.values())
+        
+        if date in self.dates:
+            self.values[self.dates.index(date)] = row
+        else:
+            i = bisect.bisect(self.dates, date)
+            self.dates.insert(i, date)
+            self.values = np.insert(self.values, i, row, axis=0)
+        
+        if file_hash:
+            self.files.add(file_hash)
+    
+    def get(self, code: str) -> pd.DataFrame:
+        """
+        銘柄の日次の機関空売り残高を取得
+        
+        Args:
+            code: 銘柄コード (4桁)
+        
+        Returns:
+            Date, ShortSelling のDataFrame (該当なしの場合は空)
+        """
+        j = self.code_index.get(code)
+        if j is None or not self.dates:
+            return pd.DataFrame()
+        
+        order = np.argsort(self.dates, kind='stable')
+        column = self.values[order, j]
+        mask = ~np.isnan(column)
+        return pd.DataFrame({
+            'Date': np.array(self.dates)[order][mask],
+            'ShortSelling': column[mask],
+        })
+
+
+def download_short_selling_report(url: str, directory: Path = SHORT_DATA_DIR) -> Path:
+    """
+    JPXの日次空売り残高報告ファイルをダウンロードして保存
+    
+    Args:
+        url: ファイルのURL
+        directory: 保存先ディレクトリ
+    
+    Returns:
+        保存したファイルのパス (取得済みの場合はダウンロードしない)
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    output_file = directory / url.rstrip('/').split('/')[-1]
+    
+    if output_file.exists():
+        print(f"Already downloaded: {output_file.name}")
+        return output_file
+    
+    print(f"Downloading short selling report: {url}")
+    output_file.write_bytes(fetch_layer.fetch(url))
+    
+    return output_file
+
+
+def download_latest_short_selling_reports(page_url: str = SHORT_LIST_URL, days: int = SHORT_DOWNLOAD_DAYS,
+                                          directory: Path = SHORT_DATA_DIR) -> list:
+    """
+    公表ページに並ぶ日次空売り残高報告ファイルのうち新しいものをダウンロード
+    
+    Args:
+        page_url: 公表ページのURL
+        days: 取得する日数
+        directory: 保存先ディレクトリ
+    
+    Returns:
+        保存したファイルのパスのリスト
+    """
+    links = find_report_links(page_url, limit=days)
+    if not links:
+        raise ValueError(f"No short selling reports linked from {page_url}")
+    return [download_short_selling_report(url, directory) for url in links]
+
+
+def _parse_report_files(files: list, hashes: dict) -> list:
+    parsed = []
+    for file_path in files:
+        try:
+            date, reports = parse_short_selling_report(file_path)
+            parsed.append((date, file_path.name, reports, hashes[file_path]))
+        except Exception as e:
+            print(f"Error parsing {file_path.name}: {e}")
+    return sorted(parsed, key=lambda p: (p[0], p[1]))
+
+
+def ingest_short_selling_reports(directory: Path = SHORT_DATA_DIR) -> ShortSellingIndex:
+    """
+    ディレクトリ内の未取り込みの日次報告ファイルを日付順に索引へ追記
+    
+    取り込み済みのファイルは内容のハッシュで判定して読み飛ばす (同じ名前で差し替えられたファイルは取り込み直す)。
+    未取り込みのファイルに取り込み済みの最終日以前の日付があれば、報告者ごとの残高を正しく積み上げるため
+    すべてのファイルから日付順に作り直す。
+    
+    Args:
+        directory: 日次報告ファイルと索引のディレクトリ
+    
+    Returns:
+        ShortSellingIndex
+    """
+    index = ShortSellingIndex.load(directory)
+    files = list_report_files(directory)
+    hashes = {file_path: hashlib.sha256(file_path.read_bytes()).hexdigest() for file_path in files}
+    parsed = _parse_report_files([f for f in files if hashes[f] not in index.files], hashes)
+    
+    if parsed and index.dates and parsed[0][0] <= max(index.dates):
+        print(f"Short selling report for {parsed[0][0]} is not after the last ingested day "
+              f"({max(index.dates)}), rebuilding index from {len(files)} files")
+        index = ShortSellingIndex()
+        parsed = _parse_report_files(files, hashes)
+    
+    for date, _, reports, file_hash in parsed:
+        index.ingest(date, reports, file_hash)
+    
+    if parsed:
+        index.save(directory)
+    
+    print(f"Short selling index: {len(parsed)} new reports, "
+          f"{len(index.dates)} days x {len(index.codes)} stocks")
+    return index
+
+
+_short_index = None
+_short_index_loaded = False
+_short_index_lock = threading.Lock()
+
+
+def get_short_index() -> ShortSellingIndex:
+    """
+    共有の機関空売り索引を取得 (初回のみ新しい報告ファイルを取り込む)
+    
+    Returns:
+        ShortSellingIndex (報告ファイルを取り込んでいない場合はNone)
+    """
+    global _short_index, _short_index_loaded
+    with _short_index_lock:
+        if not _short_index_loaded:
+            if SHORT_DATA_DIR.exists():
+                index = ingest_short_selling_reports(SHORT_DATA_DIR)
+                _short_index = index if index.dates else None
+            _short_index_loaded = True
+        return _short_index
+
+
+@run_metrics.timed('short_selling_data')
+def fetch_short_selling_data(stock_code: str, index: ShortSellingIndex = None) -> pd.DataFrame:
     """
     JPXから機関空売りデータを取得
     
     Args:
         stock_code: 銘柄コード (4桁)
+        index: 機関空売りの索引。省略時は保存済みの日次報告から作成した共有索引を使う
     
     Returns:
-        機関空売りデータのDataFrame
+        機関空売りデータのDataFrame (報告ファイルを取り込んでいない場合は空)
     """
     try:
         # 銘柄コードを正規化
@@ -29,37 +379,18 @@ def fetch_short_selling_data(stock_code: str) -> pd.DataFrame:
         
         print(f"Fetching short selling data for {stock_code}...")
         
-        # JPXの空売り残高報告URL
-        # 注: 実際のURLは変更される可能性があります
-        url = "https://www.jpx.co.jp/markets/statistics-equities/short-selling/index.html"
-        
-        # ここでは簡易的な実装として、サンプルデータを生成
-        # 実際の実装では、JPXのAPIまたはスクレイピングを使用
-        print("Note: Using sample data. Implement actual JPX scraping for production.")
-        
-        # サンプルデータ生成 (過去1年分の日次データ)
-        dates = pd.date_range(end=datetime.now(), periods=250, freq='B')  # 営業日のみ
-        
-        # ランダムなデータ生成 (実際にはJPXから取得)
-        import numpy as np
-        # 銘柄コードからシード値を生成(文字列対応)
-        seed_value = sum(ord(c) for c in stock_code) if stock_code else 0
-        np.random.seed(seed_value + 1000)
-        
-        # 空売り残高のトレンドを作成
-        base = 200000
-        trend = np.cumsum(np.random.randn(250) * 10000)
-        short_selling = (base + trend).astype(int)
-        short_selling = np.maximum(short_selling, 50000)  # 最小値を設定
-        
-        df = pd.DataFrame({
-            'Date': dates.strftime('%Y-%m-%d'),
-            'ShortSelling': short_selling,  # 機関空売り残高
-        })
+        # 日次報告を取り込み済みなら索引から参照
+        if index is None:
+            index = get_short_index()
+        if index is None:
+            # 架空の値は出力しない (python fetch_short_selling.py --download で報告ファイルを取得する)
+            print("No short selling reports ingested")
+            return pd.DataFrame()
         
-        print(f"Successfully generated {len(df)} records")
+        df = index.get(stock_code)
+        print(f"Found {len(df)} daily records in short selling index")
         return df
-        
+    
     except Exception as e:
         print(f"Error fetching short selling data: {e}")
         return pd.DataFrame()
@@ -67,24 +398,47 @@ def fetch_short_selling_data(stock_code: str) -> pd.DataFrame:
 
 def fetch_jpx_short_selling_real(stock_code: str) -> pd.DataFrame:
     """
-    実際のJPXサイトから空売りデータを取得する実装例
-    (現在は未実装 - 将来の拡張用)
+    取り込み済みのJPX空売り残高報告から空売りデータを取得
     
     Args:
         stock_code: 銘柄コード
     
     Returns:
-        空売りデータのDataFrame
+        空売りデータのDataFrame (報告ファイルを取り込んでいない場合は空)
     """
-    # TODO: 実際のJPXスクレイピング実装
-    # 1. JPXの空売り残高報告ページにアクセス
-    # 2. 銘柄コードで検索
-    # 3. データをパースしてDataFrameに変換
+    code = stock_code.replace('.T', '')
+    if code.isdigit():
+        code = code.zfill(4)
     
-    pass
+    index = get_short_index()
+    if index is None:
+        return pd.DataFrame()
+    return index.get(code)
 
 
 if __name__ == "__main__":
+    # --download [公表ページのURL]: 公表ページから新しい日次報告ファイルを取得して索引に追記
+    if len(sys.argv) > 1 and sys.argv[1] == '--download':
+        page_url = sys.argv[2] if len(sys.argv) > 2 else SHORT_LIST_URL
+        download_latest_short_selling_reports(page_url)
+        index = ingest_short_selling_reports(SHORT_DATA_DIR)
+        sys.exit(0 if index.dates else 1)
+    
+    # --ingest: 日次報告ファイル (パス・ディレクトリ・URL) を保存先に集め、未取り込みの分を索引に追記
+    if len(sys.argv) > 1 and sys.argv[1] == '--ingest':
+        SHORT_DATA_DIR.mkdir(parents=True, exist_ok=True)
+        for source in sys.argv[2:]:
+            if source.startswith('http'):
+                download_short_selling_report(source)
+                continue
+            source = Path(source)
+            files = list_report_files(source) if source.is_dir() else [source]
+            for file_path in files:
+                # 同じ名前で差し替えられたファイルは上書きする (内容のハッシュが変わるため取り込み直す)
+                output_writer.write_bytes(SHORT_DATA_DIR / file_path.name, file_path.read_bytes())
+        index = ingest_short_selling_reports(SHORT_DATA_DIR)
+        sys.exit(0 if index.dates else 1)
+    
     # コマンドライン引数から銘柄コードを取得
     if len(sys.argv) > 1:
         code = sys.argv[1]
@@ -7,58 +7,258 @@ import pandas as pd
 from datetime import datetime, timedelta
 import json
 import sys
+import rate_limiter
+import retry_policy
+import run_metrics
+import metadata_cache
+import fetch_layer
+from concurrent.futures import ThreadPoolExecutor
 
 
-def fetch_stock_data(stock_code: str, period: str = "1y") -> pd.DataFrame:
+# 株価データとして出力するカラム
+PRICE_COLUMNS = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+
+class MissingPriceDataError(retry_policy.NoDataError):
+    """
+    取得元が株価データを返さなかった (yfinanceはデータのない銘柄を例外にせず空の結果で返す)
+    """
+
+
+class MissingStockInfoError(retry_policy.NoDataError):
+    """
+    取得元が銘柄情報 (名称・セクター) を返さなかった (キャッシュせずに次の実行で取得し直す)
+    """
+
+
+def _to_ticker(stock_code: str) -> str:
+    """
+    銘柄コードをYahoo Financeのティッカー形式に変換
+    
+    Args:
+        stock_code: 銘柄コード (例: "6920", "6920.T")
+    
+    Returns:
+        ティッカー (例: "6920.T")
+    """
+    if not stock_code.endswith('.T'):
+        stock_code = f"{stock_code}.T"
+    return stock_code
+
+
+def _normalize_code(stock_code: str) -> str:
+    """
+    銘柄コードを4桁の正規形に変換 (英字を含むコードはそのまま)
+    
+    Args:
+        stock_code: 銘柄コード
+    
+    Returns:
+        正規化された銘柄コード
+    """
+    code = stock_code.replace('.T', '')
+    if code.isdigit():
+        code = code.zfill(4)
+    return code
+
+
+def _format_price_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    yfinanceの取得結果をmerge_dataが扱う形式に整形
+    
+    Args:
+        df: 日付インデックスの株価DataFrame
+    
+    Returns:
+        Date, Open, High, Low, Close, Volume のDataFrame
+    """
+    df = df.reset_index()
+    df = df.rename(columns={df.columns[0]: 'Date'})
+    
+    # 必要なカラムのみ抽出
+    df = df[PRICE_COLUMNS]
+    
+    # 一括取得では他銘柄の取引日に合わせた空行が含まれるため除外
+    df = df.dropna(subset=['Close']).copy()
+    df['Volume'] = df['Volume'].fillna(0).astype('int64')
+    
+    # 日付を文字列に変換
+    df['Date'] = df['Date'].dt.strftime('%Y-%m-%d')
+    
+    return df.reset_index(drop=True)
+
+
+def _price_cache_key(ticker: str, period: str, start: str) -> str:
+    """
+    株価データのレスポンスキャッシュのキー
+    """
+    span = f"start={start}" if start else f"period={period}"
+    return f"yfinance prices {ticker} {span}"
+
+
+def fetch_stock_data(stock_code: str, period: str = "1y", start: str = None) -> pd.DataFrame:
     """
     指定された銘柄コードの株価データを取得
     
     Args:
         stock_code: 銘柄コード (例: "6920.T")
         period: 取得期間 (例: "1y", "6mo", "3mo")
+        start: 取得開始日 (例: "2025-01-23")。指定した場合はperiodより優先
     
     Returns:
         株価データのDataFrame
     """
     try:
         # 銘柄コードに.Tが付いていない場合は追加
-        if not stock_code.endswith('.T'):
-            stock_code = f"{stock_code}.T"
+        stock_code = _to_ticker(stock_code)
         
         print(f"Fetching stock data for {stock_code}...")
         
-        # yfinanceでデータ取得
-        ticker = yf.Ticker(stock_code)
-        df = ticker.history(period=period)
+        # yfinanceでデータ取得 (レスポンスキャッシュ経由、失敗したら再試行)
+        def request():
+            rate_limiter.acquire(rate_limiter.YAHOO_HOST)
+            ticker = yf.Ticker(stock_code)
+            with run_metrics.stage('history'):
+                if start:
+                    history = ticker.history(start=start, timeout=fetch_layer.get_timeout())
+                else:
+                    history = ticker.history(period=period, timeout=fetch_layer.get_timeout())
+            if history.empty or history['Close'].isna().all():
+                raise MissingPriceDataError(f"No price data returned for {stock_code}")
+            return history
+        
+        def load():
+            return _format_price_frame(retry_policy.call(rate_limiter.YAHOO_HOST, request))
+        
+        df = fetch_layer.cached_frame(_price_cache_key(stock_code, period, start), load)
         
         if df.empty:
             print(f"No data found for {stock_code}")
             return pd.DataFrame()
         
-        # カラム名を日本語に変換
-        df = df.reset_index()
-        df.columns = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume', 'Dividends', 'Stock Splits']
+        print(f"Successfully fetched {len(df)} records")
+        return df
+    
+    except Exception as e:
+        print(f"Error fetching stock data: {e}")
+        return pd.DataFrame()
+
+
+def fetch_stock_data_batch(stock_codes: list, period: str = "1y", batch_size: int = 50,
+                           start: str = None) -> dict:
+    """
+    複数銘柄の株価データをまとめて取得
+    
+    yf.downloadで batch_size 銘柄ずつ1リクエストにまとめて取得し、
+    銘柄ごとのDataFrameに分割して返す。
+    
+    Args:
+        stock_codes: 銘柄コードのリスト
+        period: 取得期間 (例: "1y", "6mo", "3mo")
+        batch_size: 1リクエストあたりの銘柄数
+        start: 取得開始日 (例: "2025-01-23")。指定した場合はperiodより優先
+    
+    Returns:
+        正規化済み銘柄コードをキー、株価データのDataFrameを値とする辞書
+        (再試行しても取得できなかった銘柄は含めない)
+    """
+    codes = [_normalize_code(c) for c in stock_codes]
+    batch_size = max(1, batch_size)
+    batches = [codes[i:i + batch_size] for i in range(0, len(codes), batch_size)]
+    results = {}
+    
+    for n, batch in enumerate(batches, 1):
+        # レスポンスキャッシュにある銘柄はダウンロードしない
+        pending = []
+        for code in batch:
+            cached = fetch_layer.lookup_frame(_price_cache_key(_to_ticker(code), period, start))
+            if cached is not None:
+                results[code] = cached
+            else:
+                pending.append(code)
         
-        # 必要なカラムのみ抽出
-        df = df[['Date', 'Open', 'High', 'Low', 'Close', 'Volume']]
+        tickers = [_to_ticker(c) for c in pending]
+        print(f"Fetching stock data batch {n}/{len(batches)} ({len(tickers)} tickers, {len(batch) - len(pending)} cached)...")
         
-        # 日付を文字列に変換
-        df['Date'] = df['Date'].dt.strftime('%Y-%m-%d')
+        raw = None
+        if tickers and fetch_layer.get_cache().replay:
+            print(f"Replay mode: {len(tickers)} tickers not in response cache")
+        elif tickers:
+            if start:
+                span = {'start': start}
+            else:
+                span = {'period': period}
+            
+            def request():
+                rate_limiter.acquire(rate_limiter.YAHOO_HOST)
+                with run_metrics.stage('download'):
+                    return yf.download(tickers, group_by='ticker', auto_adjust=True, actions=False,
+                                       progress=False, timeout=fetch_layer.get_timeout(), **span)
+            
+            try:
+                raw = retry_policy.call(rate_limiter.YAHOO_HOST, request)
+            except Exception as e:
+                print(f"Error fetching stock data batch: {e}")
         
-        print(f"Successfully fetched {len(df)} records")
-        return df
+        # データのない銘柄 (yf.download は銘柄ごとの失敗を空の列で返す) は結果に含めず、銘柄ごとの取得に任せる
+        # (データのない銘柄はホストの失敗として数えないため、一括取得では再試行しない)
+        for code, ticker in zip(pending, tickers):
+            df = _extract_ticker_frame(raw, ticker)
+            if not df.empty:
+                results[code] = df
+                fetch_layer.store_frame(_price_cache_key(ticker, period, start), df)
+        
+        fetched = sum(1 for c in batch if c in results)
+        left = f" ({len(batch) - fetched} left for individual fetch)" if fetched < len(batch) else ''
+        print(f"Successfully fetched {fetched}/{len(batch)} tickers{left}")
+    
+    return results
+
+
+def _extract_ticker_frame(raw, ticker: str) -> pd.DataFrame:
+    """
+    yf.downloadの結果から1銘柄分を取り出して整形
+    
+    Args:
+        raw: yf.downloadの結果 (group_by='ticker')
+        ticker: ティッカー
+    
+    Returns:
+        株価データのDataFrame (データがなければ空)
+    """
+    if raw is None or raw.empty:
+        return pd.DataFrame()
+    
+    try:
+        if isinstance(raw.columns, pd.MultiIndex):
+            if ticker not in raw.columns.get_level_values(0):
+                return pd.DataFrame()
+            df = raw[ticker]
+        else:
+            df = raw
+        
+        df = df.dropna(how='all')
+        if df.empty:
+            return pd.DataFrame()
         
+        return _format_price_frame(df)
+    
     except Exception as e:
-        print(f"Error fetching stock data: {e}")
+        print(f"Error extracting {ticker}: {e}")
         return pd.DataFrame()
 
 
-def get_stock_info(stock_code: str) -> dict:
+def get_stock_info(stock_code: str, use_cache: bool = True) -> dict:
     """
     銘柄の基本情報を取得
     
+    名称・セクター・業種はほとんど変わらないため、metadata_cache の
+    有効期限内であれば ticker.info を呼び出さない。取得できなかった場合は
+    Unknown の情報を返し、キャッシュには保存しない (次の実行で取得し直す)。
+    
     Args:
         stock_code: 銘柄コード
+        use_cache: Falseの場合はキャッシュを使わずに取得する
     
     Returns:
         銘柄情報の辞書
@@ -287,17 +487,37 @@ def get_stock_info(stock_code: str) -> dict:
     }
     
     try:
-        if not stock_code.endswith('.T'):
-            stock_code = f"{stock_code}.T"
-        
-        ticker = yf.Ticker(stock_code)
-        info = ticker.info
+        stock_code = _to_ticker(stock_code)
         
         # 銘柄コード(4桁)を取得
         code_4digit = stock_code.replace('.T', '').zfill(4)
         
+        # キャッシュになければ ticker.info から取得してキャッシュに保存
+        cache = metadata_cache.get_cache()
+        info = cache.get(code_4digit) if use_cache else None
+        if info is None:
+            def request():
+                rate_limiter.acquire(rate_limiter.YAHOO_HOST)
+                with run_metrics.stage('info'):
+                    raw_info = yf.Ticker(stock_code).info or {}
+                # 取得に失敗すると空に近い辞書が返るため、Unknown としてキャッシュしないように失敗とする
+                if not any(raw_info.get(k) for k in ('longName', 'shortName', 'sector')):
+                    raise MissingStockInfoError(f"No stock info returned for {stock_code}")
+                return raw_info
+            
+            def load():
+                raw_info = retry_policy.call(rate_limiter.YAHOO_HOST, request)
+                return {
+                    'longName': raw_info.get('longName', raw_info.get('shortName', 'Unknown')),
+                    'sector': raw_info.get('sector', 'Unknown'),
+                    'industry': raw_info.get('industry', 'Unknown')
+                }
+            
+            info = fetch_layer.cached_json(f"yfinance info {stock_code}", load)
+            cache.put(code_4digit, info)
+        
         # 日本語名があればそれを使用、なければ英語名
-        japanese_name = STOCK_NAMES_JP.get(code_4digit, info.get('longName', info.get('shortName', 'Unknown')))
+        japanese_name = STOCK_NAMES_JP.get(code_4digit, info.get('longName', 'Unknown'))
         
         # セクターを日本語に変換
         sector_en = info.get('sector', 'Unknown')
@@ -320,6 +540,33 @@ def get_stock_info(stock_code: str) -> dict:
         }
 
 
+def prefetch_stock_info(stock_codes: list, workers: int = 4) -> int:
+    """
+    キャッシュにない・期限切れの銘柄メタデータをまとめて取得
+    
+    実行開始時に1回呼び出しておけば、以降の get_stock_info はキャッシュから返る。
+    
+    Args:
+        stock_codes: 銘柄コードのリスト
+        workers: 並列数 (リクエスト間隔は rate_limiter で制御)
+    
+    Returns:
+        取得した銘柄数
+    """
+    cache = metadata_cache.get_cache()
+    stale = cache.stale_codes([_normalize_code(c) for c in stock_codes])
+    
+    if stale:
+        print(f"Fetching stock info for {len(stale)} stocks (cached: {len(stock_codes) - len(stale)})...")
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            list(executor.map(lambda c: get_stock_info(c, use_cache=False), stale))
+        cache.save()
+    else:
+        print(f"Stock info cache is warm ({len(stock_codes)} stocks)")
+    
+    return len(stale)
+
+
 if __name__ == "__main__":
     # コマンドライン引数から銘柄コードを取得
     if len(sys.argv) > 1:
@@ -333,6 +580,7 @@ if __name__ == "__main__":
     if not df.empty:
         # 銘柄情報取得
         info = get_stock_info(code)
+        metadata_cache.get_cache().save()
         print(f"\nStock Info: {info['name']} ({info['code']})")
         print(f"Sector: {info['sector']}")
         print(f"Industry: {info['industry']}")
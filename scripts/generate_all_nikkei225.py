@@ -1,12 +1,18 @@
 """
 日経225全銘柄データ一括生成スクリプト
 日経225構成銘柄のデータを一括で生成します
+
+不足・未更新の銘柄だけを生成し、中断した実行を再開する場合は job_runner.py を使う。
 """
+import argparse
 import json
-import sys
 import time
 from pathlib import Path
-from generate_json import merge_data
+import metadata_cache
+import fetch_layer
+import run_metrics
+from job_runner import run_jobs, print_summary, write_report
+from concurrent_runner import DEFAULT_WORKERS, add_runner_arguments, configure_rate_limits
 
 def load_nikkei225_stocks():
     """
@@ -24,99 +30,59 @@ def load_nikkei225_stocks():
     return data['stocks']
 
 
-def generate_all_stocks(stocks, delay=2):
+def generate_all_stocks(stocks, workers=DEFAULT_WORKERS, batch_size=50, incremental=False, binary=False,
+                        report_file=run_metrics.REPORT_FILE, metrics_file=run_metrics.METRICS_FILE):
     """
     全銘柄のデータを一括生成
     
     Args:
         stocks: 銘柄リスト
-        delay: 各銘柄の生成間隔(秒)
+        workers: 並列ワーカー数 (リクエスト間隔は rate_limiter で制御)
+        batch_size: 株価の一括取得で1リクエストにまとめる銘柄数
+        incremental: Trueの場合は出力済みデータに新しい取引日だけを追記する
+        binary: Trueの場合はバイナリ形式 (<code>.bin) も出力する
+        report_file: 実行レポート (JSON) の保存先
+        metrics_file: Prometheus 形式のファイルの保存先
+    
+    Returns:
+        (成功数, 失敗数)
     """
     total = len(stocks)
-    success_count = 0
-    error_count = 0
-    errors = []
     
     print(f"=== 日経225銘柄データ一括生成 ===")
     print(f"対象銘柄数: {total}社")
-    print(f"生成間隔: {delay}秒")
-    print(f"推定所要時間: {total * delay / 60:.1f}分\n")
+    print(f"並列数: {workers}")
+    print(f"一括取得サイズ: {batch_size}銘柄/リクエスト")
+    print(f"更新モード: {'差分更新' if incremental else '全期間取得'}\n")
     
     start_time = time.time()
+    stats = run_jobs(stocks, workers, batch_size, incremental, binary)
+    print_summary(stats, total, time.time() - start_time)
+    write_report(stats, total, report_file=report_file, metrics_file=metrics_file)
     
-    for i, stock in enumerate(stocks, 1):
-        code = stock['code']
-        name = stock['name']
-        
-        print(f"[{i}/{total}] {name} ({code}) を生成中...")
-        
-        try:
-            # データ生成
-            result = merge_data(code)
-            
-            if result:
-                # JSONファイルに保存
-                output_dir = Path(__file__).parent.parent / 'docs' / 'data'
-                output_dir.mkdir(parents=True, exist_ok=True)
-                
-                code_for_filename = code.replace('.T', '')
-                if code_for_filename.isdigit():
-                    code_for_filename = code_for_filename.zfill(4)
-                output_file = output_dir / f'{code_for_filename}.json'
-                
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(result, f, ensure_ascii=False, indent=2)
-                
-                success_count += 1
-                print(f"  ✓ 成功: {output_file.name}")
-            else:
-                error_count += 1
-                errors.append(f"{name} ({code}): データ生成失敗")
-                print(f"  ✗ 失敗: データ生成エラー")
-        
-        except Exception as e:
-            error_count += 1
-            errors.append(f"{name} ({code}): {str(e)}")
-            print(f"  ✗ エラー: {str(e)}")
-        
-        # 進捗表示
-        elapsed = time.time() - start_time
-        avg_time = elapsed / i
-        remaining = (total - i) * avg_time
-        print(f"  進捗: {i}/{total} ({i/total*100:.1f}%) | 経過時間: {elapsed/60:.1f}分 | 残り時間: {remaining/60:.1f}分\n")
-        
-        # レート制限対策
-        if i < total:
-            time.sleep(delay)
-    
-    # 結果サマリー
-    total_time = time.time() - start_time
-    print("\n" + "="*60)
-    print("=== 生成完了 ===")
-    print(f"総銘柄数: {total}社")
-    print(f"成功: {success_count}社")
-    print(f"失敗: {error_count}社")
-    print(f"所要時間: {total_time/60:.1f}分")
-    
-    if errors:
-        print(f"\n=== エラー詳細 ===")
-        for error in errors:
-            print(f"  - {error}")
-    
-    print("="*60)
+    return stats['success_count'], stats['error_count']
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='日経225全銘柄データ一括生成')
+    add_runner_arguments(parser)
+    metadata_cache.add_metadata_arguments(parser)
+    fetch_layer.add_fetch_arguments(parser)
+    run_metrics.add_report_arguments(parser)
+    parser.add_argument('batch_size', nargs='?', type=int, default=50,
+                        help='株価の一括取得で1リクエストにまとめる銘柄数 (デフォルト: 50)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='出力済みデータに新しい取引日だけを追記する')
+    parser.add_argument('--binary', action='store_true',
+                        help='JSONに加えてバイナリ形式 (<code>.bin) も出力する')
+    args = parser.parse_args()
+    configure_rate_limits(args)
+    metadata_cache.configure_from_args(args)
+    fetch_layer.configure_from_args(args)
+    
     # 銘柄リスト読み込み
     stocks = load_nikkei225_stocks()
     
-    # 生成間隔を設定(デフォルト: 2秒)
-    delay = 2
-    if len(sys.argv) > 1:
-        try:
-            delay = int(sys.argv[1])
-        except ValueError:
-            print(f"警告: 無効な遅延時間 '{sys.argv[1]}'。デフォルト値 {delay}秒 を使用します。")
-    
     # 全銘柄データ生成
-    generate_all_stocks(stocks, delay)
+    generate_all_stocks(stocks, args.workers, args.batch_size, args.incremental, args.binary,
+                        args.report, args.metrics_file)
@@ -6,20 +6,298 @@ import sys
 import json
 from pathlib import Path
 import pandas as pd
-from fetch_stock_data import fetch_stock_data, get_stock_info
+from fetch_stock_data import PRICE_COLUMNS, fetch_stock_data, get_stock_info
+import metadata_cache
+import fetch_layer
 from fetch_margin_data import fetch_margin_data, interpolate_to_daily
 from fetch_short_selling import fetch_short_selling_data
+from binary_format import encode_binary
+from volume_profile import calculate_volume_profiles
+import output_writer
+import catalog
+import run_metrics
 
+# 出力先ディレクトリ
+OUTPUT_DIR = Path(__file__).parent.parent / 'docs' / 'data'
 
-def merge_data(stock_code: str) -> dict:
+# 差分更新で既存データと取得データが一致するとみなす相対誤差
+TAIL_TOLERANCE = 1e-4
+
+# 出力JSONのスキーマバージョン
+# 1: data に行ごとのオブジェクトを並べる形式
+# 2: dates と columns に項目ごとの配列を持つ列形式
+SCHEMA_VERSION = 2
+
+# 直近データファイル (<code>/recent.json) に含める期間(暦日)
+RECENT_DAYS = 100
+
+# 出力に含める終値の移動平均の期間(日)
+MA_PERIODS = (5, 25, 75)
+
+
+def get_output_file(stock_code: str) -> Path:
+    """
+    銘柄の出力ファイル (直近データファイル) のパスを取得
+    
+    Args:
+        stock_code: 銘柄コード
+    
+    Returns:
+        出力ファイルのパス (docs/data/<code>/recent.json)
+    """
+    return get_shard_dir(stock_code) / 'recent.json'
+
+
+def to_columnar(result: dict) -> dict:
+    """
+    統合データを列形式 (スキーマバージョン2) に変換
+    
+    行ごとに "Date", "Open", ... のキーを繰り返す代わりに、
+    共通の日付配列と項目ごとの配列を持たせる。
+    
+    Args:
+        result: add_derived_data で移動平均・価格帯別出来高を追加した統合データ (data は行のリスト)
+    
+    Returns:
+        列形式の辞書
+    """
+    records = result['data']
+    fields = [k for k in records[0] if k != 'Date'] if records else []
+    
+    output = {'schema_version': SCHEMA_VERSION}
+    for key, value in result.items():
+        if key == 'data':
+            output['dates'] = [row['Date'] for row in records]
+            output['columns'] = {field: [row[field] for row in records] for field in fields}
+        else:
+            output[key] = value
+    return output
+
+
+def from_columnar(data: dict) -> dict:
+    """
+    出力JSONを行形式の統合データに変換 (スキーマバージョン1はそのまま返す)
+    
+    Args:
+        data: 出力JSONの内容
+    
+    Returns:
+        data に行のリストを持つ統合データ
+    """
+    if data.get('schema_version', 1) < 2:
+        return data
+    
+    dates = data['dates']
+    columns = data['columns']
+    result = {k: v for k, v in data.items() if k not in ('schema_version', 'dates', 'columns')}
+    result['data'] = [
+        {'Date': date, **{field: values[i] for field, values in columns.items()}}
+        for i, date in enumerate(dates)
+    ]
+    return result
+
+
+def get_shard_dir(stock_code: str) -> Path:
+    """
+    銘柄の分割ファイル (年別ファイル・直近データファイル) の保存先を取得
+    
+    Args:
+        stock_code: 銘柄コード
+    
+    Returns:
+        分割ファイルのディレクトリ (docs/data/<code>/)
+    """
+    code_for_filename = stock_code.replace('.T', '')
+    if code_for_filename.isdigit():
+        code_for_filename = code_for_filename.zfill(4)
+    return OUTPUT_DIR / code_for_filename
+
+
+def to_shards(result: dict) -> dict:
+    """
+    統合データを年別ファイルと直近データファイルに分割
+    
+    年別ファイル (<year>.json) は年が終われば内容が変わらないため長期キャッシュでき、
+    直近データファイル (recent.json) は最初の表示に必要な直近 RECENT_DAYS 日分と
+    銘柄情報・価格帯別出来高・年別ファイルの一覧を持つ。
+    
+    Args:
+        result: 統合データの辞書
+    
+    Returns:
+        ファイル名→列形式の辞書
+    """
+    records = result['data']
+    meta = {k: v for k, v in result.items() if k != 'data'}
+    
+    by_year = {}
+    for row in records:
+        by_year.setdefault(int(row['Date'][:4]), []).append(row)
+    
+    shards = {}
+    for year, rows in by_year.items():
+        shards[f'{year}.json'] = to_columnar(
+            {'stock_code': result['stock_code'], 'year': year, 'data': rows})
+    
+    recent_start = ''
+    if records:
+        latest = pd.Timestamp(records[-1]['Date'])
+        recent_start = (latest - pd.Timedelta(days=RECENT_DAYS)).strftime('%Y-%m-%d')
+    recent = dict(meta, shards=sorted(by_year), data=[r for r in records if r['Date'] >= recent_start])
+    shards['recent.json'] = to_columnar(recent)
+    
+    return shards
+
+
+def save_shards(result: dict) -> Path:
+    """
+    統合データを年別ファイルと直近データファイルに分けて保存 (内容が変わらないファイルは書き込まない)
+    
+    Args:
+        result: 統合データの辞書
+    
+    Returns:
+        分割ファイルのディレクトリ
+    """
+    shard_dir = get_shard_dir(result['stock_code'])
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    
+    shards = to_shards(result)
+    for name, data in shards.items():
+        output_writer.write_json(shard_dir / name, data, separators=(',', ':'))
+    
+    # データがなくなった年のファイルを削除
+    for path in shard_dir.glob('*.json'):
+        if path.name not in shards:
+            path.unlink()
+    
+    return shard_dir
+
+
+def read_shards(shard_dir: Path) -> dict:
+    """
+    年別ファイルを連結して全期間の列形式の辞書に戻す (銘柄情報・価格帯別出来高は直近データファイルの値)
+    
+    Args:
+        shard_dir: 分割ファイルのディレクトリ
+    
+    Returns:
+        to_columnar と同じ形式の辞書
+    """
+    with open(shard_dir / 'recent.json', 'r', encoding='utf-8') as f:
+        recent = json.load(f)
+    
+    output = {k: v for k, v in recent.items() if k not in ('shards', 'dates', 'columns')}
+    output['dates'] = []
+    output['columns'] = {field: [] for field in recent['columns']}
+    for year in recent.get('shards', []):
+        with open(shard_dir / f'{year}.json', 'r', encoding='utf-8') as f:
+            shard = json.load(f)
+        output['dates'] += shard['dates']
+        for field, values in output['columns'].items():
+            values += shard['columns'][field]
+    return output
+
+
+@run_metrics.timed('save_output')
+def save_output(result: dict, binary: bool = False) -> Path:
+    """
+    統合データを年別・直近データファイルに保存し、カタログのエントリを更新
+    (内容が変わらないファイルは書き込まない)
+    
+    全期間のデータは年別ファイルにしか保存しない (読み込む場合は load_existing_output で連結する)。
+    
+    Args:
+        result: 統合データの辞書
+        binary: Trueの場合は同じ内容のバイナリ形式 (<code>.bin) も保存する
+    
+    Returns:
+        保存した直近データファイルのパス
+    """
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    shard_dir = get_shard_dir(result['stock_code'])
+    
+    with run_metrics.stage('to_columnar'):
+        output = to_columnar(result)
+    with run_metrics.stage('write_json'):
+        save_shards(result)
+    catalog.get_catalog().put(output)
+    
+    # 以前の形式の全期間のファイル (<code>.json) は削除
+    legacy_file = shard_dir.with_suffix('.json')
+    if legacy_file.exists():
+        legacy_file.unlink()
+    
+    # バイナリ形式を出力しない場合は古い .bin が公開されないよう削除
+    binary_file = shard_dir.with_suffix('.bin')
+    if binary:
+        with run_metrics.stage('write_binary'):
+            output_writer.write_bytes(binary_file, encode_binary(result))
+    elif binary_file.exists():
+        binary_file.unlink()
+    
+    return get_output_file(result['stock_code'])
+
+
+def load_existing_output(stock_code: str) -> dict:
+    """
+    出力済みの年別ファイルを連結して読み込む (以前の形式の全期間のファイル <code>.json も読み込める)
+    
+    Args:
+        stock_code: 銘柄コード
+    
+    Returns:
+        統合データの辞書 (存在しない・壊れている場合はNone)
+    """
+    shard_dir = get_shard_dir(stock_code)
+    output_file = shard_dir.with_suffix('.json')
+    try:
+        if (shard_dir / 'recent.json').exists():
+            output_file = shard_dir
+            data = read_shards(shard_dir)
+        elif output_file.exists():
+            with open(output_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        else:
+            return None
+    except Exception as e:
+        print(f"Error reading {output_file.name}: {e}")
+        return None
+    
+    data = from_columnar(data)
+    
+    # fetch_stock_data.py の単体実行で作成した形式 ({info, data}) は統合データの形式に揃える
+    if isinstance(data.get('info'), dict) and data.get('data'):
+        info = data['info']
+        rows = data['data']
+        data = {
+            'stock_code': info.get('code') or output_file.stem,
+            'stock_name': info.get('name'),
+            'sector': info.get('sector'),
+            'industry': info.get('industry'),
+            'base_date': rows[0]['Date'],
+            'latest_date': rows[-1]['Date'],
+            'data': rows
+        }
+    
+    if not data.get('data') or not data.get('latest_date'):
+        return None
+    
+    return data
+
+
+@run_metrics.timed('merge_data')
+def merge_data(stock_code: str, stock_df: pd.DataFrame = None) -> dict:
     """
     全データソースからデータを取得して統合
     
     Args:
         stock_code: 銘柄コード (4桁)
+        stock_df: 取得済みの株価データ (fetch_stock_data_batchの結果など)。
+            Noneの場合はこの銘柄単独で取得する
     
     Returns:
-        統合データの辞書
+        統合データの辞書 (移動平均・価格帯別出来高は含まない。出力前に add_derived_data で追加する)
     """
     # 銘柄コードを正規化
     code_normalized = stock_code.replace('.T', '')
@@ -31,7 +309,10 @@ def merge_data(stock_code: str) -> dict:
     
     # 1. 株価データ取得
     print("1. Fetching stock price data...")
-    stock_df = fetch_stock_data(code_normalized)
+    if stock_df is None:
+        stock_df = fetch_stock_data(code_normalized)
+    else:
+        print(f"Using prefetched stock data ({len(stock_df)} records)")
     
     if stock_df.empty:
         print("Error: Failed to fetch stock data")
@@ -41,9 +322,39 @@ def merge_data(stock_code: str) -> dict:
     print("\n2. Fetching stock info...")
     stock_info = get_stock_info(code_normalized)
     
+    # 3-5. 信用取引・機関空売りデータを取得してマージ
+    merged_df = merge_supplementary_data(code_normalized, stock_df)
+    
+    # 6. JSON形式で出力
+    output = {
+        'stock_code': code_normalized,
+        'stock_name': stock_info['name'],
+        'sector': stock_info['sector'],
+        'industry': stock_info['industry'],
+        'base_date': merged_df['Date'].iloc[0],
+        'latest_date': merged_df['Date'].iloc[-1],
+        'data': merged_df.to_dict('records')
+    }
+    
+    run_metrics.count('rows', len(merged_df))
+    print(f"\n✓ Successfully merged {len(merged_df)} records")
+    return output
+
+
+def merge_supplementary_data(stock_code: str, stock_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    株価データに信用取引データと機関空売りデータをマージ
+    
+    Args:
+        stock_code: 銘柄コード (正規化済み)
+        stock_df: 株価データのDataFrame
+    
+    Returns:
+        マージ済みのDataFrame
+    """
     # 3. 信用取引データ取得
     print("\n3. Fetching margin trading data...")
-    margin_df = fetch_margin_data(code_normalized)
+    margin_df = fetch_margin_data(stock_code)
     
     # 週次データを日次に補間
     if not margin_df.empty:
@@ -53,119 +364,214 @@ def merge_data(stock_code: str) -> dict:
     
     # 4. 機関空売りデータ取得
     print("\n4. Fetching short selling data...")
-    short_df = fetch_short_selling_data(code_normalized)
+    short_df = fetch_short_selling_data(stock_code)
     
     # 5. データをマージ
     print("\n5. Merging all data...")
+    with run_metrics.stage('merge_frames'):
+        # 株価データをベースに他のデータをマージ
+        merged_df = stock_df.copy()
+        
+        # 信用取引データをマージ
+        if not margin_df.empty:
+            merged_df = merged_df.merge(margin_df, on='Date', how='left')
+        else:
+            merged_df['MarginBuy'] = 0
+            merged_df['MarginSell'] = 0
+        
+        # 機関空売りデータをマージ
+        if not short_df.empty:
+            merged_df = merged_df.merge(short_df, on='Date', how='left')
+        else:
+            merged_df['ShortSelling'] = 0
+        
+        # 欠損値を前方補完
+        merged_df = merged_df.ffill()
+        merged_df = merged_df.fillna(0)
+    
+    return merged_df
+
+
+def _apply_stock_info(existing: dict, stock_code: str) -> dict:
+    # 取得できなかった項目 (Unknown) は出力済みの値のままとする
+    stock_info = get_stock_info(stock_code)
+    fields = {'stock_name': stock_info['name'], 'sector': stock_info['sector'], 'industry': stock_info['industry']}
+    changed = {k: v for k, v in fields.items() if v != 'Unknown' and existing.get(k) != v}
+    if not changed:
+        return existing
+    print(f"Updated stock info: {', '.join(f'{k}={v}' for k, v in changed.items())}")
+    return dict(existing, **changed)
+
+
+@run_metrics.timed('update_data')
+def update_data(stock_code: str, existing: dict = None, stock_df: pd.DataFrame = None) -> dict:
+    """
+    出力済みデータに最新日以降の取引日だけを追記する差分更新
     
-    # 株価データをベースに他のデータをマージ
-    merged_df = stock_df.copy()
+    既存データの latest_date 以降の株価だけを取得して追記する。既存データの最終行が
+    取得元と一致しない場合 (配当・分割による調整後株価の修正など) は
+    全期間を取得し直す。信用取引・機関空売りは取り込み済みのファイルから全期間をマージし直す。銘柄名・セクター・業種は metadata_cache の値で更新し、
+    移動平均・価格帯別出来高は出力前に add_derived_data で計算し直す。
     
-    # 信用取引データをマージ
-    if not margin_df.empty:
-        merged_df = merged_df.merge(margin_df, on='Date', how='left')
-    else:
-        merged_df['MarginBuy'] = 0
-        merged_df['MarginSell'] = 0
+    Args:
+        stock_code: 銘柄コード (4桁)
+        existing: 出力済みの統合データ。Noneの場合はファイルから読み込む
+        stock_df: latest_date 以降の取得済み株価データ。
+            Noneの場合はこの銘柄単独で取得する
+    
+    Returns:
+        移動平均・価格帯別出来高を含まない統合データの辞書 (株価データを取得できなかった場合はNone)
+    """
+    code_normalized = stock_code.replace('.T', '')
+    if code_normalized.isdigit():
+        code_normalized = code_normalized.zfill(4)
     
-    # 機関空売りデータをマージ
-    if not short_df.empty:
-        merged_df = merged_df.merge(short_df, on='Date', how='left')
+    if existing is None:
+        existing = load_existing_output(code_normalized)
+    
+    if existing is None:
+        print(f"No existing data for {code_normalized}, falling back to full fetch")
+        return merge_data(code_normalized)
+    
+    latest_date = existing['latest_date']
+    print(f"=== Updating data for {code_normalized} since {latest_date} ===\n")
+    
+    # 1. 最新日以降の株価データ取得 (最新日当日を含めて取得し、整合性を確認する)
+    print("1. Fetching new stock price data...")
+    if stock_df is None:
+        stock_df = fetch_stock_data(code_normalized, start=latest_date)
     else:
-        merged_df['ShortSelling'] = 0
+        print(f"Using prefetched stock data ({len(stock_df)} records)")
     
-    # 欠損値を前方補完
-    merged_df = merged_df.fillna(method='ffill').fillna(0)
+    # 最新日当日を含めて取得するため、空の結果は新しい取引日がないのではなく取得の失敗
+    if stock_df.empty:
+        print(f"Failed to fetch stock data since {latest_date}")
+        return None
     
-    # 6. 価格帯別出来高を計算
-    print("\n6. Calculating volume by price...")
-    volume_profile = calculate_volume_profile(merged_df)
+    if not _tail_matches(existing['data'][-1], stock_df):
+        print("Stored tail does not match source (adjusted prices restated?), falling back to full fetch")
+        full_df = fetch_stock_data(code_normalized, start=existing['base_date'])
+        return merge_data(code_normalized, stock_df=full_df)
     
-    # 7. JSON形式で出力
-    output = {
-        'stock_code': code_normalized,
-        'stock_name': stock_info['name'],
-        'sector': stock_info['sector'],
-        'industry': stock_info['industry'],
-        'base_date': merged_df['Date'].iloc[0],
-        'latest_date': merged_df['Date'].iloc[-1],
-        'data': merged_df.to_dict('records'),
-        'volume_profile': volume_profile
-    }
+    # 2. 銘柄情報 (キャッシュが期限切れの場合だけ取得し直し、銘柄名・セクターの変更を反映する)
+    existing = _apply_stock_info(existing, code_normalized)
     
-    print(f"\n✓ Successfully merged {len(merged_df)} records")
+    new_df = stock_df[stock_df['Date'] > latest_date].reset_index(drop=True)
+    if new_df.empty:
+        print("Already up to date")
+        return existing
+    
+    # 3-5. 信用取引・機関空売りデータは取り込み済みのJPXファイルから全期間をマージし直す
+    # (後から取り込んだファイルを過去の取引日にも反映する)
+    price_df = pd.concat([pd.DataFrame(existing['data'])[PRICE_COLUMNS], new_df[PRICE_COLUMNS]],
+                         ignore_index=True)
+    records = merge_supplementary_data(code_normalized, price_df).to_dict('records')
+    
+    output = dict(existing)
+    output['latest_date'] = records[-1]['Date']
+    output['data'] = records
+    
+    run_metrics.count('rows', len(new_df))
+    print(f"\n✓ Successfully appended {len(new_df)} records")
     return output
 
 
-def calculate_volume_profile(df: pd.DataFrame, bins: int = 50) -> list:
+@run_metrics.timed('moving_averages')
+def add_moving_averages(df: pd.DataFrame) -> pd.DataFrame:
     """
-    価格帯別出来高を計算
+    終値の移動平均 (MA5 / MA25 / MA75 など) を全期間で計算して列を追加
+    
+    期間に満たない先頭の行は None (JSONでは null) とする。
     
     Args:
-        df: 株価データのDataFrame
-        bins: 価格帯の分割数
+        df: 統合データのDataFrame
     
     Returns:
-        価格帯別出来高のリスト
+        移動平均の列を追加したDataFrame
     """
-    try:
-        # 価格範囲を取得
-        min_price = df['Low'].min()
-        max_price = df['High'].max()
-        
-        # 価格帯を作成
-        price_bins = pd.cut(df['Close'], bins=bins)
-        
-        # 各価格帯の出来高を集計
-        volume_by_price = df.groupby(price_bins)['Volume'].sum()
-        
-        # 結果を整形
-        profile = []
-        for interval, volume in volume_by_price.items():
-            if pd.notna(interval):
-                profile.append({
-                    'price_low': float(interval.left),
-                    'price_high': float(interval.right),
-                    'volume': int(volume)
-                })
-        
-        return profile
-        
-    except Exception as e:
-        print(f"Error calculating volume profile: {e}")
-        return []
+    df = df.copy()
+    close = df['Close'].astype(float)
+    for period in MA_PERIODS:
+        ma = close.rolling(period, min_periods=period).mean().round(2)
+        df[f'MA{period}'] = ma.astype(object).where(ma.notna(), None)
+    return df
+
+
+def add_derived_data(result: dict) -> dict:
+    """
+    統合データに移動平均 (全期間) と表示期間ごとの価格帯別出来高を追加
+    
+    Args:
+        result: merge_data / update_data の統合データ
+    
+    Returns:
+        移動平均・期間ごとの価格帯別出来高を含む統合データの辞書
+    """
+    df = add_moving_averages(pd.DataFrame(result['data']))
+    output = dict(result)
+    output['data'] = df.to_dict('records')
+    output.pop('volume_profile', None)
+    output['volume_profiles'] = calculate_volume_profiles(df)
+    return output
+
+
+def _tail_matches(last_row: dict, stock_df: pd.DataFrame) -> bool:
+    """
+    既存データの最終行が取得データの同日の値と一致するか確認
+    
+    Args:
+        last_row: 既存データの最終行
+        stock_df: 取得した株価データ
+    
+    Returns:
+        一致すればTrue
+    """
+    same_day = stock_df[stock_df['Date'] == last_row['Date']]
+    if same_day.empty:
+        return False
+    
+    fetched = same_day.iloc[0]
+    for col in ['Open', 'High', 'Low', 'Close']:
+        stored = float(last_row.get(col, 0))
+        if abs(float(fetched[col]) - stored) > TAIL_TOLERANCE * max(abs(stored), 1.0):
+            return False
+    
+    return True
 
 
 if __name__ == "__main__":
     # コマンドライン引数から銘柄コードを取得
-    if len(sys.argv) > 1:
-        code = sys.argv[1]
+    # (--incremental で差分更新、--refresh-metadata で銘柄メタデータを再取得、
+    #  --replay でレスポンスキャッシュのみから取得、--binary でバイナリ形式も出力)
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    incremental = '--incremental' in sys.argv[1:]
+    binary = '--binary' in sys.argv[1:]
+    metadata_cache.configure(refresh='--refresh-metadata' in sys.argv[1:])
+    fetch_layer.configure(replay='--replay' in sys.argv[1:])
+    if args:
+        code = args[0]
     else:
         code = "6920"  # デフォルト: レーザーテック
     
     # データ統合
-    result = merge_data(code)
+    if incremental:
+        result = update_data(code)
+    else:
+        result = merge_data(code)
+    metadata_cache.get_cache().save()
     
     if result:
-        # 出力先ディレクトリを作成
-        output_dir = Path(__file__).parent.parent / 'docs' / 'data'
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        # JSONファイルに保存
-        code_for_filename = code.replace('.T', '')
-        if code_for_filename.isdigit():
-            code_for_filename = code_for_filename.zfill(4)
-        output_file = output_dir / f'{code_for_filename}.json'
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        # 移動平均・価格帯別出来高を追加してJSONファイルに保存
+        result = add_derived_data(result)
+        output_file = save_output(result, binary=binary)
+        catalog.get_catalog().save()
         
         print(f"\n✓ Data saved to {output_file}")
         print(f"\nSummary:")
         print(f"  Stock: {result['stock_name']} ({result['stock_code']})")
         print(f"  Period: {result['base_date']} to {result['latest_date']}")
         print(f"  Records: {len(result['data'])}")
-        print(f"  Volume profile bins: {len(result['volume_profile'])}")
+        print(f"  Volume profile bins: {len(result['volume_profiles']['all']['volume'])}")
     else:
         print("\n✗ Failed to generate data")
         sys.exit(1)
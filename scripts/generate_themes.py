@@ -1,6 +1,7 @@
 import json
 from pathlib import Path
-import glob
+import output_writer
+import catalog
 
 def load_custom_config():
     """
@@ -20,12 +21,26 @@ def load_custom_config():
         print(f"Error reading config file: {e}")
         return None
 
+def load_stock_entries():
+    """
+    銘柄コードと銘柄名の一覧をカタログ (docs/catalog.json) から取得
+    
+    Returns:
+        (銘柄コード, 銘柄名) のリスト (カタログがない場合はNone)
+    """
+    stocks = catalog.get_catalog().stocks()
+    if not stocks:
+        print(f"Error: {catalog.CATALOG_FILE.name} not found. Run `python panel_store.py --catalog` first.")
+        return None
+    
+    print(f"Loaded {len(stocks)} stocks from {catalog.CATALOG_FILE.name}.")
+    return [(entry['code'], entry['name']) for entry in stocks]
+
 def generate_themes():
     """
     カスタム設定に基づいてthemes.jsonを生成する
     """
     script_dir = Path(__file__).parent
-    data_dir = script_dir.parent / 'docs' / 'data'
     output_file = script_dir.parent / 'docs' / 'themes.json'
     
     # 設定読み込み
@@ -48,63 +63,36 @@ def generate_themes():
 
     print(f"Loaded {len(nikkei_codes)} Nikkei 225 stocks from definition.")
 
-    print(f"Scanning data directory: {data_dir}")
-    
-    if not data_dir.exists():
-        print("Error: Data directory not found.")
+    # 銘柄コードと銘柄名をカタログから取得 (銘柄データファイルは読まない)
+    stock_entries = load_stock_entries()
+    if stock_entries is None:
         return
-
-    # 全銘柄データを収集
-    all_stocks = []
     
     # テーマごとの銘柄リストを初期化
     theme_stocks = {tid: [] for tid in theme_order}
     
-    # JSONファイルを取得
-    json_files = list(data_dir.glob('*.json'))
-    print(f"Found {len(json_files)} stock data files.")
-    
-    for file_path in json_files:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-                # Handle both flat structure (existing) and nested "info" structure (new fetch script)
-                if 'info' in data and isinstance(data['info'], dict):
-                    code = data['info'].get('code')
-                    name = data['info'].get('name')
-                else:
-                    code = data.get('stock_code')
-                    name = data.get('stock_name')
-                
-                if not code:
-                    print(f"Skipping {file_path.name}: No stock code found")
-                    continue
-
-                stock_info = {
-                    "code": code,
-                    "name": name or f"Stock {code}"
-                }
-                
-                # Nikkei 225 (All) には公式リストにある場合のみ追加
-                if 'all' in theme_stocks and code in nikkei_codes:
-                    theme_stocks['all'].append(stock_info)
-                
-                # カスタムマッピングに基づいて追加 (こちらはリスト外でもOK)
-                mapped_theme_id = stock_mapping.get(code)
-                if mapped_theme_id:
-                    # 文字列ならリストに変換
-                    if isinstance(mapped_theme_id, str):
-                        mapped_themes = [mapped_theme_id]
-                    else:
-                        mapped_themes = mapped_theme_id
-                    
-                    for tid in mapped_themes:
-                        if tid in theme_stocks:
-                            theme_stocks[tid].append(stock_info)
-                    
-        except Exception as e:
-            print(f"Error reading {file_path.name}: {e}")
+    for code, name in stock_entries:
+        stock_info = {
+            "code": code,
+            "name": name or f"Stock {code}"
+        }
+        
+        # Nikkei 225 (All) には公式リストにある場合のみ追加
+        if 'all' in theme_stocks and code in nikkei_codes:
+            theme_stocks['all'].append(stock_info)
+        
+        # カスタムマッピングに基づいて追加 (こちらはリスト外でもOK)
+        mapped_theme_id = stock_mapping.get(code)
+        if mapped_theme_id:
+            # 文字列ならリストに変換
+            if isinstance(mapped_theme_id, str):
+                mapped_themes = [mapped_theme_id]
+            else:
+                mapped_themes = mapped_theme_id
+            
+            for tid in mapped_themes:
+                if tid in theme_stocks:
+                    theme_stocks[tid].append(stock_info)
     
     # themes.jsonの構造を作成
     themes = []
@@ -128,10 +116,13 @@ def generate_themes():
     # JSON出力
     output_data = {"themes": themes}
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(output_data, f, ensure_ascii=False, indent=2)
-        
-    print(f"Successfully generated themes.json with {len(themes)} themes.")
+    # 内容が変わらない場合は書き込まない
+    written = output_writer.write_json(output_file, output_data, indent=2)
+    
+    if written:
+        print(f"Successfully generated themes.json with {len(themes)} themes.")
+    else:
+        print(f"themes.json is up to date ({len(themes)} themes), skipped writing.")
     for t in themes:
         print(f"  - {t['name']}: {len(t['stocks'])} stocks")
     print(f"Output path: {output_file}")
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+テクニカル指標の一括計算
+全銘柄の株価を日付 × 銘柄コードの2次元配列 (パネル) に揃え、
+RSI・MACD・ボリンジャーバンド・騰落率・ボラティリティを全銘柄まとめて計算する
+
+パネルは全銘柄の日次データストア (panel_store) から読み込み、
+銘柄ごとの出力 (docs/indicators/<code>.json) はパネルの列を切り出して作る。
+指標を追加する場合は @indicator で計算関数を登録する。
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from generate_json import OUTPUT_DIR, read_shards
+import output_writer
+import panel_store
+
+# 指標の出力先
+INDICATOR_DIR = Path(__file__).parent.parent / 'docs' / 'indicators'
+
+# パネルに読み込む項目
+PANEL_FIELDS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+# 年率換算に使う年間の取引日数
+TRADING_DAYS = 252
+
+# 出力する値の小数点以下の桁数
+DECIMALS = 4
+
+
+class Panel:
+    """
+    日付 × 銘柄コードに揃えた株価の2次元配列
+    
+    取引のない日 (上場前・売買停止など) は NaN とする。
+    """
+    
+    def __init__(self, dates: np.ndarray, codes: list, fields: dict):
+        """
+        Args:
+            dates: 日付の配列 (datetime64[D]、昇順)
+            codes: 銘柄コードのリスト (列の順)
+            fields: 項目名 → 日数 × 銘柄数 の配列
+        """
+        self.dates = dates
+        self.codes = list(codes)
+        self.fields = fields
+        self._columns = {code: i for i, code in enumerate(self.codes)}
+    
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.fields[field]
+    
+    def column(self, code: str) -> int:
+        """
+        銘柄コードの列の位置
+        
+        Args:
+            code: 銘柄コード
+        
+        Returns:
+            列の位置
+        """
+        return self._columns[code]
+    
+    def valid_rows(self, code: str) -> np.ndarray:
+        """
+        銘柄の取引がある日のマスク
+        
+        Args:
+            code: 銘柄コード
+        
+        Returns:
+            日数分の真偽値の配列
+        """
+        return ~np.isnan(self.fields['Close'][:, self.column(code)])
+
+
+def _read_columns(shard_dir: Path) -> tuple:
+    data = read_shards(shard_dir)
+    return data.get('stock_code'), data['dates'], data['columns']
+
+
+def load_panel(codes: list = None, fields: tuple = PANEL_FIELDS) -> Panel:
+    """
+    全銘柄の日次データストアからパネルを作成 (ストアが空の場合は出力済みの銘柄データから作成)
+    
+    Args:
+        codes: 読み込む銘柄コード (Noneの場合は全銘柄)
+        fields: 読み込む項目
+    
+    Returns:
+        Panel
+    """
+    store = panel_store.get_store()
+    if store.is_empty():
+        return load_panel_from_outputs(codes=codes, fields=fields)
+    
+    all_codes = store.all_codes()
+    selected = [c for c in all_codes if codes is None or c in set(codes)]
+    columns = [all_codes.index(c) for c in selected]
+    arrays = {field: store.fields[field][:, columns] for field in fields}
+    return Panel(store.dates, selected, arrays)
+
+
+def load_panel_from_outputs(data_dir: Path = OUTPUT_DIR, codes: list = None, fields: tuple = PANEL_FIELDS) -> Panel:
+    """
+    出力済みの銘柄データからパネルを作成
+    
+    Args:
+        data_dir: 銘柄データのディレクトリ
+        codes: 読み込む銘柄コード (Noneの場合は全銘柄)
+        fields: 読み込む項目
+    
+    Returns:
+        Panel
+    """
+    paths = sorted(p.parent for p in data_dir.glob('*/recent.json'))
+    if codes is not None:
+        wanted = set(codes)
+        paths = [p for p in paths if p.name in wanted]
+    
+    stocks = []
+    for path in paths:
+        try:
+            code, dates, columns = _read_columns(path)
+        except Exception as e:
+            print(f"Error reading {path.name}: {e}")
+            continue
+        if code and dates:
+            stocks.append((code, np.array(dates, dtype='datetime64[D]'), columns))
+    
+    all_dates = np.unique(np.concatenate([d for _, d, _ in stocks])) if stocks else np.array([], dtype='datetime64[D]')
+    arrays = {field: np.full((len(all_dates), len(stocks)), np.nan) for field in fields}
+    
+    for j, (_, dates, columns) in enumerate(stocks):
+        rows = np.searchsorted(all_dates, dates)
+        for field in fields:
+            if field in columns:
+                arrays[field][rows, j] = np.array(columns[field], dtype=float)
+    
+    return Panel(all_dates, [code for code, _, _ in stocks], arrays)
+
+
+# ---- 2次元配列の時系列演算 (行方向が日付) ----
+
+def ffill(values: np.ndarray) -> np.ndarray:
+    """
+    NaN を直前の値で埋める (最初の値より前は NaN のまま)
+    """
+    valid = ~np.isnan(values)
+    index = np.where(valid, np.arange(len(values))[:, None], 0)
+    np.maximum.accumulate(index, axis=0, out=index)
+    return values[index, np.arange(values.shape[1])]
+
+
+def shift(values: np.ndarray, periods: int = 1) -> np.ndarray:
+    """
+    行方向に periods 行ずらす (先頭は NaN)
+    """
+    shifted = np.full_like(values, np.nan)
+    shifted[periods:] = values[:-periods]
+    return shifted
+
+
+def _rolling_sums(values: np.ndarray, window: int) -> tuple:
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    zeros = np.zeros((1, values.shape[1]))
+    csum = np.vstack([zeros, np.cumsum(filled, axis=0)])
+    csq = np.vstack([zeros, np.cumsum(filled * filled, axis=0)])
+    ccount = np.vstack([zeros, np.cumsum(valid, axis=0)])
+    
+    total = np.full_like(values, np.nan)
+    total_sq = np.full_like(values, np.nan)
+    count = np.zeros_like(values)
+    total[window - 1:] = csum[window:] - csum[:-window]
+    total_sq[window - 1:] = csq[window:] - csq[:-window]
+    count[window - 1:] = ccount[window:] - ccount[:-window]
+    return total, total_sq, count
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    移動平均 (期間内に NaN を含む場合は NaN)
+    """
+    total, _, count = _rolling_sums(values, window)
+    return np.where(count == window, total / window, np.nan)
+
+
+def rolling_std(values: np.ndarray, window: int, ddof: int = 1) -> np.ndarray:
+    """
+    移動標準偏差 (期間内に NaN を含む場合は NaN)
+    """
+    total, total_sq, count = _rolling_sums(values, window)
+    var = (total_sq - total * total / window) / (window - ddof)
+    return np.where(count == window, np.sqrt(np.maximum(var, 0.0)), np.nan)
+
+
+def ema(values: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    指数移動平均 (最初の値から開始し、NaN の行は直前の値を引き継ぐ)
+    
+    日付の数だけ繰り返し、各行の計算は全銘柄まとめて行う。
+    """
+    out = np.full_like(values, np.nan)
+    prev = np.full(values.shape[1], np.nan)
+    for i, row in enumerate(values):
+        updated = prev + alpha * (row - prev)
+        prev = np.where(np.isnan(prev), row, np.where(np.isnan(row), prev, updated))
+        out[i] = prev
+    return out
+
+
+def _warmup_mask(close: np.ndarray, periods: int) -> np.ndarray:
+    # 取引開始から periods 日に満たない行
+    return np.cumsum(~np.isnan(close), axis=0) < periods
+
+
+# ---- 指標 ----
+
+INDICATORS = {}
+
+
+def indicator(name: str):
+    """
+    指標の計算関数を登録するデコレータ
+    
+    計算関数は Panel を受け取り、出力列名 → 日数 × 銘柄数 の配列 の辞書を返す。
+    
+    Args:
+        name: 指標名
+    """
+    def register(func):
+        INDICATORS[name] = func
+        return func
+    return register
+
+
+@indicator('returns')
+def calc_returns(panel: Panel) -> dict:
+    close = ffill(panel['Close'])
+    return {'Return': close / shift(close) - 1}
+
+
+@indicator('volatility')
+def calc_volatility(panel: Panel, window: int = 20) -> dict:
+    close = ffill(panel['Close'])
+    returns = close / shift(close) - 1
+    return {f'Volatility{window}': rolling_std(returns, window) * np.sqrt(TRADING_DAYS)}
+
+
+@indicator('rsi')
+def calc_rsi(panel: Panel, period: int = 14) -> dict:
+    close = ffill(panel['Close'])
+    delta = close - shift(close)
+    gain = ema(np.clip(delta, 0, None), 1 / period)
+    loss = ema(np.clip(-delta, 0, None), 1 / period)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = np.where(loss == 0, 100.0, 100 - 100 / (1 + gain / loss))
+    rsi[_warmup_mask(panel['Close'], period + 1) | np.isnan(gain)] = np.nan
+    return {f'RSI{period}': rsi}
+
+
+@indicator('macd')
+def calc_macd(panel: Panel, fast: int = 12, slow: int = 26, signal: int = 9) -> dict:
+    close = ffill(panel['Close'])
+    macd = ema(close, 2 / (fast + 1)) - ema(close, 2 / (slow + 1))
+    macd[_warmup_mask(panel['Close'], slow)] = np.nan
+    macd_signal = ema(macd, 2 / (signal + 1))
+    macd_signal[_warmup_mask(panel['Close'], slow + signal - 1)] = np.nan
+    return {'MACD': macd, 'MACDSignal': macd_signal, 'MACDHist': macd - macd_signal}
+
+
+@indicator('bollinger')
+def calc_bollinger(panel: Panel, window: int = 20, width: float = 2.0) -> dict:
+    close = ffill(panel['Close'])
+    middle = rolling_mean(close, window)
+    std = rolling_std(close, window, ddof=0)
+    return {'BBUpper': middle + width * std, 'BBMiddle': middle, 'BBLower': middle - width * std}
+
+
+def compute_indicators(panel: Panel, names: list = None) -> dict:
+    """
+    登録済みの指標を全銘柄まとめて計算
+    
+    Args:
+        panel: Panel
+        names: 計算する指標名 (Noneの場合は登録済みの全指標)
+    
+    Returns:
+        出力列名 → 日数 × 銘柄数 の配列 の辞書
+    """
+    results = {}
+    for name in names or INDICATORS:
+        results.update(INDICATORS[name](panel))
+    return results
+
+
+def slice_stock(panel: Panel, results: dict, code: str) -> dict:
+    """
+    1銘柄分の指標を列形式で切り出す (取引のある日のみ)
+    
+    Args:
+        panel: Panel
+        results: compute_indicators の戻り値
+        code: 銘柄コード
+    
+    Returns:
+        stock_code, dates, columns を持つ辞書 (値のない日は None)
+    """
+    col = panel.column(code)
+    rows = panel.valid_rows(code)
+    
+    columns = {}
+    for name, values in results.items():
+        series = np.round(values[rows, col], DECIMALS)
+        columns[name] = np.where(np.isnan(series), None, series).tolist()
+    
+    return {
+        'stock_code': code,
+        'dates': panel.dates[rows].astype(str).tolist(),
+        'columns': columns
+    }
+
+
+def save_indicator_outputs(panel: Panel, results: dict, output_dir: Path = INDICATOR_DIR) -> int:
+    """
+    銘柄ごとの指標ファイルを保存 (内容が変わらないファイルは書き込まない)
+    
+    Args:
+        panel: Panel
+        results: compute_indicators の戻り値
+        output_dir: 出力先
+    
+    Returns:
+        保存した銘柄数
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for code in panel.codes:
+        output_writer.write_json(output_dir / f'{code}.json', slice_stock(panel, results, code),
+                                 separators=(',', ':'))
+    return len(panel.codes)
+
+
+if __name__ == "__main__":
+    # 引数で銘柄コードを指定した場合はその銘柄のみ
+    codes = sys.argv[1:] or None
+    
+    start_time = time.time()
+    panel = load_panel(codes=codes)
+    load_time = time.time() - start_time
+    print(f"Loaded panel: {len(panel.dates)} dates x {len(panel.codes)} stocks ({load_time:.2f}s)")
+    
+    start_time = time.time()
+    results = compute_indicators(panel)
+    compute_time = time.time() - start_time
+    print(f"Computed {len(results)} indicator columns ({compute_time * 1000:.0f}ms)")
+    
+    count = save_indicator_outputs(panel, results)
+    print(f"✓ Saved indicators for {count} stocks to {INDICATOR_DIR}")
+    output_writer.print_write_summary()
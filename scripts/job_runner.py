@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+"""
+銘柄データ生成のジョブランナー
+対象銘柄 (日経225・テーマ設定・追加銘柄) のうち docs/data にない銘柄と最新でない銘柄だけを生成し、
+生成した銘柄を追記専用のジャーナル (.cache/runs/journal.jsonl) に記録する
+
+実行が途中で止まった場合 (タイムアウト・異常終了) は、次の実行でジャーナルの最後の実行を再開し、
+記録済みの銘柄は取得し直さない。ジャーナルにはストアを保存してから銘柄を記録するため、
+記録済みの銘柄のデータは必ずストアに残っている。
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from generate_json import merge_data, update_data, get_output_file
+from fetch_stock_data import fetch_stock_data, fetch_stock_data_batch, prefetch_stock_info
+import metadata_cache
+import fetch_layer
+import output_writer
+import panel_store
+import catalog
+import retry_policy
+import run_metrics
+from concurrent_runner import (DEFAULT_WORKERS, add_runner_arguments, configure_rate_limits,
+                               run_concurrent, print_throughput)
+
+SCRIPT_DIR = Path(__file__).parent
+
+# 対象銘柄のリスト ({"stocks": [{"code", "name"}]} 形式)
+UNIVERSE_FILES = (SCRIPT_DIR / 'nikkei225_stocks.json', SCRIPT_DIR / 'extra_stocks.json')
+
+# テーマ設定 (stock_mapping の銘柄も対象にする)
+THEME_CONFIG_FILE = SCRIPT_DIR / 'custom_theme_config.json'
+
+# ジャーナルの保存先
+JOURNAL_FILE = SCRIPT_DIR.parent / '.cache' / 'runs' / 'journal.jsonl'
+
+# ストアを保存してジャーナルに記録する間隔 (銘柄数)
+CHECKPOINT_INTERVAL = 20
+
+# 失敗した銘柄を実行の最後に処理し直す回数
+REQUEUE_ROUNDS = 1
+
+# 処理し直しても失敗した銘柄がこの割合を超えた場合は実行を失敗とする
+# (取得できない銘柄が数社あるだけでは後続の処理を止めない)
+MAX_FAILURE_RATIO = 0.2
+
+# 続けてこの回数の実行で失敗した銘柄は、最新でなくても生成する銘柄に選ばない
+# (上場廃止などで取得できない銘柄を毎回処理し直さないように。--codes / --all で指定すれば生成する)
+MAX_FAILED_RUNS = 3
+
+# 日本時間
+JST = timezone(timedelta(hours=9))
+
+# その日の株価が取得できるようになる時刻 (日本時間)
+MARKET_DATA_HOUR = 16
+
+# 取引日を確かめる基準銘柄 (トヨタ自動車)
+REFERENCE_CODE = '7203'
+
+
+def load_universe() -> list:
+    """
+    対象銘柄の一覧を読み込む
+    
+    Returns:
+        {code, name} のリスト (銘柄コード順)
+    """
+    stocks = {}
+    for path in UNIVERSE_FILES:
+        if not path.exists():
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for stock in json.load(f)['stocks']:
+                stocks.setdefault(stock['code'], stock['name'])
+    
+    if THEME_CONFIG_FILE.exists():
+        with open(THEME_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            mapping = json.load(f).get('stock_mapping', {})
+        entries = catalog.get_catalog().entries
+        for code in mapping:
+            stocks.setdefault(code, (entries.get(code) or {}).get('name') or code)
+    
+    return [{'code': code, 'name': stocks[code]} for code in sorted(stocks)]
+
+
+def _latest_weekday(now: datetime = None) -> str:
+    # 株価が取得できるようになった直近の平日
+    now = (now or datetime.now(timezone.utc)).astimezone(JST)
+    day = pd.Timestamp(now.date())
+    if now.hour < MARKET_DATA_HOUR:
+        day -= pd.Timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= pd.Timedelta(days=1)
+    return day.strftime('%Y-%m-%d')
+
+
+def expected_latest_date(now: datetime = None) -> str:
+    """
+    最新のデータとみなす取引日
+    
+    カタログにある最新の取引日より後に平日があれば、基準銘柄の株価を取得して実際の取引日を確かめる
+    (祝日・年末年始は取引がないため、カタログにある最新の取引日のままとする)。
+    基準銘柄を取得できない場合は土日だけを除いた直近の平日とする。
+    
+    Args:
+        now: 現在時刻 (省略時は現在時刻)
+    
+    Returns:
+        日付 (YYYY-MM-DD)
+    """
+    weekday = _latest_weekday(now)
+    seen = max((entry['latest_date'] or '' for entry in catalog.get_catalog().entries.values()), default='')
+    if not seen or seen >= weekday:
+        return weekday
+    
+    df = fetch_stock_data(REFERENCE_CODE, start=seen)
+    if df.empty:
+        return weekday
+    # 取引時間中は当日の途中の値も返るため、直近の平日より後の日付は使わない
+    return min(max(seen, df['Date'].iloc[-1]), weekday)
+
+
+def build_work_list(codes: list, expected: str, failed_runs: dict = None) -> list:
+    """
+    出力ファイルがない銘柄と最新でない銘柄を選ぶ
+    
+    続けて MAX_FAILED_RUNS 回の実行で失敗した銘柄は選ばない。
+    
+    Args:
+        codes: 対象の銘柄コード
+        expected: 最新とみなす取引日 (expected_latest_date の戻り値)
+        failed_runs: 銘柄コードをキーとする続けて失敗した実行の回数 (Journal.failed_runs の戻り値)
+    
+    Returns:
+        生成する銘柄コードのリスト
+    """
+    entries = catalog.get_catalog().entries
+    failed_runs = failed_runs or {}
+    work = []
+    for code in codes:
+        if failed_runs.get(code, 0) >= MAX_FAILED_RUNS:
+            continue
+        entry = entries.get(code)
+        if not entry or not get_output_file(code).exists() or (entry['latest_date'] or '') < expected:
+            work.append(code)
+    return work
+
+
+class Journal:
+    """
+    追記専用の実行ジャーナル
+    
+    1行に1件のイベント (start / done / finish) をJSONで記録する。
+    """
+    
+    def __init__(self, path: Path = JOURNAL_FILE):
+        """
+        Args:
+            path: ジャーナルファイルのパス
+        """
+        self.path = Path(path)
+        self._lock = threading.Lock()
+    
+    def append(self, event: str, **fields):
+        """
+        イベントを追記 (書き込みごとにディスクへ反映する)
+        
+        Args:
+            event: イベント名
+            **fields: イベントの内容
+        """
+        record = {'event': event, 'time': datetime.now(JST).isoformat(timespec='seconds'), **fields}
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+    
+    def last_run(self) -> dict:
+        """
+        最後の実行の状態を読み込む
+        
+        Returns:
+            run, codes, done (記録済みの銘柄コードの集合), finished を持つ辞書 (実行がない場合はNone)
+        """
+        if not self.path.exists():
+            return None
+        
+        run = None
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 書き込み途中で止まった行は無視する
+                    continue
+                if record['event'] == 'start':
+                    run = {'run': record['run'], 'codes': record['codes'], 'done': set(), 'finished': False}
+                elif run and record.get('run') == run['run']:
+                    if record['event'] == 'done':
+                        run['done'].update(record['codes'])
+                    elif record['event'] == 'finish':
+                        run['finished'] = True
+        return run
+    
+    def failed_runs(self) -> dict:
+        """
+        銘柄ごとに続けて失敗した実行の回数を数える (生成できた実行があれば数え直す)
+        
+        Returns:
+            銘柄コードをキーとする回数の辞書
+        """
+        counts = {}
+        if not self.path.exists():
+            return counts
+        
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record['event'] == 'done':
+                    for code in record['codes']:
+                        counts.pop(code, None)
+                elif record['event'] == 'finish':
+                    for code in record.get('failed', []):
+                        counts[code] = counts.get(code, 0) + 1
+        return counts
+
+
+def prefetch_prices(codes, batch_size=50, existing=None):
+    """
+    株価データを一括取得
+    
+    差分更新時は既存データの latest_date ごとに銘柄をまとめ、
+    その日以降の株価だけを取得する。
+    
+    Args:
+        codes: 銘柄コードのリスト
+        batch_size: 1リクエストにまとめる銘柄数
+        existing: 銘柄コードをキーとする出力済みデータ (差分更新時のみ)
+    
+    Returns:
+        銘柄コードをキーとする株価データのDataFrameの辞書
+    """
+    if not existing:
+        return fetch_stock_data_batch(codes, batch_size=batch_size)
+    
+    groups = {}
+    for code in codes:
+        data = existing.get(code)
+        start = data['latest_date'] if data else None
+        groups.setdefault(start, []).append(code)
+    
+    prices = {}
+    for start, group in groups.items():
+        if start:
+            print(f"Fetching {len(group)} stocks since {start}")
+        prices.update(fetch_stock_data_batch(group, batch_size=batch_size, start=start))
+    return prices
+
+
+def run_jobs(stocks, workers=DEFAULT_WORKERS, batch_size=50, incremental=False, binary=False,
+             journal: Journal = None, run_id: str = None, checkpoint_interval: int = CHECKPOINT_INTERVAL,
+             render: bool = True) -> dict:
+    """
+    銘柄データをまとめて生成し、一定数ごとにストアを保存してジャーナルに記録する
+    
+    Args:
+        stocks: {code, name} のリスト
+        workers: 並列ワーカー数 (リクエスト間隔は rate_limiter で制御)
+        batch_size: 株価の一括取得で1リクエストにまとめる銘柄数
+        incremental: Trueの場合は出力済みデータに新しい取引日だけを追記する
+        binary: Trueの場合はバイナリ形式 (<code>.bin) も出力する
+        journal: 生成した銘柄を記録するジャーナル (Noneの場合は記録しない)
+        run_id: ジャーナルに記録する実行ID
+        checkpoint_interval: ストアを保存してジャーナルに記録する間隔 (銘柄数)
+        render: Falseの場合はストアへの反映のみ行い、出力ファイルは作成しない
+    
+    Returns:
+        run_concurrent の戻り値 (処理し直した銘柄は最後の結果を数える。requeued は処理し直した銘柄数)
+    """
+    codes = [s['code'] for s in stocks]
+    names = {s['code']: s['name'] for s in stocks}
+    
+    # 差分更新ではストアから既存データを読み込んでおく
+    # (ストアが空の場合は出力済みの銘柄データから作成)
+    store = panel_store.open_store()
+    existing = {}
+    if incremental:
+        for code in codes:
+            data = store.get_result(code)
+            if data:
+                existing[code] = data
+    
+    # 株価データを数リクエストでまとめて取得
+    with run_metrics.stage('prefetch_prices'):
+        prices = prefetch_prices(codes, batch_size, existing)
+    
+    # 銘柄メタデータをまとめて取得してキャッシュ
+    # (差分更新する銘柄も含め、キャッシュにない・期限切れの銘柄だけを取得する)
+    with run_metrics.stage('prefetch_stock_info'):
+        prefetch_stock_info(codes, workers)
+    print()
+    
+    pending = []
+    pending_lock = threading.Lock()
+    
+    def checkpoint():
+        # ストアを保存してから銘柄をジャーナルに記録する
+        with pending_lock:
+            if not pending:
+                return
+            with run_metrics.stage('checkpoint'):
+                store.save()
+                metadata_cache.get_cache().save()
+                catalog.get_catalog().save()
+                if journal:
+                    journal.append('done', run=run_id, codes=sorted(pending))
+            pending.clear()
+    
+    @run_metrics.timed('stock')
+    def process(code):
+        # 一括取得できなかった銘柄 (prices にない銘柄) は個別に再取得し、それでも取得できなければ失敗とする
+        stock_df = prices.get(code)
+        if code in existing:
+            # 最新日の翌日以降がなければ新しい取引日がないため既存データをそのまま使う
+            result = update_data(code, existing[code], stock_df=stock_df)
+        else:
+            result = merge_data(code, stock_df=stock_df)
+        
+        if not result:
+            return None
+        
+        # ストアに反映してからストアの内容で出力ファイルを作成
+        # (作成しない場合は反映した銘柄コードを成功として返す)
+        store.upsert(result)
+        output_file = panel_store.render_stock(store, code, binary=binary) if render else Path(code)
+        
+        with pending_lock:
+            pending.append(code)
+            due = len(pending) >= checkpoint_interval
+        if due:
+            checkpoint()
+        return output_file
+    
+    label = lambda c: f"{names[c]} ({c})"
+    stats = run_concurrent(codes, process, workers, label=label)
+    stats['requeued'] = 0
+    
+    # 失敗した銘柄は最後に処理し直す (一時停止中のホストは再開を待ち、株価は一括取得の結果を使わずに取得し直す)
+    for n in range(1, REQUEUE_ROUNDS + 1):
+        failed = stats['failed']
+        if not failed:
+            break
+        checkpoint()
+        retry_policy.wait_for_hosts()
+        for code in failed:
+            prices.pop(code, None)
+        print(f"\n失敗した {len(failed)}社 を処理し直します ({n}/{REQUEUE_ROUNDS})\n")
+        retried = run_concurrent(failed, process, workers, label=label)
+        stats = {
+            'success_count': stats['success_count'] + retried['success_count'],
+            'error_count': retried['error_count'],
+            'errors': retried['errors'],
+            'failed': retried['failed'],
+            'elapsed': stats['elapsed'] + retried['elapsed'],
+            'requeued': stats['requeued'] + len(failed)
+        }
+    
+    checkpoint()
+    store.save()
+    metadata_cache.get_cache().save()
+    catalog.get_catalog().save()
+    return stats
+
+
+def run_failed(stats: dict) -> bool:
+    """
+    実行を失敗とするかを判定
+    
+    1社も生成できなかった場合と、失敗した銘柄が MAX_FAILURE_RATIO を超えた場合を失敗とする。
+    
+    Args:
+        stats: run_jobs の戻り値 (対象銘柄がない場合はNone)
+    
+    Returns:
+        失敗とする場合はTrue
+    """
+    if not stats or not stats['error_count']:
+        return False
+    total = stats['success_count'] + stats['error_count']
+    return stats['success_count'] == 0 or stats['error_count'] > total * MAX_FAILURE_RATIO
+
+
+def print_summary(stats: dict, total: int, total_time: float):
+    """
+    生成結果のサマリーを表示
+    
+    Args:
+        stats: run_jobs の戻り値
+        total: 対象銘柄数
+        total_time: 所要時間(秒)
+    """
+    print("\n" + "="*60)
+    print("=== 生成完了 ===")
+    print(f"総銘柄数: {total}社")
+    print(f"成功: {stats['success_count']}社")
+    print(f"失敗: {stats['error_count']}社")
+    if stats.get('requeued'):
+        print(f"処理し直した銘柄: {stats['requeued']}社")
+    print(f"所要時間: {total_time/60:.1f}分")
+    print_throughput(stats)
+    output_writer.print_write_summary()
+    
+    if stats['errors']:
+        print(f"\n=== エラー詳細 ===")
+        for error in stats['errors']:
+            print(f"  - {error}")
+    
+    print("="*60)
+
+
+def write_report(stats: dict, total: int, run_id: str = None, report_file: Path = run_metrics.REPORT_FILE,
+                 metrics_file: Path = run_metrics.METRICS_FILE) -> dict:
+    """
+    段階ごとの所要時間と件数を実行レポート (JSON) と Prometheus 形式のファイルに保存して表示
+    
+    Args:
+        stats: run_jobs の戻り値 (対象銘柄がない場合はNone)
+        total: 対象銘柄数
+        run_id: 実行ID
+        report_file: 実行レポートの保存先
+        metrics_file: Prometheus 形式のファイルの保存先
+    
+    Returns:
+        実行レポートの内容
+    """
+    stats = stats or {}
+    report = run_metrics.build_report(
+        run=run_id,
+        total=total,
+        success_count=stats.get('success_count', 0),
+        error_count=stats.get('error_count', 0),
+        requeued=stats.get('requeued', 0),
+        failed=sorted(stats.get('failed', []))
+    )
+    run_metrics.save_report(report, report_file, metrics_file)
+    run_metrics.print_stage_summary(report)
+    print(f"実行レポート: {report_file}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='銘柄データ生成 (不足・未更新の銘柄のみ。中断した実行は再開する)')
+    add_runner_arguments(parser)
+    metadata_cache.add_metadata_arguments(parser)
+    fetch_layer.add_fetch_arguments(parser)
+    run_metrics.add_report_arguments(parser)
+    parser.add_argument('batch_size', nargs='?', type=int, default=50,
+                        help='株価の一括取得で1リクエストにまとめる銘柄数 (デフォルト: 50)')
+    parser.add_argument('--codes', nargs='+', default=None,
+                        help='対象の銘柄コード (省略時は日経225・テーマ設定・追加銘柄のすべて)')
+    parser.add_argument('--all', action='store_true',
+                        help='最新の銘柄も含めて対象の銘柄をすべて生成する')
+    parser.add_argument('--new-run', action='store_true',
+                        help='中断した実行があっても再開せずに新しく実行する')
+    parser.add_argument('--incremental', action='store_true',
+                        help='出力済みデータに新しい取引日だけを追記する')
+    parser.add_argument('--binary', action='store_true',
+                        help='JSONに加えてバイナリ形式 (<code>.bin) も出力する')
+    parser.add_argument('--no-render', action='store_true',
+                        help='ストアへの反映のみ行い、出力ファイル (docs/data) は作成しない')
+    parser.add_argument('--checkpoint', type=int, default=CHECKPOINT_INTERVAL,
+                        help=f'ストアを保存してジャーナルに記録する間隔 (デフォルト: {CHECKPOINT_INTERVAL}銘柄)')
+    args = parser.parse_args(argv)
+    configure_rate_limits(args)
+    metadata_cache.configure_from_args(args)
+    fetch_layer.configure_from_args(args)
+    
+    universe = load_universe()
+    names = {s['code']: s['name'] for s in universe}
+    journal = Journal()
+    last = journal.last_run()
+    
+    print(f"=== 銘柄データ生成 ===")
+    start_time = time.time()
+    
+    if last and not last['finished'] and not args.new_run:
+        # 中断した実行を再開 (記録済みの銘柄はストアから出力ファイルだけ作り直す)
+        run_id = last['run']
+        work = [code for code in last['codes'] if code not in last['done']]
+        print(f"中断した実行 {run_id} を再開: 完了 {len(last['done'])}社 / 残り {len(work)}社")
+        if not args.no_render:
+            store = panel_store.open_store()
+            panel_store.render_outputs(store, sorted(last['done']), binary=args.binary)
+    else:
+        run_id = datetime.now(JST).strftime('%Y%m%d-%H%M%S')
+        codes = args.codes or [s['code'] for s in universe]
+        if args.all or args.codes:
+            work = codes
+        else:
+            expected = expected_latest_date()
+            failed_runs = journal.failed_runs()
+            work = build_work_list(codes, expected, failed_runs)
+            print(f"最新とみなす取引日: {expected}")
+            skipped = sorted(c for c in codes if failed_runs.get(c, 0) >= MAX_FAILED_RUNS)
+            if skipped:
+                print(f"{MAX_FAILED_RUNS}回続けて失敗したため対象外: {', '.join(skipped)}")
+        journal.append('start', run=run_id, codes=work)
+    
+    print(f"対象銘柄数: {len(work)}社")
+    print(f"並列数: {args.workers}")
+    print(f"一括取得サイズ: {args.batch_size}銘柄/リクエスト")
+    print(f"更新モード: {'差分更新' if args.incremental else '全期間取得'}\n")
+    
+    if not work:
+        journal.append('finish', run=run_id, success=0, errors=0)
+        print("すべての銘柄が最新です")
+        write_report(None, 0, run_id, args.report, args.metrics_file)
+        return None
+    
+    stocks = [{'code': code, 'name': names.get(code, code)} for code in work]
+    stats = run_jobs(stocks, args.workers, args.batch_size, args.incremental, args.binary,
+                     journal=journal, run_id=run_id, checkpoint_interval=args.checkpoint,
+                     render=not args.no_render)
+    journal.append('finish', run=run_id, success=stats['success_count'], errors=stats['error_count'],
+                   failed=sorted(stats['failed']))
+    
+    print_summary(stats, len(work), time.time() - start_time)
+    write_report(stats, len(work), run_id, args.report, args.metrics_file)
+    return stats
+
+
+if __name__ == "__main__":
+    # 処理し直しても失敗した銘柄はジャーナルと実行レポートに記録し、
+    # 株価をほとんど更新できなかった場合だけ失敗として終了する (ビルドグラフが成功として記録しないように)
+    stats = main()
+    if run_failed(stats):
+        sys.exit(1)
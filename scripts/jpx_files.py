@@ -0,0 +1,190 @@
+"""
+JPX公表ファイルの解析ユーティリティ
+信用取引残高・空売り残高などのCSV/Excelファイルを行のリストとして読み込み、
+見出し行・列・日付を判定する
+"""
+import csv
+import io
+import re
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
+
+import numpy as np
+import pandas as pd
+from bs4 import BeautifulSoup
+
+import fetch_layer
+
+# 取り込み対象のファイル形式
+REPORT_SUFFIXES = ('.csv', '.xls', '.xlsx')
+
+
+def list_report_files(directory) -> list:
+    """
+    ディレクトリ内の公表ファイルをファイル名順に列挙
+    
+    Args:
+        directory: ディレクトリ
+    
+    Returns:
+        ファイルパスのリスト
+    """
+    directory = Path(directory)
+    if not directory.exists():
+        return []
+    return sorted(p for p in directory.iterdir() if p.suffix.lower() in REPORT_SUFFIXES)
+
+
+def find_report_links(page_url: str, limit: int = None) -> list:
+    """
+    JPXの公表ページから公表ファイル (CSV/Excel) へのリンクを新しい順に抽出
+    
+    ファイル名に日付があれば日付の新しい順、なければページ内の順 (JPXのページは新しい順に並ぶ) とする。
+    
+    Args:
+        page_url: 公表ページのURL
+        limit: 抽出する件数 (Noneの場合はすべて)
+    
+    Returns:
+        ファイルのURLのリスト
+    """
+    soup = BeautifulSoup(fetch_layer.fetch(page_url), 'html.parser')
+    links = []
+    for anchor in soup.find_all('a', href=True):
+        url = urljoin(page_url, anchor['href'])
+        if Path(urlparse(url).path).suffix.lower() in REPORT_SUFFIXES and url not in links:
+            links.append(url)
+    
+    links.sort(key=lambda url: find_date(Path(urlparse(url).path).name) or '', reverse=True)
+    return links[:limit] if limit else links
+
+
+def read_rows(source) -> tuple:
+    """
+    ファイルを文字列の行のリストとして読み込む
+    
+    Args:
+        source: ファイルのパス、またはCSVファイル内容のバイト列
+    
+    Returns:
+        (行のリスト, ファイル名) のタプル
+    """
+    if isinstance(source, (bytes, bytearray)):
+        raw = bytes(source)
+        name = ''
+    else:
+        source = Path(source)
+        name = source.name
+        if source.suffix.lower() in ('.xls', '.xlsx'):
+            # Excel版はpandasの読み込みエンジン (xlrd / openpyxl) が必要
+            df = pd.read_excel(source, header=None, dtype=str)
+            rows = df.fillna('').values.tolist()
+            return rows, name
+        raw = source.read_bytes()
+    
+    # JPXのファイルはShift_JIS (cp932)
+    for encoding in ('utf-8-sig', 'cp932'):
+        try:
+            text = raw.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError(f"Unsupported encoding: {name}")
+    
+    return list(csv.reader(io.StringIO(text))), name
+
+
+def find_column(header: list, keys: tuple) -> int:
+    """
+    キーワードを含む最初の列の位置を返す
+    
+    Args:
+        header: 見出し行
+        keys: 列名に含まれるキーワード (小文字で比較)
+    
+    Returns:
+        列の位置 (見つからない場合はNone)
+    """
+    for i, cell in enumerate(header):
+        name = str(cell).strip().lower()
+        if any(key in name for key in keys):
+            return i
+    return None
+
+
+def find_header(rows: list, *required: tuple) -> int:
+    """
+    必須の列をすべて含む見出し行を探す
+    
+    Args:
+        rows: 行のリスト
+        required: 必須の列のキーワード
+    
+    Returns:
+        見出し行の位置 (見つからない場合はNone)
+    """
+    for pos, row in enumerate(rows):
+        if all(find_column(row, keys) is not None for keys in required):
+            return pos
+    return None
+
+
+def find_date(text: str) -> str:
+    """
+    文字列中の日付 (2025/01/17, 2025年1月17日, 20250117 など) を YYYY-MM-DD で返す
+    
+    Args:
+        text: 文字列
+    
+    Returns:
+        日付 (見つからない場合はNone)
+    """
+    match = re.search(r'(20\d{2})[/年\-.]?(\d{1,2})[/月\-.]?(\d{1,2})', str(text))
+    if not match:
+        return None
+    year, month, day = (int(g) for g in match.groups())
+    try:
+        return datetime(year, month, day).strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def parse_number(value) -> float:
+    """
+    カンマ区切り・空欄・ハイフンを含む数値を変換
+    
+    Args:
+        value: セルの値
+    
+    Returns:
+        数値 (変換できない場合はNaN)
+    """
+    value = str(value).strip().replace(',', '')
+    if not value or value in ('-', '－'):
+        return np.nan
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def normalize_jpx_code(value) -> str:
+    """
+    JPXファイルの銘柄コードを4桁に正規化 (5桁表記の末尾0を除去)
+    
+    Args:
+        value: セルの値
+    
+    Returns:
+        銘柄コード
+    """
+    code = str(value).strip().strip('"')
+    if code.endswith('.0'):
+        code = code[:-2]
+    if len(code) == 5 and code.endswith('0'):
+        code = code[:4]
+    if code.isdigit():
+        code = code.zfill(4)
+    return code
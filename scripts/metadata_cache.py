@@ -0,0 +1,174 @@
+"""
+銘柄メタデータキャッシュ
+yfinanceの ticker.info から取得した銘柄名・セクター・業種を銘柄コードごとに
+ディスクへ保存し、有効期限内は再取得しない
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# キャッシュの保存先
+CACHE_DIR = Path(__file__).parent.parent / '.cache'
+CACHE_FILE = CACHE_DIR / 'stock_metadata.json'
+
+# キャッシュの有効期限(日)
+DEFAULT_TTL_DAYS = 30
+
+
+class MetadataCache:
+    """
+    銘柄コードをキーとするメタデータのディスクキャッシュ
+    """
+    
+    def __init__(self, path: Path = CACHE_FILE, ttl_days: float = DEFAULT_TTL_DAYS, refresh: bool = False):
+        """
+        Args:
+            path: キャッシュファイルのパス
+            ttl_days: 有効期限(日)
+            refresh: Trueの場合は今回の実行より前に保存されたエントリを期限切れとして扱う
+        """
+        self.path = Path(path)
+        self.ttl = ttl_days * 86400
+        self.refreshed_after = time.time() if refresh else None
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('entries', {})
+        except Exception as e:
+            print(f"Error reading metadata cache: {e}")
+            self.entries = {}
+    
+    def _is_fresh(self, entry: dict) -> bool:
+        fetched_at = entry.get('fetched_at', 0)
+        if self.refreshed_after is not None and fetched_at < self.refreshed_after:
+            return False
+        return time.time() - fetched_at < self.ttl
+    
+    def get(self, code: str) -> dict:
+        """
+        有効期限内のメタデータを取得
+        
+        Args:
+            code: 銘柄コード (4桁)
+        
+        Returns:
+            メタデータの辞書 (未取得・期限切れの場合はNone)
+        """
+        with self._lock:
+            entry = self.entries.get(code)
+            if entry and self._is_fresh(entry):
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+    
+    def put(self, code: str, metadata: dict):
+        """
+        メタデータを保存
+        
+        Args:
+            code: 銘柄コード (4桁)
+            metadata: メタデータの辞書
+        """
+        with self._lock:
+            self.entries[code] = dict(metadata, fetched_at=time.time())
+            self._dirty = True
+    
+    def stale_codes(self, codes: list) -> list:
+        """
+        未取得または期限切れの銘柄コードを抽出
+        
+        Args:
+            codes: 銘柄コードのリスト
+        
+        Returns:
+            再取得が必要な銘柄コードのリスト
+        """
+        with self._lock:
+            return [c for c in codes if not (c in self.entries and self._is_fresh(self.entries[c]))]
+    
+    def save(self):
+        """
+        変更があればキャッシュファイルに書き出す
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'entries': self.entries}, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def configure(ttl_days: float = DEFAULT_TTL_DAYS, refresh: bool = False) -> MetadataCache:
+    """
+    共有キャッシュを設定
+    
+    Args:
+        ttl_days: 有効期限(日)
+        refresh: Trueの場合は全銘柄のメタデータを取得し直す
+    
+    Returns:
+        設定したMetadataCache
+    """
+    global _cache
+    with _cache_lock:
+        _cache = MetadataCache(ttl_days=ttl_days, refresh=refresh)
+        return _cache
+
+
+def get_cache() -> MetadataCache:
+    """
+    共有キャッシュを取得 (未設定ならデフォルト設定で読み込む)
+    
+    Returns:
+        MetadataCache
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MetadataCache()
+        return _cache
+
+
+def add_metadata_arguments(parser):
+    """
+    メタデータキャッシュのコマンドライン引数を追加
+    
+    Args:
+        parser: argparse.ArgumentParser
+    """
+    parser.add_argument('--refresh-metadata', action='store_true',
+                        help='キャッシュを使わず銘柄メタデータ (名称・セクター・業種) を取得し直す')
+    parser.add_argument('--metadata-ttl', type=float, default=DEFAULT_TTL_DAYS,
+                        help=f'銘柄メタデータキャッシュの有効期限(日) (デフォルト: {DEFAULT_TTL_DAYS})')
+
+
+def configure_from_args(args) -> MetadataCache:
+    """
+    コマンドライン引数から共有キャッシュを設定
+    
+    Args:
+        args: add_metadata_arguments で追加した引数の解析結果
+    
+    Returns:
+        設定したMetadataCache
+    """
+    return configure(ttl_days=args.metadata_ttl, refresh=args.refresh_metadata)
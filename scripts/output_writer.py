@@ -0,0 +1,149 @@
+"""
+出力ファイルの書き込み
+内容が変わらないファイルは書き込まず、変わった場合のみ一時ファイル経由で置き換える
+
+JSONは sort_keys・区切り文字を揃えた正規形のハッシュで比較するため、
+インデントなど書式だけが違う場合も変更なしとして扱う。
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+
+class WriteStats:
+    """
+    書き込んだファイル・スキップしたファイルの集計
+    """
+    
+    def __init__(self):
+        self.written = []
+        self.skipped = []
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+    
+    def record(self, path: Path, written: bool, size: int = 0):
+        with self._lock:
+            (self.written if written else self.skipped).append(Path(path))
+            if written:
+                self.bytes_written += size
+
+
+_stats = WriteStats()
+
+
+def get_stats() -> WriteStats:
+    """
+    書き込みの集計を取得
+    
+    Returns:
+        WriteStats
+    """
+    return _stats
+
+
+def reset_stats() -> WriteStats:
+    """
+    書き込みの集計をリセット
+    
+    Returns:
+        新しいWriteStats
+    """
+    global _stats
+    _stats = WriteStats()
+    return _stats
+
+
+def canonical_hash(obj) -> str:
+    """
+    JSONに変換できる値の正規形のハッシュ
+    
+    Args:
+        obj: JSONに変換できる値
+    
+    Returns:
+        SHA-256 (16進数)
+    """
+    text = json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def write_atomic(path: Path, data: bytes):
+    """
+    一時ファイルに書き込んでから置き換える (途中で中断しても壊れたファイルを残さない)
+    
+    Args:
+        path: 書き込み先
+        data: ファイル内容
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def write_bytes(path: Path, data: bytes) -> bool:
+    """
+    内容が変わった場合のみファイルを書き込む
+    
+    Args:
+        path: 書き込み先
+        data: ファイル内容
+    
+    Returns:
+        書き込んだ場合はTrue
+    """
+    path = Path(path)
+    changed = True
+    if path.exists():
+        existing = hashlib.sha256(path.read_bytes()).digest()
+        changed = existing != hashlib.sha256(data).digest()
+    
+    if changed:
+        write_atomic(path, data)
+    _stats.record(path, changed, len(data))
+    return changed
+
+
+def write_json(path: Path, obj, **dump_kwargs) -> bool:
+    """
+    正規形のハッシュが変わった場合のみJSONファイルを書き込む
+    
+    Args:
+        path: 書き込み先
+        obj: JSONに変換できる値
+        **dump_kwargs: json.dumps に渡す書式 (indent, separators など)
+    
+    Returns:
+        書き込んだ場合はTrue
+    """
+    path = Path(path)
+    changed = True
+    if path.exists():
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                changed = canonical_hash(json.load(f)) != canonical_hash(obj)
+        except Exception:
+            changed = True
+    
+    size = 0
+    if changed:
+        data = json.dumps(obj, ensure_ascii=False, **dump_kwargs).encode('utf-8')
+        write_atomic(path, data)
+        size = len(data)
+    _stats.record(path, changed, size)
+    return changed
+
+
+def print_write_summary(stats: WriteStats = None):
+    """
+    書き込み・スキップしたファイル数を表示
+    
+    Args:
+        stats: 集計 (省略時は共有の集計)
+    """
+    stats = stats or _stats
+    print(f"書き込み: {len(stats.written)}ファイル ({stats.bytes_written / 1024:.0f}KB) / "
+          f"変更なしでスキップ: {len(stats.skipped)}ファイル")
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+日次データストアの読み込み (分析用)
+.cache/panel/ の項目ごとの配列をメモリマップで開き、
+必要な期間・銘柄の部分だけを読み込む
+    
+    from panel_reader import PanelReader
+    reader = PanelReader()
+    close = reader.get(['7203', '6758'], 'Close', start='2022-01-01')
+    frame = reader.get(fields=('Close', 'Volume'), start='2024-01-01', as_frame=True)
+
+期間だけを指定した場合 (銘柄を指定しない・銘柄が連続している場合) はコピーを作らない読み取り専用のビューを返す。
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from panel_store import STORE_DIR
+
+
+class PanelReader:
+    """
+    日次データストアの読み取り専用のビュー
+    
+    配列は最初に参照したときにメモリマップで開き、ファイル全体は読み込まない。
+    """
+    
+    def __init__(self, directory: Path = STORE_DIR):
+        """
+        Args:
+            directory: ストアの保存先
+        """
+        self.directory = Path(directory)
+        meta_file = self.directory / 'meta.json'
+        if not meta_file.exists():
+            raise FileNotFoundError(f"Panel store not found: {meta_file}")
+        
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        
+        self.dates = np.array(meta['dates'], dtype='datetime64[D]')
+        self.codes = meta['codes']
+        self.field_names = meta['fields']
+        self.stocks = meta.get('stocks', {})
+        self._columns = {code: i for i, code in enumerate(self.codes)}
+        self._arrays = {}
+    
+    def array(self, field: str) -> np.ndarray:
+        """
+        項目の全体の配列をメモリマップで取得
+        
+        Args:
+            field: 項目名
+        
+        Returns:
+            日数 × 銘柄数 の読み取り専用の配列
+        """
+        if field not in self._arrays:
+            if field not in self.field_names:
+                raise KeyError(f"Unknown field: {field}")
+            values = np.load(self.directory / f'{field}.npy', mmap_mode='r')
+            if values.shape != (len(self.dates), len(self.codes)):
+                raise ValueError(f"{field}.npy does not match meta.json: {values.shape}")
+            self._arrays[field] = values
+        return self._arrays[field]
+    
+    def _rows(self, start, end) -> slice:
+        first = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, 'D'), side='left'))
+        last = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(end, 'D'), side='right'))
+        return slice(first, last)
+    
+    def _cols(self, codes):
+        if codes is None:
+            return slice(None)
+        
+        missing = [code for code in codes if code not in self._columns]
+        if missing:
+            raise KeyError(f"Unknown codes: {', '.join(missing)}")
+        
+        # 連続した列はスライスで参照する (コピーを作らない)
+        cols = [self._columns[code] for code in codes]
+        if cols and cols == list(range(cols[0], cols[0] + len(cols))):
+            return slice(cols[0], cols[0] + len(cols))
+        return cols
+    
+    def get(self, codes: list = None, fields='Close', start=None, end=None, as_frame: bool = False):
+        """
+        指定した銘柄・項目・期間のデータを取得
+        
+        Args:
+            codes: 銘柄コードのリスト (Noneの場合は全銘柄)
+            fields: 項目名、または項目名のリスト
+            start: 開始日 (この日を含む。Noneの場合は最初から)
+            end: 終了日 (この日を含む。Noneの場合は最後まで)
+            as_frame: Trueの場合は日付を行、銘柄コードを列とするDataFrameで返す
+                (項目が複数の場合は列を (項目名, 銘柄コード) とする)
+        
+        Returns:
+            fields が項目名の場合は 日数 × 銘柄数 の配列、リストの場合は項目名 → 配列 の辞書
+            (as_frame の場合はDataFrame)
+        """
+        single = isinstance(fields, str)
+        names = [fields] if single else list(fields)
+        rows = self._rows(start, end)
+        cols = self._cols(codes)
+        
+        if isinstance(cols, slice):
+            values = {field: self.array(field)[rows, cols] for field in names}
+        else:
+            # 銘柄が飛び飛びの場合は期間を切り出してから列を選ぶ (選んだ部分だけを読み込む)
+            values = {field: self.array(field)[rows][:, cols] for field in names}
+        
+        if not as_frame:
+            return values[fields] if single else values
+        
+        index = pd.DatetimeIndex(self.dates[rows], name='Date')
+        columns = self.codes[cols] if isinstance(cols, slice) else list(codes)
+        if single:
+            return pd.DataFrame(values[fields], index=index, columns=columns, copy=False)
+        return pd.concat(
+            {field: pd.DataFrame(values[field], index=index, columns=columns, copy=False) for field in names},
+            axis=1
+        )
+
+
+def get(codes: list = None, fields='Close', start=None, end=None, as_frame: bool = False):
+    """
+    既定の保存先のストアからデータを取得 (PanelReader.get を参照)
+    """
+    return PanelReader().get(codes, fields, start, end, as_frame)
+
+
+if __name__ == "__main__":
+    # 銘柄コードを指定して直近の終値を表示 (指定しない場合は全銘柄の読み込み時間を表示)
+    codes = sys.argv[1:] or None
+    
+    start_time = time.time()
+    reader = PanelReader()
+    close = reader.get(codes, 'Close', as_frame=True)
+    elapsed = time.time() - start_time
+    
+    print(close.tail())
+    print(f"\n{close.shape[0]} dates x {close.shape[1]} stocks in {elapsed * 1000:.1f}ms")
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+全銘柄の日次データストア
+全銘柄の日次項目を日付 × 銘柄コードの配列として1か所に保存し、
+docs/data 以下の出力ファイルはすべてこのストアから作成する
+
+保存形式 (.cache/panel/):
+    meta.json      日付・銘柄コードの並びと銘柄情報 (名称・セクター・業種)
+    <項目名>.npy   日数 × 銘柄数 の float64 配列 (取引のない日は NaN)
+
+出力形式を変更した場合も、ストアから全銘柄を作り直せばネットワークへのアクセスは不要。
+"""
+import io
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from generate_json import OUTPUT_DIR, load_existing_output, save_output, to_columnar, add_derived_data
+import output_writer
+import catalog
+import run_metrics
+
+# ストアの保存先
+STORE_DIR = Path(__file__).parent.parent / '.cache' / 'panel'
+
+# ストアに保存する日次項目
+STORE_FIELDS = ('Open', 'High', 'Low', 'Close', 'Volume', 'MarginBuy', 'MarginSell', 'ShortSelling')
+
+# ストアに保存する銘柄情報
+INFO_KEYS = ('stock_name', 'sector', 'industry')
+
+
+class PanelStore:
+    """
+    日付 × 銘柄コードの日次データストア
+    
+    upsert した銘柄は次に参照・保存するときにまとめて配列へ反映する
+    (銘柄ごとに配列を作り直さない)。
+    """
+    
+    def __init__(self, directory: Path = STORE_DIR):
+        """
+        Args:
+            directory: ストアの保存先
+        """
+        self.directory = Path(directory)
+        self.dates = np.array([], dtype='datetime64[D]')
+        self.codes = []
+        self.stocks = {}
+        self.fields = {field: np.empty((0, 0)) for field in STORE_FIELDS}
+        self._columns = {}
+        self._pending = {}
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._load()
+    
+    def _load(self):
+        meta_file = self.directory / 'meta.json'
+        if not meta_file.exists():
+            return
+        try:
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            dates = np.array(meta['dates'], dtype='datetime64[D]')
+            codes = meta['codes']
+            fields = {}
+            for field in STORE_FIELDS:
+                path = self.directory / f'{field}.npy'
+                fields[field] = np.load(path) if path.exists() else np.full((len(dates), len(codes)), np.nan)
+        except Exception as e:
+            print(f"Error reading panel store: {e}")
+            return
+        
+        self.dates = dates
+        self.codes = codes
+        self.stocks = meta.get('stocks', {})
+        self.fields = fields
+        self._columns = {code: i for i, code in enumerate(codes)}
+    
+    def __contains__(self, code: str) -> bool:
+        with self._lock:
+            return code in self._columns or code in self._pending
+    
+    def is_empty(self) -> bool:
+        """
+        銘柄が1つも保存されていないか判定
+        
+        Returns:
+            空の場合はTrue
+        """
+        with self._lock:
+            return not self.codes and not self._pending
+    
+    def all_codes(self) -> list:
+        """
+        保存されている銘柄コードの一覧
+        
+        Returns:
+            銘柄コードのリスト
+        """
+        with self._lock:
+            self._apply_pending()
+            return list(self.codes)
+    
+    @run_metrics.timed('store_upsert')
+    def upsert(self, result: dict):
+        """
+        銘柄の全期間のデータを追加または置き換え
+        
+        Args:
+            result: merge_data / update_data の統合データ
+        """
+        records = result['data']
+        frame = {'dates': np.array([r['Date'] for r in records], dtype='datetime64[D]')}
+        for field in STORE_FIELDS:
+            frame[field] = np.array([r.get(field, np.nan) for r in records], dtype=float)
+        info = {key: result.get(key) for key in INFO_KEYS}
+        
+        with self._lock:
+            self._pending[result['stock_code']] = (frame, info)
+            self._dirty = True
+    
+    def _apply_pending(self):
+        if not self._pending:
+            return
+        
+        pending = self._pending
+        self._pending = {}
+        
+        dates = np.unique(np.concatenate([self.dates] + [frame['dates'] for frame, _ in pending.values()]))
+        codes = self.codes + [code for code in pending if code not in self._columns]
+        
+        # 日付・銘柄が増えた場合のみ配列を作り直す
+        if len(dates) != len(self.dates) or len(codes) != len(self.codes):
+            rows = np.searchsorted(dates, self.dates)
+            for field in STORE_FIELDS:
+                values = np.full((len(dates), len(codes)), np.nan)
+                values[rows, :len(self.codes)] = self.fields[field]
+                self.fields[field] = values
+            self.dates = dates
+            self.codes = codes
+            self._columns = {code: i for i, code in enumerate(codes)}
+        
+        for code, (frame, info) in pending.items():
+            col = self._columns[code]
+            rows = np.searchsorted(self.dates, frame['dates'])
+            for field in STORE_FIELDS:
+                self.fields[field][:, col] = np.nan
+                self.fields[field][rows, col] = frame[field]
+            self.stocks[code] = info
+    
+    def get_result(self, code: str) -> dict:
+        """
+        銘柄の全期間のデータを統合データの形式で取得
+        
+        Args:
+            code: 銘柄コード
+        
+        Returns:
+            統合データの辞書 (移動平均・価格帯別出来高は含まない。保存されていない場合はNone)
+        """
+        with self._lock:
+            self._apply_pending()
+            if code not in self._columns:
+                return None
+            col = self._columns[code]
+            rows = ~np.isnan(self.fields['Close'][:, col])
+            df = pd.DataFrame({'Date': self.dates[rows].astype(str)})
+            for field in STORE_FIELDS:
+                df[field] = self.fields[field][rows, col]
+            info = dict(self.stocks.get(code, {}))
+        
+        if df.empty:
+            return None
+        
+        df['Volume'] = df['Volume'].fillna(0).astype('int64')
+        df = df.fillna(0)
+        return {
+            'stock_code': code,
+            'stock_name': info.get('stock_name') or code,
+            'sector': info.get('sector') or 'Unknown',
+            'industry': info.get('industry') or 'Unknown',
+            'base_date': df['Date'].iloc[0],
+            'latest_date': df['Date'].iloc[-1],
+            'data': df.to_dict('records')
+        }
+    
+    def save(self):
+        """
+        変更があればストアを書き出す (項目ごとの配列を書いてから meta.json を置き換える)
+        """
+        with self._lock:
+            self._apply_pending()
+            if not self._dirty:
+                return
+            
+            for field in STORE_FIELDS:
+                buffer = io.BytesIO()
+                np.save(buffer, self.fields[field])
+                output_writer.write_atomic(self.directory / f'{field}.npy', buffer.getvalue())
+            
+            meta = {
+                'dates': self.dates.astype(str).tolist(),
+                'codes': self.codes,
+                'fields': list(STORE_FIELDS),
+                'stocks': self.stocks
+            }
+            output_writer.write_atomic(self.directory / 'meta.json',
+                                       json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+            self._dirty = False
+    
+    def import_outputs(self, data_dir: Path = OUTPUT_DIR) -> int:
+        """
+        出力済みの銘柄データ (docs/data/<code>/ の年別ファイル) をストアに取り込む
+        
+        Args:
+            data_dir: 銘柄データのディレクトリ
+        
+        Returns:
+            取り込んだ銘柄数
+        """
+        count = 0
+        for path in sorted(data_dir.glob('*/recent.json')):
+            result = load_existing_output(path.parent.name)
+            if result:
+                self.upsert(result)
+                count += 1
+        return count
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> PanelStore:
+    """
+    共有ストアを取得 (未読み込みなら読み込む)
+    
+    Returns:
+        PanelStore
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PanelStore()
+        return _store
+
+
+def open_store(data_dir: Path = OUTPUT_DIR) -> PanelStore:
+    """
+    共有ストアを取得し、空の場合は出力済みの銘柄データから作成する
+    
+    Args:
+        data_dir: 銘柄データのディレクトリ
+    
+    Returns:
+        PanelStore
+    """
+    store = get_store()
+    if store.is_empty():
+        count = store.import_outputs(data_dir)
+        if count:
+            print(f"Panel store initialized from {count} existing output files")
+    return store
+
+
+def build_output(store: PanelStore, code: str) -> dict:
+    """
+    ストアから1銘柄の出力内容 (移動平均・価格帯別出来高を含む統合データ) を作成
+    
+    Args:
+        store: PanelStore
+        code: 銘柄コード
+    
+    Returns:
+        統合データの辞書 (ストアにない場合はNone)
+    """
+    result = store.get_result(code)
+    if result is None:
+        return None
+    return add_derived_data(result)
+
+
+@run_metrics.timed('render')
+def render_stock(store: PanelStore, code: str, binary: bool = False) -> Path:
+    """
+    ストアから1銘柄の出力ファイルを作成
+    
+    Args:
+        store: PanelStore
+        code: 銘柄コード
+        binary: Trueの場合はバイナリ形式も出力する
+    
+    Returns:
+        保存したJSONファイルのパス (ストアにない場合はNone)
+    """
+    result = build_output(store, code)
+    if result is None:
+        return None
+    return save_output(result, binary=binary)
+
+
+def render_outputs(store: PanelStore, codes: list = None, binary: bool = False) -> int:
+    """
+    ストアから出力ファイルをまとめて作成
+    
+    Args:
+        store: PanelStore
+        codes: 対象の銘柄コード (Noneの場合は全銘柄)
+        binary: Trueの場合はバイナリ形式も出力する
+    
+    Returns:
+        作成した銘柄数
+    """
+    count = 0
+    for code in codes or store.all_codes():
+        if render_stock(store, code, binary=binary):
+            count += 1
+    return count
+
+
+def rebuild_catalog(store: PanelStore) -> int:
+    """
+    出力ファイルを書き込まずに、ストアの全銘柄でカタログを作り直す
+    
+    Args:
+        store: PanelStore
+    
+    Returns:
+        カタログの銘柄数
+    """
+    codes = store.all_codes()
+    target = catalog.get_catalog()
+    for code in set(target.entries) - set(codes):
+        target.remove(code)
+    for code in codes:
+        result = build_output(store, code)
+        if result:
+            target.put(to_columnar(result))
+    target.save()
+    return len(target.entries)
+
+
+if __name__ == "__main__":
+    # --import: 出力済みの銘柄データをストアに取り込む
+    # --render [銘柄コード...]: ストアから出力ファイルを作り直す (--binary でバイナリ形式も出力)
+    # --catalog: ストアからカタログ (docs/catalog.json) を作り直す
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    store = get_store()
+    
+    if '--import' in sys.argv[1:]:
+        count = store.import_outputs()
+        store.save()
+        print(f"✓ Imported {count} stocks into {store.directory}")
+    
+    if '--render' in sys.argv[1:]:
+        start_time = time.time()
+        count = render_outputs(store, args or None, binary='--binary' in sys.argv[1:])
+        catalog.get_catalog().save()
+        print(f"✓ Rendered {count} stocks in {time.time() - start_time:.1f}s")
+        output_writer.print_write_summary()
+    
+    if '--catalog' in sys.argv[1:]:
+        count = rebuild_catalog(store)
+        print(f"✓ Catalog rebuilt with {count} stocks: {catalog.CATALOG_FILE}")
+    
+    print(f"Panel store: {len(store.all_codes())} stocks x {len(store.dates)} dates")
@@ -0,0 +1,116 @@
+"""
+レート制限モジュール
+接続先ホストごとのトークンバケットで、並列実行時もリクエスト間隔を守る
+"""
+import threading
+import time
+
+# 接続先ホスト
+YAHOO_HOST = 'query2.finance.yahoo.com'
+JPX_HOST = 'www.jpx.co.jp'
+
+
+class TokenBucket:
+    """
+    トークンバケット方式のレートリミッタ
+    
+    rate 個/秒でトークンが補充され、最大 capacity 個まで貯まる。
+    acquire() はトークンが得られるまで呼び出し元のスレッドを待機させる。
+    """
+    
+    def __init__(self, rate: float, capacity: float = 1):
+        """
+        Args:
+            rate: 1秒あたりのリクエスト数
+            capacity: 連続して送れるリクエスト数 (バースト)
+        """
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.acquired = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        トークンを取得する (足りなければ補充されるまで待機)
+        
+        Args:
+            tokens: 消費するトークン数
+        
+        Returns:
+            待機した秒数
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    self.acquired += 1
+                    self.waited += waited
+                    return waited
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+# ホスト名をキーとするレートリミッタ
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def configure(host: str, rate: float, capacity: float = 1) -> TokenBucket:
+    """
+    ホストのレート制限を設定
+    
+    Args:
+        host: 接続先ホスト
+        rate: 1秒あたりのリクエスト数 (0以下で制限なし)
+        capacity: 連続して送れるリクエスト数
+    
+    Returns:
+        設定したTokenBucket (制限なしの場合はNone)
+    """
+    with _limiters_lock:
+        if rate <= 0:
+            _limiters.pop(host, None)
+            return None
+        bucket = TokenBucket(rate, capacity)
+        _limiters[host] = bucket
+        return bucket
+
+
+def acquire(host: str) -> float:
+    """
+    ホストへのリクエスト前に呼び出してレート制限を適用
+    
+    Args:
+        host: 接続先ホスト
+    
+    Returns:
+        待機した秒数 (制限が設定されていなければ0)
+    """
+    bucket = _limiters.get(host)
+    if bucket is None:
+        return 0.0
+    return bucket.acquire()
+
+
+def get_limiter(host: str) -> TokenBucket:
+    """
+    ホストのレートリミッタを取得
+    
+    Args:
+        host: 接続先ホスト
+    
+    Returns:
+        TokenBucket (設定されていなければNone)
+    """
+    return _limiters.get(host)
@@ -0,0 +1,272 @@
+"""
+リトライ・サーキットブレーカーモジュール
+接続先ホストごとに、失敗したリクエストをジッター付きの指数バックオフで再試行し、
+連続して失敗したホストへのリクエストを一定時間止める
+
+- 再試行の待ち時間は 0〜min(最大待ち時間, 基準待ち時間 × 2^試行回数) の一様乱数 (フルジッター)
+- 連続失敗が閾値に達したホストはクールダウンの間リクエストを止め、呼び出し元は再開まで待つ
+  (クールダウン後の最初のリクエストが成功すれば再開し、待っても再開しなければ CircuitOpenError を送出する)
+- 404 などの再試行しても結果が変わらないエラー・データのない応答 (NoDataError) は再試行せず、失敗としても数えない
+"""
+import random
+import threading
+import time
+
+import requests
+
+# デフォルトの再試行回数 (最初のリクエストを含まない)
+DEFAULT_RETRIES = 3
+
+# 再試行の基準待ち時間・最大待ち時間(秒)
+BASE_DELAY = 1.0
+MAX_DELAY = 30.0
+
+# リクエストを止めるまでの連続失敗回数
+FAILURE_THRESHOLD = 5
+
+# リクエストを止める時間(秒)
+COOLDOWN = 60.0
+
+# 再開を待つ間に状態を確認する間隔(秒)
+POLL_INTERVAL = 0.5
+
+# 再試行するHTTPステータス
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """
+    連続して失敗したホストへのリクエストを止めている
+    """
+
+
+class NoDataError(Exception):
+    """
+    ホストは応答したが要求したデータがなかった (上場廃止の銘柄など。再試行せず、失敗としても数えない)
+    """
+
+
+class CircuitBreaker:
+    """
+    ホストごとの再試行とサーキットブレーカー
+    
+    連続失敗が failure_threshold 回に達すると cooldown 秒の間リクエストを止める (open)。
+    クールダウン後は1件だけリクエストを通し (half-open)、成功すれば再開、失敗すれば再び止める。
+    """
+    
+    def __init__(self, retries: int = DEFAULT_RETRIES, base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY,
+                 failure_threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN):
+        """
+        Args:
+            retries: 再試行回数
+            base_delay: 再試行の基準待ち時間(秒)
+            max_delay: 再試行の最大待ち時間(秒)
+            failure_threshold: リクエストを止めるまでの連続失敗回数
+            cooldown: リクエストを止める時間(秒)
+        """
+        self.retries = max(0, retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.requests = 0
+        self.failures = 0
+        self.retried = 0
+        self.opened = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+    
+    def backoff(self, attempt: int) -> float:
+        """
+        再試行までの待ち時間 (フルジッター)
+        
+        Args:
+            attempt: 失敗した試行の番号 (0から)
+        
+        Returns:
+            待ち時間(秒)
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+    
+    def _remaining(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+    
+    def remaining(self) -> float:
+        """
+        リクエストを再開するまでの秒数
+        
+        Returns:
+            秒数 (止めていなければ0)
+        """
+        with self._lock:
+            return self._remaining()
+    
+    def _allow(self):
+        # 止めている間は再開を待つ (様子見のリクエストが失敗してクールダウンを2回待っても再開しなければ諦める)
+        deadline = None
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if self.opened_at is None:
+                    self.requests += 1
+                    return
+                wait = self._remaining()
+                if wait <= 0 and not self.trial:
+                    # クールダウン後は1件だけ通して様子を見る
+                    self.trial = True
+                    self.requests += 1
+                    return
+                if deadline is None:
+                    deadline = now + wait + self.cooldown
+                elif now >= deadline:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"Requests paused after {self.consecutive_failures} consecutive failures")
+            time.sleep(max(0.01, min(wait or POLL_INTERVAL, deadline - now)))
+    
+    def _record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial = False
+    
+    def _record_failure(self) -> bool:
+        # 連続失敗が閾値に達した・様子見のリクエストが失敗した場合はリクエストを止める
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.trial or self.consecutive_failures >= self.failure_threshold:
+                self.opened += 1
+                self.opened_at = time.monotonic()
+                self.trial = False
+                return True
+            return False
+    
+    def call(self, func, *args, **kwargs):
+        """
+        関数を呼び出す (失敗したら待ってから再試行)
+        
+        Args:
+            func: リクエストを送る関数
+            *args, **kwargs: func の引数
+        
+        Returns:
+            func の戻り値
+        
+        Raises:
+            CircuitOpenError: リクエストを止めていて、待っても再開しなかった
+            Exception: 再試行しても失敗した場合は最後の例外
+        """
+        for attempt in range(self.retries + 1):
+            self._allow()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    # ホストは応答しているため失敗として数えない
+                    self._record_success()
+                    raise
+                # 再試行回数を使い切った・リクエストを止めた場合はそのまま失敗とする
+                if self._record_failure() or attempt >= self.retries:
+                    raise
+                delay = self.backoff(attempt)
+                with self._lock:
+                    self.retried += 1
+                print(f"Retrying in {delay:.1f}s ({attempt + 1}/{self.retries}): {e}")
+                time.sleep(delay)
+            else:
+                self._record_success()
+                return result
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    再試行すれば成功する可能性のあるエラーか判定
+    
+    Args:
+        error: 発生した例外
+    
+    Returns:
+        接続エラー・タイムアウト・429/5xx などはTrue、それ以外のHTTPエラー (404など)・NoDataError はFalse
+    """
+    if isinstance(error, (CircuitOpenError, NoDataError)):
+        return False
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code in RETRY_STATUSES
+    return True
+
+
+# ホスト名をキーとするサーキットブレーカー
+_breakers = {}
+_breakers_lock = threading.Lock()
+_settings = {}
+
+
+def configure(retries: int = DEFAULT_RETRIES, base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY,
+              failure_threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN):
+    """
+    すべてのホストの再試行・サーキットブレーカーを設定 (設定済みのホストは作り直す)
+    
+    Args:
+        retries: 再試行回数
+        base_delay: 再試行の基準待ち時間(秒)
+        max_delay: 再試行の最大待ち時間(秒)
+        failure_threshold: リクエストを止めるまでの連続失敗回数
+        cooldown: リクエストを止める時間(秒)
+    """
+    global _settings
+    with _breakers_lock:
+        _settings = dict(retries=retries, base_delay=base_delay, max_delay=max_delay,
+                         failure_threshold=failure_threshold, cooldown=cooldown)
+        _breakers.clear()
+
+
+def get_breaker(host: str) -> CircuitBreaker:
+    """
+    ホストのサーキットブレーカーを取得 (なければ作成)
+    
+    Args:
+        host: 接続先ホスト
+    
+    Returns:
+        CircuitBreaker
+    """
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(**_settings)
+        return _breakers[host]
+
+
+def call(host: str, func, *args, **kwargs):
+    """
+    ホストへのリクエストを再試行・サーキットブレーカー付きで実行
+    
+    Args:
+        host: 接続先ホスト
+        func: リクエストを送る関数
+        *args, **kwargs: func の引数
+    
+    Returns:
+        func の戻り値
+    """
+    return get_breaker(host).call(func, *args, **kwargs)
+
+
+def wait_for_hosts() -> float:
+    """
+    リクエストを止めているホストがあれば再開できるまで待つ
+    
+    Returns:
+        待機した秒数
+    """
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    wait = max([breaker.remaining() for breaker in breakers], default=0.0)
+    if wait > 0:
+        print(f"Waiting {wait:.0f}s for paused sources to resume...")
+        time.sleep(wait)
+    return wait
@@ -0,0 +1,310 @@
+"""
+実行メトリクス
+処理の段階ごとの所要時間と件数を集計し、実行レポート (JSON) と
+Prometheus の textfile collector 形式のファイルに出力する
+
+- 段階の所要時間は stage() (with ブロック) または @timed (関数) で計測し、
+  段階ごとに回数・合計・p50・p95・最大を集計する
+- 件数 (行数など) は count() で加算する
+- 書き込んだバイト数・レスポンスキャッシュのヒット数・再試行回数などは各モジュールの集計から取り込む
+"""
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+import fetch_layer
+import metadata_cache
+import output_writer
+import rate_limiter
+import retry_policy
+
+# 実行レポートの保存先
+REPORT_FILE = Path(__file__).parent.parent / '.cache' / 'runs' / 'report.json'
+
+# Prometheus の textfile collector 形式のファイルの保存先
+METRICS_FILE = Path(__file__).parent.parent / '.cache' / 'metrics' / 'stock_chart.prom'
+
+# Prometheus のメトリクス名の接頭辞
+METRIC_PREFIX = 'stock_chart'
+
+# 集計するパーセンタイル
+QUANTILES = (0.5, 0.95)
+
+
+class Metrics:
+    """
+    段階ごとの所要時間と件数の集計
+    """
+    
+    def __init__(self):
+        self.timings = {}
+        self.counters = {}
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+    
+    def observe(self, name: str, seconds: float):
+        """
+        段階の所要時間を記録
+        
+        Args:
+            name: 段階名
+            seconds: 所要時間(秒)
+        """
+        with self._lock:
+            self.timings.setdefault(name, []).append(seconds)
+    
+    @contextmanager
+    def stage(self, name: str):
+        """
+        with ブロックの所要時間を段階の所要時間として記録 (例外で抜けた場合も記録する)
+        
+        Args:
+            name: 段階名
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+    
+    def count(self, name: str, value: float = 1):
+        """
+        件数を加算
+        
+        Args:
+            name: 件数の名前
+            value: 加算する値
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+    
+    def summary(self) -> dict:
+        """
+        段階ごとの回数・合計・パーセンタイル・最大
+        
+        Returns:
+            段階名 → {count, total, p50, p95, max} の辞書 (秒)
+        """
+        with self._lock:
+            timings = {name: np.array(values) for name, values in self.timings.items()}
+        
+        summary = {}
+        for name, values in sorted(timings.items()):
+            summary[name] = {'count': len(values), 'total': round(float(values.sum()), 4)}
+            for q in QUANTILES:
+                summary[name][f'p{int(q * 100)}'] = round(float(np.percentile(values, q * 100)), 4)
+            summary[name]['max'] = round(float(values.max()), 4)
+        return summary
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """
+    共有の集計を取得
+    
+    Returns:
+        Metrics
+    """
+    return _metrics
+
+
+def reset_metrics() -> Metrics:
+    """
+    共有の集計をリセット
+    
+    Returns:
+        新しいMetrics
+    """
+    global _metrics
+    _metrics = Metrics()
+    return _metrics
+
+
+def stage(name: str):
+    """
+    共有の集計に段階の所要時間を記録する with ブロック
+    
+    Args:
+        name: 段階名
+    """
+    return _metrics.stage(name)
+
+
+def timed(name: str):
+    """
+    関数の所要時間を段階の所要時間として記録するデコレータ
+    
+    Args:
+        name: 段階名
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _metrics.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name: str, value: float = 1):
+    """
+    共有の集計に件数を加算
+    
+    Args:
+        name: 件数の名前
+        value: 加算する値
+    """
+    _metrics.count(name, value)
+
+
+def collect_counters() -> dict:
+    """
+    共有の件数と、各モジュールの集計 (書き込み・キャッシュ・レート制限・再試行) をまとめる
+    
+    Returns:
+        件数の名前 → 値 の辞書
+    """
+    counters = dict(_metrics.counters)
+    
+    writes = output_writer.get_stats()
+    counters['files_written'] = len(writes.written)
+    counters['files_skipped'] = len(writes.skipped)
+    counters['bytes_written'] = writes.bytes_written
+    
+    cache = fetch_layer.get_cache()
+    counters['response_cache_hits'] = cache.hits
+    counters['response_cache_misses'] = cache.misses
+    counters['response_cache_revalidated'] = cache.revalidated
+    
+    metadata = metadata_cache.get_cache()
+    counters['metadata_cache_hits'] = metadata.hits
+    counters['metadata_cache_misses'] = metadata.misses
+    
+    for host in (rate_limiter.YAHOO_HOST, rate_limiter.JPX_HOST):
+        bucket = rate_limiter.get_limiter(host)
+        breaker = retry_policy.get_breaker(host)
+        counters[f'{host}:requests'] = breaker.requests
+        counters[f'{host}:failures'] = breaker.failures
+        counters[f'{host}:retries'] = breaker.retried
+        counters[f'{host}:paused'] = breaker.opened
+        counters[f'{host}:rate_limit_wait_seconds'] = round(bucket.waited, 4) if bucket else 0
+    
+    return counters
+
+
+def build_report(**info) -> dict:
+    """
+    実行レポートを作成
+    
+    Args:
+        **info: レポートに含める実行の情報 (実行ID・成功数など)
+    
+    Returns:
+        started_at, elapsed, stages, counters と info の内容を持つ辞書
+    """
+    return dict(
+        info,
+        started_at=time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(_metrics.started_at)),
+        elapsed=round(time.time() - _metrics.started_at, 3),
+        stages=_metrics.summary(),
+        counters=collect_counters()
+    )
+
+
+def _metric_name(name: str) -> str:
+    return ''.join(c if c.isalnum() else '_' for c in name.lower())
+
+
+def to_prometheus(report: dict) -> str:
+    """
+    実行レポートを Prometheus のテキスト形式に変換
+    
+    段階の所要時間は summary (quantile・_sum・_count)、件数は gauge として出力する。
+    ホストごとの件数 (<host>:<name>) は host ラベルを付ける。
+    
+    Args:
+        report: build_report の戻り値
+    
+    Returns:
+        テキスト形式のメトリクス
+    """
+    lines = [
+        f'# HELP {METRIC_PREFIX}_stage_seconds Time spent in each pipeline stage during the last run.',
+        f'# TYPE {METRIC_PREFIX}_stage_seconds summary'
+    ]
+    for name, stats in report['stages'].items():
+        for q in QUANTILES:
+            lines.append(f'{METRIC_PREFIX}_stage_seconds{{stage="{name}",quantile="{q}"}} {stats[f"p{int(q * 100)}"]}')
+        lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{name}"}} {stats["total"]}')
+        lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{name}"}} {stats["count"]}')
+    
+    gauges = {}
+    for name, value in report['counters'].items():
+        host, _, name = name.rpartition(':')
+        labels = f'{{host="{host}"}}' if host else ''
+        gauges.setdefault(f'{METRIC_PREFIX}_{_metric_name(name)}', []).append(f'{labels} {value}')
+    gauges[f'{METRIC_PREFIX}_run_elapsed_seconds'] = [f' {report["elapsed"]}']
+    gauges[f'{METRIC_PREFIX}_run_timestamp_seconds'] = [f' {round(time.time())}']
+    for key in ('success_count', 'error_count'):
+        if key in report:
+            gauges[f'{METRIC_PREFIX}_run_{key}'] = [f' {report[key]}']
+    
+    for metric, samples in gauges.items():
+        lines.append(f'# TYPE {metric} gauge')
+        lines.extend(f'{metric}{sample}' for sample in samples)
+    
+    return '\n'.join(lines) + '\n'
+
+
+def save_report(report: dict, report_file: Path = REPORT_FILE, metrics_file: Path = METRICS_FILE):
+    """
+    実行レポート (JSON) と Prometheus 形式のファイルを保存
+    
+    Args:
+        report: build_report の戻り値
+        report_file: 実行レポートの保存先 (Noneの場合は保存しない)
+        metrics_file: Prometheus 形式のファイルの保存先 (Noneの場合は保存しない)
+    """
+    # textfile collector が書き込み途中のファイルを読まないように一時ファイル経由で置き換える
+    if report_file:
+        output_writer.write_atomic(report_file, json.dumps(report, ensure_ascii=False, indent=2).encode('utf-8'))
+    if metrics_file:
+        output_writer.write_atomic(metrics_file, to_prometheus(report).encode('utf-8'))
+
+
+def print_stage_summary(report: dict, limit: int = 10):
+    """
+    所要時間の合計が大きい段階を表示
+    
+    Args:
+        report: build_report の戻り値
+        limit: 表示する段階数
+    """
+    stages = sorted(report['stages'].items(), key=lambda item: -item[1]['total'])[:limit]
+    if not stages:
+        return
+    print("段階ごとの所要時間 (合計 / p50 / p95):")
+    for name, stats in stages:
+        print(f"  {name}: {stats['total']:.1f}秒 / {stats['p50'] * 1000:.0f}ms / {stats['p95'] * 1000:.0f}ms "
+              f"({stats['count']}回)")
+
+
+def add_report_arguments(parser):
+    """
+    実行レポートのコマンドライン引数を追加
+    
+    Args:
+        parser: argparse.ArgumentParser
+    """
+    parser.add_argument('--report', type=Path, default=REPORT_FILE,
+                        help=f'実行レポート (JSON) の保存先 (デフォルト: {REPORT_FILE.relative_to(REPORT_FILE.parents[2])})')
+    parser.add_argument('--metrics-file', type=Path, default=METRICS_FILE,
+                        help='Prometheus の textfile collector 形式のファイルの保存先 '
+                             f'(デフォルト: {METRICS_FILE.relative_to(METRICS_FILE.parents[2])})')
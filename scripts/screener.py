@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+全銘柄のランキング (スクリーナー) 計算スクリプト
+日次データストアのパネルから値上がり率・出来高急増・信用倍率の変化を全銘柄まとめて計算し、
+テーマ一覧の画面で銘柄ファイルを読み込まずに表示できるよう docs/screener.json に出力する
+
+ランキングは各銘柄の最新の取引日の値で比較する。
+ランキングを追加する場合は @ranking で計算関数を登録する。
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from indicators import load_panel
+import output_writer
+import panel_store
+
+# 出力先
+SCREENER_FILE = Path(__file__).parent.parent / 'docs' / 'screener.json'
+
+# パネルに読み込む項目
+SCREENER_FIELDS = ('Close', 'Volume', 'MarginBuy', 'MarginSell')
+
+# ランキングごとの表示銘柄数
+TOP_N = 10
+
+# 出来高急増の比較対象とする直前の取引日数
+VOLUME_WINDOW = 20
+
+# 信用倍率の変化を比べる取引日数
+MARGIN_LOOKBACK = 5
+
+
+def last_rows(valid: np.ndarray, count: int) -> np.ndarray:
+    """
+    銘柄ごとに取引のある直近 count 日の行番号を求める
+    
+    Args:
+        valid: 日数 × 銘柄数 の取引のある日のマスク
+        count: 取得する日数
+    
+    Returns:
+        count × 銘柄数 の行番号の配列 (古い順。取引日が足りない場合は -1)
+    """
+    # 安定ソートで取引のある行を日付順に先頭へ集める
+    order = np.argsort(~valid, axis=0, kind='stable')
+    n_valid = valid.sum(axis=0)
+    
+    positions = n_valid[None, :] - count + np.arange(count)[:, None]
+    rows = np.take_along_axis(order, np.clip(positions, 0, None), axis=0)
+    return np.where(positions >= 0, rows, -1)
+
+
+def take(values: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    銘柄ごとの行番号の値を取り出す (行番号が -1 の場合は NaN)
+    """
+    taken = np.take_along_axis(values, np.clip(rows, 0, None), axis=0)
+    return np.where(rows >= 0, taken, np.nan)
+
+
+# ---- ランキング ----
+
+RANKINGS = {}
+
+
+def ranking(name: str, label: str, unit: str, by_magnitude: bool = False):
+    """
+    ランキングの計算関数を登録するデコレータ
+    
+    計算関数は Panel と取引のある日のマスク (日数 × 銘柄数) を受け取り、
+    銘柄ごとの値の配列 (対象外の銘柄は NaN) を返す。
+    
+    Args:
+        name: ランキング名
+        label: 画面に表示する名前
+        unit: 値の単位
+        by_magnitude: Trueの場合は値の絶対値の大きい順に並べる
+    """
+    def register(func):
+        RANKINGS[name] = {'func': func, 'label': label, 'unit': unit, 'by_magnitude': by_magnitude}
+        return func
+    return register
+
+
+@ranking('gainers', '値上がり率', '%')
+def rank_gainers(panel, valid: np.ndarray) -> np.ndarray:
+    rows = last_rows(valid, 2)
+    close = take(panel['Close'], rows)
+    return (close[1] / close[0] - 1) * 100
+
+
+@ranking('volume_spikes', '出来高急増', '倍')
+def rank_volume_spikes(panel, valid: np.ndarray) -> np.ndarray:
+    rows = last_rows(valid, VOLUME_WINDOW + 1)
+    volume = take(panel['Volume'], rows)
+    
+    # 直前 VOLUME_WINDOW 日の平均出来高に対する最新日の出来高
+    with np.errstate(divide='ignore', invalid='ignore'):
+        average = np.nanmean(volume[:-1], axis=0)
+        return np.where(average > 0, volume[-1] / average, np.nan)
+
+
+@ranking('margin_ratio_changes', '信用倍率の変化', 'pt', by_magnitude=True)
+def rank_margin_ratio_changes(panel, valid: np.ndarray) -> np.ndarray:
+    rows = last_rows(valid, MARGIN_LOOKBACK + 1)
+    margin_buy = take(panel['MarginBuy'], rows)
+    margin_sell = take(panel['MarginSell'], rows)
+    
+    # 信用倍率 = 信用買い残 / 信用売り残 (売り残がない日は計算しない)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(margin_sell > 0, margin_buy / margin_sell, np.nan)
+    return ratio[-1] - ratio[0]
+
+
+def compute_rankings(panel, names: dict = None, top_n: int = TOP_N) -> dict:
+    """
+    登録済みのランキングを全銘柄まとめて計算
+    
+    Args:
+        panel: Panel
+        names: 銘柄コード → 銘柄名 の辞書
+        top_n: ランキングごとの表示銘柄数
+    
+    Returns:
+        ランキング名 → {label, unit, items} の辞書
+    """
+    names = names or {}
+    close = panel['Close']
+    valid = ~np.isnan(close)
+    latest = last_rows(valid, 1)[0]
+    latest_close = take(close, latest[None, :])[0]
+    
+    rankings = {}
+    for name, spec in RANKINGS.items():
+        values = spec['func'](panel, valid)
+        keys = np.abs(values) if spec['by_magnitude'] else values
+        
+        # NaN を除いて値の大きい順に並べる
+        candidates = np.flatnonzero(~np.isnan(keys))
+        order = candidates[np.argsort(-keys[candidates], kind='stable')][:top_n]
+        
+        rankings[name] = {
+            'label': spec['label'],
+            'unit': spec['unit'],
+            'items': [
+                {
+                    'code': panel.codes[col],
+                    'name': names.get(panel.codes[col]) or panel.codes[col],
+                    'date': str(panel.dates[latest[col]]),
+                    'close': round(float(latest_close[col]), 2),
+                    'value': round(float(values[col]), 2)
+                }
+                for col in order
+            ]
+        }
+    
+    return rankings
+
+
+def get_stock_names() -> dict:
+    """
+    日次データストアの銘柄名を取得
+    
+    Returns:
+        銘柄コード → 銘柄名 の辞書
+    """
+    store = panel_store.get_store()
+    return {code: info.get('stock_name') for code, info in store.stocks.items()}
+
+
+def save_screener(panel, rankings: dict, output_file: Path = SCREENER_FILE) -> bool:
+    """
+    ランキングを保存 (内容が変わらない場合は書き込まない)
+    
+    Args:
+        panel: Panel
+        rankings: compute_rankings の戻り値
+        output_file: 出力先
+    
+    Returns:
+        書き込んだ場合はTrue
+    """
+    output_data = {
+        'latest_date': str(panel.dates[-1]) if len(panel.dates) else None,
+        'stock_count': len(panel.codes),
+        'rankings': rankings
+    }
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    return output_writer.write_json(output_file, output_data, separators=(',', ':'))
+
+
+if __name__ == "__main__":
+    # 引数で銘柄コードを指定した場合はその銘柄のみで比較
+    codes = sys.argv[1:] or None
+    
+    start_time = time.time()
+    panel = load_panel(codes=codes, fields=SCREENER_FIELDS)
+    rankings = compute_rankings(panel, get_stock_names())
+    elapsed = time.time() - start_time
+    print(f"Computed {len(rankings)} rankings over {len(panel.codes)} stocks ({elapsed * 1000:.0f}ms)")
+    
+    for name, data in rankings.items():
+        print(f"\n{data['label']}:")
+        for item in data['items'][:3]:
+            print(f"  {item['code']} {item['name']}: {item['value']}{data['unit']}")
+    
+    written = save_screener(panel, rankings)
+    print(f"\n✓ {'Saved' if written else 'Unchanged'} {SCREENER_FILE}")
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+テーマ指数の計算スクリプト
+themes.json の各テーマについて、構成銘柄の終値から等金額加重・売買代金加重の指数と
+信用買い残・信用売り残・機関空売り残の合計を計算し、テーマごとに docs/themes/<theme_id>.json に出力する
+
+構成銘柄の日次リターンを日付 × 銘柄コードのパネルで求め、
+テーマ × 銘柄コード の構成行列との積で全テーマをまとめて集計する。
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from indicators import load_panel, ffill, shift
+import output_writer
+
+# テーマ定義 (generate_themes.py の出力)
+THEMES_FILE = Path(__file__).parent.parent / 'docs' / 'themes.json'
+
+# テーマ指数の出力先
+THEME_INDEX_DIR = Path(__file__).parent.parent / 'docs' / 'themes'
+
+# パネルに読み込む項目
+THEME_FIELDS = ('Close', 'Volume', 'MarginBuy', 'MarginSell', 'ShortSelling')
+
+# 合計する残高の項目
+BALANCE_FIELDS = ('MarginBuy', 'MarginSell', 'ShortSelling')
+
+# 指数の基準値 (最初の日の値)
+BASE_VALUE = 100.0
+
+# 騰落率を計算する期間 (取引日数)
+CHANGE_PERIODS = {'1d': 1, '1m': 21, '3m': 63}
+
+
+def load_theme_members(themes_file: Path = THEMES_FILE) -> list:
+    """
+    テーマと構成銘柄の一覧を読み込む
+    
+    Args:
+        themes_file: themes.json のパス
+    
+    Returns:
+        {id, name, codes} のリスト
+    """
+    with open(themes_file, 'r', encoding='utf-8') as f:
+        themes = json.load(f).get('themes', [])
+    return [
+        {'id': theme['id'], 'name': theme['name'], 'codes': [s['code'] for s in theme['stocks']]}
+        for theme in themes
+    ]
+
+
+def membership_matrix(panel, themes: list) -> np.ndarray:
+    """
+    テーマ × 銘柄コード の構成行列 (構成銘柄は1、それ以外は0)
+    
+    Args:
+        panel: Panel
+        themes: load_theme_members の戻り値
+    
+    Returns:
+        テーマ数 × 銘柄数 の配列
+    """
+    matrix = np.zeros((len(themes), len(panel.codes)))
+    for i, theme in enumerate(themes):
+        cols = [panel.column(code) for code in theme['codes'] if code in panel.codes]
+        matrix[i, cols] = 1.0
+    return matrix
+
+
+def _chain(returns: np.ndarray, active: np.ndarray) -> np.ndarray:
+    # 構成銘柄の取引が始まった日を基準値として日次リターンを積み上げる
+    growth = np.cumprod(1 + np.where(np.isnan(returns), 0.0, returns), axis=0)
+    return np.where(active, BASE_VALUE * growth, np.nan)
+
+
+def compute_theme_indices(panel, themes: list) -> dict:
+    """
+    全テーマの指数と残高合計をまとめて計算
+    
+    Args:
+        panel: Panel
+        themes: load_theme_members の戻り値
+    
+    Returns:
+        出力列名 → 日数 × テーマ数 の配列 の辞書
+    """
+    members = membership_matrix(panel, themes).T
+    close = panel['Close']
+    traded = ~np.isnan(close)
+    
+    # 取引のある日の前の取引日からのリターン (上場初日・取引のない日は集計しない)
+    returns = close / shift(ffill(close)) - 1
+    has_return = ~np.isnan(returns)
+    returns_filled = np.where(has_return, returns, 0.0)
+    
+    # 売買代金 (終値 × 出来高) を加重に使う
+    turnover = np.where(has_return, close * np.nan_to_num(panel['Volume']), 0.0)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        equal = (returns_filled @ members) / (has_return @ members)
+        weighted = ((returns_filled * turnover) @ members) / (turnover @ members)
+    
+    member_count = traded @ members
+    active = np.cumsum(member_count, axis=0) > 0
+    
+    results = {
+        'EqualWeighted': _chain(equal, active),
+        'VolumeWeighted': _chain(weighted, active),
+        'Members': np.where(member_count > 0, member_count, np.nan)
+    }
+    
+    # 残高は構成銘柄ごとに直近の値で埋めてから合計する
+    for field in BALANCE_FIELDS:
+        balance = ffill(panel[field])
+        results[field] = np.where(active, np.nan_to_num(balance) @ members, np.nan)
+    
+    return results
+
+
+def summarize(series: np.ndarray) -> dict:
+    """
+    指数の期間ごとの騰落率 (%)
+    
+    Args:
+        series: 指数の配列 (値のない日は NaN)
+    
+    Returns:
+        期間 → 騰落率 の辞書 (期間に足りない場合は None)
+    """
+    values = series[~np.isnan(series)]
+    summary = {}
+    for name, days in CHANGE_PERIODS.items():
+        change = None
+        if len(values) > days:
+            change = round(float((values[-1] / values[-1 - days] - 1) * 100), 2)
+        summary[name] = change
+    return summary
+
+
+def slice_theme(panel, results: dict, index: int, theme: dict) -> dict:
+    """
+    1テーマ分の指数を列形式で切り出す (構成銘柄のいずれかに取引がある日のみ)
+    
+    Args:
+        panel: Panel
+        results: compute_theme_indices の戻り値
+        index: テーマの位置
+        theme: テーマ ({id, name, codes})
+    
+    Returns:
+        theme_id, name, dates, columns, summary を持つ辞書
+    """
+    rows = ~np.isnan(results['Members'][:, index])
+    
+    columns = {}
+    for name, values in results.items():
+        series = values[rows, index]
+        if name in ('EqualWeighted', 'VolumeWeighted'):
+            series = np.round(series, 2)
+            columns[name] = np.where(np.isnan(series), None, series).tolist()
+        else:
+            columns[name] = [int(v) for v in series]
+    
+    return {
+        'theme_id': theme['id'],
+        'name': theme['name'],
+        'stock_count': len(theme['codes']),
+        'dates': panel.dates[rows].astype(str).tolist(),
+        'columns': columns,
+        'summary': summarize(results['EqualWeighted'][rows, index])
+    }
+
+
+def save_theme_indices(panel, results: dict, themes: list, output_dir: Path = THEME_INDEX_DIR,
+                       remove_stale: bool = True) -> int:
+    """
+    テーマごとの指数ファイルを保存 (内容が変わらないファイルは書き込まない)
+    
+    Args:
+        panel: Panel
+        results: compute_theme_indices の戻り値
+        themes: load_theme_members の戻り値
+        output_dir: 出力先
+        remove_stale: Trueの場合は themes に含まれないテーマのファイルを削除する
+    
+    Returns:
+        保存したテーマ数
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for i, theme in enumerate(themes):
+        output_writer.write_json(output_dir / f"{theme['id']}.json", slice_theme(panel, results, i, theme),
+                                 separators=(',', ':'))
+    
+    # 定義から削除されたテーマのファイルを削除
+    if remove_stale:
+        names = {f"{theme['id']}.json" for theme in themes}
+        for path in output_dir.glob('*.json'):
+            if path.name not in names:
+                path.unlink()
+    
+    return len(themes)
+
+
+if __name__ == "__main__":
+    # 引数でテーマIDを指定した場合はそのテーマのみ
+    theme_ids = sys.argv[1:]
+    
+    themes = load_theme_members()
+    if theme_ids:
+        themes = [t for t in themes if t['id'] in theme_ids]
+    
+    start_time = time.time()
+    codes = sorted({code for theme in themes for code in theme['codes']})
+    panel = load_panel(codes=codes, fields=THEME_FIELDS)
+    results = compute_theme_indices(panel, themes)
+    elapsed = time.time() - start_time
+    print(f"Computed {len(themes)} theme indices over {len(panel.codes)} stocks ({elapsed * 1000:.0f}ms)")
+    
+    for i, theme in enumerate(themes):
+        summary = slice_theme(panel, results, i, theme)['summary']
+        print(f"  - {theme['name']}: 1d {summary['1d']}% / 1m {summary['1m']}%")
+    
+    # 一部のテーマのみの場合は他のテーマのファイルを残す
+    save_theme_indices(panel, results, themes, remove_stale=not theme_ids)
+    print(f"✓ Saved theme indices to {THEME_INDEX_DIR}")
+    output_writer.print_write_summary()
@@ -0,0 +1,126 @@
+"""
+価格帯別出来高の計算
+各日の出来高をその日の安値〜高値の範囲に均等に配分し、
+表示期間 (1ヶ月・3ヶ月・6ヶ月・1年・全期間) ごとの価格帯別出来高を一度に求める
+
+全期間の価格範囲を細かい価格帯に分け、期間ごとに各日の出来高を価格帯へ直接足し込んでから
+期間内の価格範囲を DEFAULT_BINS 個以下の価格帯にまとめ直す。
+"""
+import numpy as np
+import pandas as pd
+
+import run_metrics
+
+# 表示期間ごとの開始日のずらし幅 (Noneは全期間)
+PROFILE_PERIODS = {
+    '1m': pd.DateOffset(months=1),
+    '3m': pd.DateOffset(months=3),
+    '6m': pd.DateOffset(months=6),
+    '1y': pd.DateOffset(years=1),
+    'all': None,
+}
+
+# 出力する価格帯の最大数
+DEFAULT_BINS = 50
+
+# 集計に使う細かい価格帯の数 (期間ごとに DEFAULT_BINS 以下へまとめ直す)
+FINE_BINS = 1000
+
+
+def spread_volume(low: np.ndarray, high: np.ndarray, volume: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """
+    各日の出来高を安値〜高値の範囲に均等に配分したヒストグラム (全日の合計)
+    
+    日数 × 価格帯数 の配列は作らず、安値・高値を含む価格帯には端数を、その間の価格帯には
+    値幅あたりの出来高 × 価格帯の幅を差分配列で足し込む。
+    
+    Args:
+        low: 安値の配列
+        high: 高値の配列
+        volume: 出来高の配列
+        edges: 価格帯の境界 (昇順)
+    
+    Returns:
+        価格帯ごとの出来高の配列
+    """
+    bins = len(edges) - 1
+    
+    # 安値・高値を含む価格帯 (値幅のない日は安値を含む価格帯)
+    first = np.clip(np.searchsorted(edges, low, side='right') - 1, 0, bins - 1)
+    last = np.clip(np.searchsorted(edges, high, side='left') - 1, first, bins - 1)
+    
+    # 1つの価格帯に収まる日は全量をその価格帯に配分
+    single = first == last
+    histogram = np.zeros(bins)
+    histogram += np.bincount(first[single], weights=volume[single], minlength=bins)
+    
+    # 複数の価格帯にまたがる日は、両端の価格帯に端数、その間の価格帯に幅に比例した量を配分
+    f, l = first[~single], last[~single]
+    lo, hi = low[~single], high[~single]
+    density = volume[~single] / (hi - lo)
+    histogram += np.bincount(f, weights=density * (edges[f + 1] - lo), minlength=bins)
+    histogram += np.bincount(l, weights=density * (hi - edges[l]), minlength=bins)
+    steps = (np.bincount(f + 1, weights=density, minlength=bins + 1)
+             - np.bincount(l, weights=density, minlength=bins + 1))
+    histogram += np.cumsum(steps)[:bins] * np.diff(edges)
+    return histogram
+
+
+def _rebin(edges: np.ndarray, histogram: np.ndarray, first: int, last: int, bins: int) -> dict:
+    count = last - first
+    step = int(np.ceil(count / bins))
+    starts = np.arange(first, last, step)
+    volumes = np.add.reduceat(histogram[first:last], starts - first)
+    ends = np.minimum(starts + step, last)
+    
+    return {
+        'price_low': [round(float(edges[s]), 2) for s in starts],
+        'price_high': [round(float(edges[e]), 2) for e in ends],
+        'volume': [int(round(v)) for v in volumes]
+    }
+
+
+@run_metrics.timed('volume_profile')
+def calculate_volume_profiles(df: pd.DataFrame, bins: int = DEFAULT_BINS) -> dict:
+    """
+    表示期間ごとの価格帯別出来高を計算
+    
+    Args:
+        df: 株価データのDataFrame (Date, High, Low, Volume)
+        bins: 価格帯の最大数
+    
+    Returns:
+        期間 (1m / 3m / 6m / 1y / all) → 価格帯別出来高 (price_low / price_high / volume の列) の辞書
+    """
+    if df.empty:
+        return {period: {'price_low': [], 'price_high': [], 'volume': []} for period in PROFILE_PERIODS}
+    
+    low = df['Low'].to_numpy(dtype=float)
+    high = np.maximum(df['High'].to_numpy(dtype=float), low)
+    volume = df['Volume'].to_numpy(dtype=float)
+    dates = pd.to_datetime(df['Date']).to_numpy()
+    
+    edges = np.linspace(low.min(), high.max(), FINE_BINS + 1)
+    if edges[-1] <= edges[0]:
+        edges = np.linspace(edges[0] - 0.5, edges[0] + 0.5, FINE_BINS + 1)
+    
+    # 期間内の安値・高値は新しい方からの累積で求める
+    suffix_low = np.minimum.accumulate(low[::-1])[::-1]
+    suffix_high = np.maximum.accumulate(high[::-1])[::-1]
+    
+    latest = pd.Timestamp(dates[-1])
+    profiles = {}
+    for period, offset in PROFILE_PERIODS.items():
+        start = 0
+        if offset is not None:
+            start_date = np.datetime64(latest - offset)
+            start = min(int(np.searchsorted(dates, start_date, side='left')), len(dates) - 1)
+        
+        # 期間内の価格範囲に含まれる細かい価格帯だけを残して bins 個以下にまとめる
+        first = max(int(np.searchsorted(edges, suffix_low[start], side='right')) - 1, 0)
+        last = min(int(np.searchsorted(edges, suffix_high[start], side='left')), FINE_BINS)
+        last = max(last, first + 1)
+        histogram = spread_volume(low[start:], high[start:], volume[start:], edges)
+        profiles[period] = _rebin(edges, histogram, first, last, bins)
+    
+    return profiles